@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2.
+
+"""Compare the Thrift deserializer with decode_overlay_dir().
+
+Builds a synthetic overlay of directory inodes in a temporary directory, then
+times reading all of them with Overlay.parse_dir_inode_data() and with
+Overlay.read_dir_entries_batch().
+"""
+
+import argparse
+import os
+import random
+import stat
+import tempfile
+import time
+import typing
+from typing import Callable, List
+
+from eden.fs.cli import overlay as overlay_mod
+from facebook.eden.overlay.ttypes import OverlayDir, OverlayEntry
+from thrift.protocol import TCompactProtocol
+from thrift.util import Serializer
+
+
+def build_overlay(path: str, num_dirs: int, entries_per_dir: int) -> List[int]:
+    for subdir_num in range(256):
+        os.mkdir(os.path.join(path, "{:02x}".format(subdir_num)))
+
+    overlay = overlay_mod.Overlay(path)
+    protocol_factory = TCompactProtocol.TCompactProtocolFactory()
+    rng = random.Random(1)
+    inode_numbers = list(range(2, num_dirs + 2))
+    next_inode_number = num_dirs + 2
+    for inode_number in inode_numbers:
+        entries = {}
+        for n in range(entries_per_dir):
+            if n % 8 == 0:
+                # materialized child
+                mode = stat.S_IFDIR | 0o755
+                hash = None
+            else:
+                mode = stat.S_IFREG | 0o644
+                hash = rng.getrandbits(160).to_bytes(20, "big")
+            entries[f"entry_{n:05d}.txt"] = OverlayEntry(
+                mode=mode, inodeNumber=next_inode_number, hash=hash
+            )
+            next_inode_number += 1
+        contents = typing.cast(
+            bytes, Serializer.serialize(protocol_factory, OverlayDir(entries=entries))
+        )
+        overlay._write_inode(inode_number, overlay_mod.OverlayHeader.TYPE_DIR, contents)
+    return inode_numbers
+
+
+def time_it(name: str, repeat: int, func: Callable[[], int]) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        num_entries = func()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    assert best is not None
+    print(f"{name:>8}: {best:.3f}s, {num_entries / best:,.0f} entries/s")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dirs", type=int, default=2000)
+    parser.add_argument("--entries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="eden_overlay_bench.") as path:
+        inode_numbers = build_overlay(path, args.dirs, args.entries)
+        overlay = overlay_mod.Overlay(path)
+
+        def read_thrift() -> int:
+            count = 0
+            for inode_number in inode_numbers:
+                count += len(overlay.read_dir_inode(inode_number).entries)
+            return count
+
+        def read_decoder() -> int:
+            count = 0
+            for _, entries in overlay.read_dir_entries_batch(inode_numbers):
+                count += len(entries)
+            return count
+
+        # Make sure both produce the same results before timing them
+        for inode_number, entries in overlay.read_dir_entries_batch(inode_numbers):
+            expected = overlay.read_dir_inode(inode_number).entries
+            assert entries.keys() == expected.keys()
+            for name, entry in entries.items():
+                other = expected[name]
+                assert (entry.mode, entry.inodeNumber, entry.hash) == (
+                    other.mode,
+                    other.inodeNumber,
+                    other.hash,
+                ), name
+
+        print(f"{args.dirs} directories with {args.entries} entries each")
+        thrift_time = time_it("thrift", args.repeat, read_thrift)
+        decoder_time = time_it("decoder", args.repeat, read_decoder)
+        print(f"speedup: {thrift_time / decoder_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,10 @@ import shutil
 import stat
 import sys
 from pathlib import Path
-from typing import BinaryIO, Optional
-
-from facebook.eden.overlay.ttypes import OverlayDir
+from typing import BinaryIO, Dict, Optional
 
 from . import cmd_util, debug as debug_mod, overlay as overlay_mod, subcmd as subcmd_mod
 
-
 cmd = debug_mod.debug_cmd
 
 
@@ -119,8 +116,8 @@ class OverlayCmd(subcmd_mod.Subcmd):
         shutil.copyfileobj(f, sys.stdout.buffer)
 
     def _process_overlay(self, inode_number: int, path: Path, level: int = 0) -> None:
-        data = self.overlay.read_dir_inode(inode_number)
-        self._print_overlay_tree(inode_number, path, data)
+        entries = self.overlay.read_dir_entries(inode_number)
+        self._print_overlay_tree(inode_number, path, entries)
 
         # If self.args.depth is negative, recurse forever.
         # Stop if self.args.depth is non-negative, and level reaches the maximum
@@ -128,7 +125,6 @@ class OverlayCmd(subcmd_mod.Subcmd):
         if self.args.depth >= 0 and level >= self.args.depth:
             return
 
-        entries = {} if data.entries is None else data.entries
         for name, entry in entries.items():
             if entry.hash or entry.inodeNumber is None or entry.inodeNumber == 0:
                 # This entry is not materialized
@@ -141,7 +137,10 @@ class OverlayCmd(subcmd_mod.Subcmd):
             self._process_overlay(entry.inodeNumber, entry_path, level + 1)
 
     def _print_overlay_tree(
-        self, inode_number: int, path: Path, tree_data: OverlayDir
+        self,
+        inode_number: int,
+        path: Path,
+        entries: Dict[str, overlay_mod.OverlayDirEntry],
     ) -> None:
         def hex(binhash: Optional[bytes]) -> str:
             if binhash is None:
@@ -150,10 +149,10 @@ class OverlayCmd(subcmd_mod.Subcmd):
                 return binascii.hexlify(binhash).decode("utf-8")
 
         print("Inode {}: {}".format(inode_number, path))
-        if not tree_data.entries:
+        if not entries:
             return
-        name_width = max(len(name) for name in tree_data.entries)
-        for name, entry in tree_data.entries.items():
+        name_width = max(len(name) for name in entries)
+        for name, entry in entries.items():
             assert entry.mode is not None
             perms = entry.mode & 0o7777
             file_type = stat.S_IFMT(entry.mode)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2.
+
+import concurrent.futures
+import contextlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Type, Union
+
+
+class DirScan(NamedTuple):
+    mtime_ns: int
+    # Disk space used by the files in this directory that have a single link
+    size: int
+    # (st_dev, st_ino, disk space) of the files with more than one link.  These
+    # are only counted once per scanner, no matter how many of their links
+    # are found.
+    hardlinks: List[Tuple[int, int, int]]
+    subdirs: List[str]
+    failed_paths: List[str]
+
+
+class DiskUsage(NamedTuple):
+    size: int
+    failed_paths: List[str]
+
+
+class DiskUsageScanner:
+    """Compute the disk space used by directory trees.
+
+    Directories are read by a pool of threads.  The result of reading each
+    directory is cached, keyed on the directory mtime, so later scans only
+    read directories that had entries added, removed or renamed since.  Files
+    modified in place do not update their directory mtime, so their new size
+    is only picked up once their directory changes or the cache is ignored.
+    """
+
+    CACHE_VERSION = 1
+
+    def __init__(
+        self,
+        cache_path: Optional[Path] = None,
+        use_cache: bool = True,
+        num_workers: Optional[int] = None,
+    ) -> None:
+        self._cache_path = cache_path
+        self._old_cache: Dict[str, DirScan] = {}
+        if cache_path is not None and use_cache:
+            self._old_cache = self._load_cache(cache_path)
+        self._new_cache: Dict[str, DirScan] = {}
+        self._seen_hardlinks: Set[Tuple[int, int]] = set()
+        if num_workers is None:
+            # Scanning is mostly waiting on the filesystem, so use more
+            # threads than CPUs.
+            num_workers = min(32, (os.cpu_count() or 1) * 4)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+        self.num_dirs_scanned = 0
+
+    def __enter__(self) -> "DiskUsageScanner":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        exc_traceback: Optional[types.TracebackType],
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        if self._cache_path is not None:
+            self._save_cache(self._cache_path)
+
+    def get_usage(self, path: Union[Path, str]) -> DiskUsage:
+        """Return the disk space used by the directory tree at path.
+
+        Directories on other filesystems than path are not counted.
+        """
+        root = os.fspath(path)
+        dev = os.stat(root).st_dev
+        total = 0
+        failed_paths: List[str] = []
+
+        pending = {self._executor.submit(self._scan_dir, root, dev, True)}
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                dir_path, scan, from_cache = future.result()
+                if scan is None:
+                    continue
+                if not from_cache:
+                    self.num_dirs_scanned += 1
+                self._new_cache[dir_path] = scan
+
+                total += scan.size
+                for st_dev, st_ino, size in scan.hardlinks:
+                    if (st_dev, st_ino) not in self._seen_hardlinks:
+                        self._seen_hardlinks.add((st_dev, st_ino))
+                        total += size
+                failed_paths.extend(scan.failed_paths)
+                for name in scan.subdirs:
+                    pending.add(
+                        self._executor.submit(
+                            self._scan_dir, os.path.join(dir_path, name), dev, False
+                        )
+                    )
+
+        return DiskUsage(total, failed_paths)
+
+    def _scan_dir(
+        self, path: str, dev: int, is_root: bool
+    ) -> Tuple[str, Optional[DirScan], bool]:
+        try:
+            st = os.stat(path, follow_symlinks=is_root)
+        except (FileNotFoundError, PermissionError):
+            return path, DirScan(-1, 0, [], [], [path]), False
+
+        # Don't recurse onto different filesystems
+        if sys.platform != "win32" and st.st_dev != dev:
+            return path, None, False
+
+        cached = self._old_cache.get(path)
+        if cached is not None and cached.mtime_ns == st.st_mtime_ns:
+            return path, cached, True
+        return path, _read_dir(path, st.st_mtime_ns), False
+
+    def _load_cache(self, cache_path: Path) -> Dict[str, DirScan]:
+        try:
+            with cache_path.open("rb") as f:
+                version, scans = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as ex:
+            print(f"warning: ignoring unreadable disk usage cache: {ex}")
+            return {}
+
+        if version != self.CACHE_VERSION:
+            return {}
+        return scans
+
+    def _save_cache(self, cache_path: Path) -> None:
+        # Only keep the directories seen by this scanner, so entries for
+        # removed directories don't accumulate.
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=cache_path.name, dir=str(cache_path.parent)
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((self.CACHE_VERSION, self._new_cache), f)
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+
+# Directories modified this recently are always re-read by the next scan
+_RACY_MTIME_SECONDS = 2
+
+
+def _get_allocated_size(st: os.stat_result) -> int:
+    if sys.platform == "win32":
+        return st.st_size
+    # Use st_blocks as this represent the actual amount of disk space
+    # allocated by the file, not its apparent size.
+    return st.st_blocks * 512
+
+
+def _read_dir(path: str, mtime_ns: int) -> DirScan:
+    size = 0
+    hardlinks: List[Tuple[int, int, int]] = []
+    subdirs: List[str] = []
+    failed_paths: List[str] = []
+
+    try:
+        with os.scandir(path) as it:
+            for dirent in it:
+                try:
+                    if dirent.is_dir(follow_symlinks=False):
+                        subdirs.append(dirent.name)
+                        continue
+                    st = dirent.stat(follow_symlinks=False)
+                    file_size = _get_allocated_size(st)
+                    if st.st_nlink > 1 and sys.platform != "win32":
+                        hardlinks.append((st.st_dev, st.st_ino, file_size))
+                    else:
+                        size += file_size
+                except (FileNotFoundError, PermissionError):
+                    failed_paths.append(dirent.path)
+    except (FileNotFoundError, PermissionError):
+        failed_paths.append(path)
+
+    if failed_paths or time.time() - mtime_ns / 1e9 < _RACY_MTIME_SECONDS:
+        # The directory could be modified again without its mtime changing,
+        # since timestamps are coarser than the clock on some filesystems.
+        # Directories with errors are retried as well.
+        mtime_ns = -1
+    return DirScan(mtime_ns, size, hardlinks, subdirs, failed_paths)
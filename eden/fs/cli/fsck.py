@@ -4,16 +4,28 @@
 # This software may be used and distributed according to the terms of the
 # GNU General Public License version 2.
 
+import concurrent.futures
 import contextlib
 import enum
 import logging
 import os
+import pickle
 import stat
 import sys
+import tempfile
 import time
 import types
 from pathlib import Path
-from typing import ContextManager, Dict, List, NamedTuple, Optional, Tuple, Type
+from typing import (
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+)
 
 from . import overlay as overlay_mod
 
@@ -358,8 +370,38 @@ class CorruptNextInodeNumber(Error):
         return True
 
 
+class SubdirScan(NamedTuple):
+    """The inodes read from one of the 256 overlay subdirectories."""
+
+    subdir_num: int
+    # The mtime of the subdirectory, read before listing it.  A subdirectory
+    # whose mtime is unchanged since the last scan has had no overlay files
+    # added, removed or replaced since then.
+    mtime_ns: int
+    inodes: List[InodeInfo]
+    unexpected_paths: List[str]
+    max_inode_number: int
+
+
 class FilesystemChecker:
-    def __init__(self, checkout_state_dir: Path) -> None:
+    # Bumped whenever the format of the incremental scan cache changes
+    SCAN_CACHE_VERSION = 1
+    SCAN_CACHE_PATH = "fsck_scan_cache"
+
+    def __init__(
+        self,
+        checkout_state_dir: Path,
+        num_workers: Optional[int] = None,
+        incremental: bool = False,
+    ) -> None:
+        """
+        num_workers is the number of processes used to read the overlay.  It
+        defaults to the number of CPUs; 1 reads the overlay in this process.
+
+        If incremental is True, the results of scanning each overlay
+        subdirectory are saved in the checkout state directory, and a later
+        incremental check only re-reads the subdirectories modified since.
+        """
         self._state_dir = checkout_state_dir
         self.overlay = overlay_mod.Overlay(str(checkout_state_dir / "local"))
         self.errors: List[Error] = []
@@ -367,6 +409,9 @@ class FilesystemChecker:
         self._overlay_lock: Optional[ContextManager[bool]] = None
         self._orphan_inodes: List[InodeInfo] = []
         self._max_inode_number = 0
+        self._num_workers = num_workers or os.cpu_count() or 1
+        self._incremental = incremental
+        self.num_subdirs_scanned = 0
 
     def __enter__(self) -> "FilesystemChecker":
         self._overlay_lock = self.overlay.try_lock()
@@ -394,6 +439,11 @@ class FilesystemChecker:
     def scan_for_errors(self) -> None:
         print("Reading materialized inodes...")
         inodes = self._read_inodes()
+        if self._incremental:
+            print(
+                f"Read {self.num_subdirs_scanned} overlay subdirectories modified "
+                "since the last incremental check"
+            )
 
         print(f"Found {len(inodes)} materialized inodes")
         print(f"Computing directory relationships...")
@@ -426,30 +476,117 @@ class FilesystemChecker:
             self._add_error(CorruptNextInodeNumber(ex, expected_next_inode_number))
 
     def _read_inodes(self) -> Dict[int, InodeInfo]:
-        inodes: Dict[int, InodeInfo] = {}
+        cached_scans: Dict[int, SubdirScan] = {}
+        if self._incremental:
+            cached_scans = self._load_scan_cache()
 
+        scans: Dict[int, SubdirScan] = {}
+        to_scan: List[int] = []
         for subdir_num in range(256):
-            dir_name = "{:02x}".format(subdir_num)
-            dir_path = os.path.join(self.overlay.path, dir_name)
-
-            # TODO: Handle the error if os.listdir() fails
-            for entry in os.listdir(dir_path):
+            cached = cached_scans.get(subdir_num)
+            if cached is not None:
                 try:
-                    inode_number = int(entry, 10)
-                except ValueError:
-                    entry_path = os.path.join(dir_path, entry)
-                    self._add_error(UnexpectedOverlayFile(entry_path))
+                    mtime_ns = os.stat(
+                        os.path.join(self.overlay.path, _get_subdir_name(subdir_num))
+                    ).st_mtime_ns
+                except OSError:
+                    mtime_ns = None
+                if cached.mtime_ns == mtime_ns:
+                    scans[subdir_num] = cached
                     continue
+            to_scan.append(subdir_num)
+
+        for scan in self._scan_subdirs(to_scan):
+            scans[scan.subdir_num] = scan
+        self.num_subdirs_scanned = len(to_scan)
 
-                # TODO: check if inode_number is actually in the correct subdirectory.
-                # Handle the error if it is in the wrong directory, and if we found
-                # multiple files with the same inode number in different subdirectories
+        if self._incremental:
+            self._save_scan_cache(scans)
 
-                inode_info = self._load_inode_info(inode_number)
-                inodes[inode_number] = inode_info
+        # Merge the per-subdirectory results.  The cached InodeInfo objects may
+        # still hold parents from the scan they were loaded in, so only copy the
+        # data read from the overlay file itself.
+        inodes: Dict[int, InodeInfo] = {}
+        for subdir_num in range(256):
+            scan = scans[subdir_num]
+            for path in scan.unexpected_paths:
+                self._add_error(UnexpectedOverlayFile(path))
+            self._update_max_inode_number(scan.max_inode_number)
+            for inode in scan.inodes:
+                inodes[inode.inode_number] = InodeInfo(
+                    inode.inode_number,
+                    inode.type,
+                    inode.children,
+                    inode.mtime,
+                    inode.error,
+                )
 
         return inodes
 
+    def _scan_subdirs(self, subdir_nums: List[int]) -> Iterable[SubdirScan]:
+        if self._num_workers <= 1 or len(subdir_nums) <= 1:
+            return [_scan_subdir(self.overlay.path, num) for num in subdir_nums]
+
+        # The per-inode work is mostly Thrift deserialization, which holds the
+        # GIL, so use processes rather than threads.
+        num_workers = min(self._num_workers, len(subdir_nums))
+        with concurrent.futures.ProcessPoolExecutor(num_workers) as executor:
+            return list(
+                executor.map(
+                    _scan_subdir,
+                    [self.overlay.path] * len(subdir_nums),
+                    subdir_nums,
+                    chunksize=max(1, len(subdir_nums) // (num_workers * 4)),
+                )
+            )
+
+    def _get_scan_cache_path(self) -> Path:
+        return self._state_dir / self.SCAN_CACHE_PATH
+
+    def _load_scan_cache(self) -> Dict[int, SubdirScan]:
+        try:
+            with self._get_scan_cache_path().open("rb") as f:
+                version, scans = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as ex:
+            print(f"warning: ignoring unreadable fsck scan cache: {ex}")
+            return {}
+
+        if version != self.SCAN_CACHE_VERSION:
+            return {}
+        return scans
+
+    def _save_scan_cache(self, scans: Dict[int, SubdirScan]) -> None:
+        # Drop the parent links, which would pull in inodes from other
+        # subdirectories, and keep only what was read from the overlay.
+        data = {
+            subdir_num: scan._replace(
+                inodes=[
+                    InodeInfo(
+                        inode.inode_number,
+                        inode.type,
+                        inode.children,
+                        inode.mtime,
+                        inode.error,
+                    )
+                    for inode in scan.inodes
+                ]
+            )
+            for subdir_num, scan in scans.items()
+        }
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=self.SCAN_CACHE_PATH, dir=str(self._state_dir)
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((self.SCAN_CACHE_VERSION, data), f)
+            os.replace(tmp_path, self._get_scan_cache_path())
+        except Exception:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
     def _link_inode_children(self, inodes: Dict[int, InodeInfo]) -> None:
         for inode in inodes.values():
             for child_info in inode.children:
@@ -490,56 +627,6 @@ class FilesystemChecker:
         if inode_number > self._max_inode_number:
             self._max_inode_number = inode_number
 
-    def _load_inode_info(self, inode_number: int) -> InodeInfo:
-        self._update_max_inode_number(inode_number)
-        dir_data = None
-        stat_info = None
-        error = None
-        try:
-            with self.overlay.open_overlay_file(inode_number) as f:
-                stat_info = os.fstat(f.fileno())
-                header = self.overlay.read_header(f)
-                if header.type == overlay_mod.OverlayHeader.TYPE_DIR:
-                    dir_data = f.read()
-                    type = InodeType.DIR
-                elif header.type == overlay_mod.OverlayHeader.TYPE_FILE:
-                    type = InodeType.FILE
-                else:
-                    type = InodeType.ERROR
-        except Exception as ex:
-            # If anything goes wrong trying to open or parse the overlay file
-            # report this as an error, regardless of what type of error it is.
-            type = InodeType.ERROR
-            error = ex
-
-        dir_entries = None
-        children: List[ChildInfo] = []
-        if dir_data is not None:
-            try:
-                parsed_data = self.overlay.parse_dir_inode_data(dir_data)
-                dir_entries = parsed_data.entries
-            except Exception as ex:
-                type = InodeType.DIR_ERROR
-                error = ex
-
-        if dir_entries is not None:
-            for name, entry in dir_entries.items():
-                if entry.inodeNumber:
-                    self._update_max_inode_number(entry.inodeNumber)
-                children.append(
-                    ChildInfo(
-                        inode_number=entry.inodeNumber or 0,
-                        name=name,
-                        mode=entry.mode,
-                        hash=entry.hash,
-                    )
-                )
-
-        mtime = None
-        if stat_info is not None:
-            mtime = stat_info.st_mtime
-        return InodeInfo(inode_number, type, children, mtime, error)
-
     def fix_errors(self, fsck_dir: Optional[Path] = None) -> Optional[Path]:
         """Fix errors found by a previous call to scan_for_errors().
 
@@ -610,6 +697,115 @@ class FilesystemChecker:
         return error.repair(log=log, overlay=self.overlay, fsck_dir=fsck_dir)
 
 
+# Subdirectories modified this recently are always re-read by the next
+# incremental check
+_RACY_MTIME_SECONDS = 2
+
+
+def _get_subdir_name(subdir_num: int) -> str:
+    return "{:02x}".format(subdir_num)
+
+
+def _scan_subdir(overlay_path: str, subdir_num: int) -> SubdirScan:
+    """Read all inodes in one overlay subdirectory.
+
+    This runs in worker processes, so the result must be picklable.
+    """
+    overlay = overlay_mod.Overlay(overlay_path)
+    dir_path = os.path.join(overlay_path, _get_subdir_name(subdir_num))
+    mtime_ns = os.stat(dir_path).st_mtime_ns
+    if time.time() - mtime_ns / 1e9 < _RACY_MTIME_SECONDS:
+        # The subdirectory could be modified again without its mtime changing,
+        # since timestamps are coarser than the clock on some filesystems.
+        # Make sure the next incremental check reads it again.
+        mtime_ns = -1
+
+    inodes: List[InodeInfo] = []
+    unexpected_paths: List[str] = []
+    max_inode_number = 0
+
+    # TODO: Handle the error if os.listdir() fails
+    for entry in os.listdir(dir_path):
+        try:
+            inode_number = int(entry, 10)
+        except ValueError:
+            unexpected_paths.append(os.path.join(dir_path, entry))
+            continue
+
+        # TODO: check if inode_number is actually in the correct subdirectory.
+        # Handle the error if it is in the wrong directory, and if we found
+        # multiple files with the same inode number in different subdirectories
+
+        inode_info, inode_max = _load_inode_info(overlay, inode_number)
+        if inode_info.error is not None:
+            inode_info.error = _get_picklable_error(inode_info.error)
+        inodes.append(inode_info)
+        max_inode_number = max(max_inode_number, inode_max)
+
+    return SubdirScan(subdir_num, mtime_ns, inodes, unexpected_paths, max_inode_number)
+
+
+def _get_picklable_error(ex: Exception) -> Exception:
+    try:
+        pickle.loads(pickle.dumps(ex))
+        return ex
+    except Exception:
+        return overlay_mod.InvalidOverlayFile(str(ex))
+
+
+def _load_inode_info(
+    overlay: overlay_mod.Overlay, inode_number: int
+) -> Tuple[InodeInfo, int]:
+    """Returns the inode info along with the largest inode number it refers to."""
+    max_inode_number = inode_number
+    dir_data = None
+    stat_info = None
+    error = None
+    try:
+        with overlay.open_overlay_file(inode_number) as f:
+            stat_info = os.fstat(f.fileno())
+            header = overlay.read_header(f)
+            if header.type == overlay_mod.OverlayHeader.TYPE_DIR:
+                dir_data = f.read()
+                type = InodeType.DIR
+            elif header.type == overlay_mod.OverlayHeader.TYPE_FILE:
+                type = InodeType.FILE
+            else:
+                type = InodeType.ERROR
+    except Exception as ex:
+        # If anything goes wrong trying to open or parse the overlay file
+        # report this as an error, regardless of what type of error it is.
+        type = InodeType.ERROR
+        error = ex
+
+    dir_entries = None
+    children: List[ChildInfo] = []
+    if dir_data is not None:
+        try:
+            dir_entries = overlay_mod.decode_overlay_dir(dir_data)
+        except Exception as ex:
+            type = InodeType.DIR_ERROR
+            error = ex
+
+    if dir_entries is not None:
+        for name, entry in dir_entries.items():
+            if entry.inodeNumber:
+                max_inode_number = max(max_inode_number, entry.inodeNumber)
+            children.append(
+                ChildInfo(
+                    inode_number=entry.inodeNumber or 0,
+                    name=name,
+                    mode=entry.mode,
+                    hash=entry.hash,
+                )
+            )
+
+    mtime = None
+    if stat_info is not None:
+        mtime = stat_info.st_mtime
+    return InodeInfo(inode_number, type, children, mtime, error), max_inode_number
+
+
 def _get_mtime_str(mtime: Optional[float]) -> str:
     if mtime is None:
         return ""
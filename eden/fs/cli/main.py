@@ -37,6 +37,7 @@ from . import (
     daemon_util,
     debug as debug_mod,
     doctor as doctor_mod,
+    du as du_mod,
     filesystem,
     mtab,
     prefetch as prefetch_mod,
@@ -141,6 +142,9 @@ class DiskUsageCmd(Subcmd):
 
     json_mode = False
 
+    CACHE_PATH = "du_cache"
+    scanner: du_mod.DiskUsageScanner
+
     def setup_parser(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument(
             "mounts", default=[], nargs="*", help="Names of the mount points"
@@ -151,10 +155,25 @@ class DiskUsageCmd(Subcmd):
             "--json",
             action="store_true",
             default=False,
-            help="Print the output in JSON format",
+            help="Print the output as JSON lines: one object for each "
+            "directory as soon as it has been measured, then the totals",
+        )
+        parser.add_argument(
+            "--rescan",
+            action="store_true",
+            default=False,
+            help="Ignore the sizes cached by previous runs and read every "
+            "directory again",
         )
 
     def run(self, args: argparse.Namespace) -> int:
+        state_dir = get_eden_instance(args).state_dir
+        cache_path = state_dir / self.CACHE_PATH if state_dir.is_dir() else None
+        with du_mod.DiskUsageScanner(cache_path, use_cache=not args.rescan) as scanner:
+            self.scanner = scanner
+            return self._run(args)
+
+    def _run(self, args: argparse.Namespace) -> int:
         mounts = args.mounts
         clean = args.clean
         self.json_mode = args.json
@@ -314,46 +333,17 @@ space by running:
             self.writeln_ui("To perform automated cleanup, run `eden du --clean`\n")
 
     def du(self, path) -> int:
-        dev = os.stat(path).st_dev
-
-        def get_size(path) -> int:
-            total = 0
-            failed_to_check_files = []
-
-            for dirent in os.scandir(path):
-                try:
-                    if dirent.is_dir(follow_symlinks=False):
-                        # Don't recurse onto different filesystems
-                        if (
-                            sys.platform == "win32"
-                            or dirent.stat(follow_symlinks=False).st_dev == dev
-                        ):
-                            total += get_size(dirent.path)
-                    else:
-                        stat = dirent.stat(follow_symlinks=False)
-                        if sys.platform == "win32":
-                            total += stat.st_size
-                        else:
-                            # Use st_blocks as this represent the actual amount of
-                            # disk space allocated by the file, not its apparent
-                            # size.
-                            total += stat.st_blocks * 512
-                except FileNotFoundError:
-                    failed_to_check_files.append(dirent.path)
-                except PermissionError:
-                    failed_to_check_files.append(dirent.path)
-            if failed_to_check_files:
-                pretry_failed_to_check_files = ", ".join(failed_to_check_files)
-                self.write_ui(
-                    "Warning: failed to check paths"
-                    f" {pretry_failed_to_check_files} due to file not found or"
-                    " permission errors. Note that will also not be able to"
-                    " clean these paths.\n",
-                    fg=self.color_out.YELLOW,
-                )
-            return total
-
-        return get_size(path)
+        usage = self.scanner.get_usage(path)
+        if usage.failed_paths:
+            pretry_failed_to_check_files = ", ".join(usage.failed_paths)
+            self.write_ui(
+                "Warning: failed to check paths"
+                f" {pretry_failed_to_check_files} due to file not found or"
+                " permission errors. Note that will also not be able to"
+                " clean these paths.\n",
+                fg=self.color_out.YELLOW,
+            )
+        return usage.size
 
     def write_ui(self, message, fg=None) -> None:
         if not self.json_mode:
@@ -372,6 +362,11 @@ space by running:
         usage = self.du(path)
         if usage_type in self.aggregated_usage_counts.keys():
             self.aggregated_usage_counts[usage_type] += usage
+        if self.json_mode:
+            print(
+                json.dumps({"path": str(path), "type": usage_type, "size": usage}),
+                flush=True,
+            )
         if print_label:
             self.writeln_ui(
                 f"{self.MOVE_TO_SOL_CLEAR_TO_EOL}{print_label}: {format_size(usage)}"
@@ -995,6 +990,17 @@ class TopCmd(Subcmd):
             help="Specify the rate (in seconds) at which eden top updates.",
             type=int,
         )
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
+            "--record",
+            metavar="FILE",
+            help="Append every sample to FILE so it can be replayed later",
+        )
+        group.add_argument(
+            "--replay",
+            metavar="FILE",
+            help="Display the samples recorded in FILE instead of querying EdenFS",
+        )
 
     def run(self, args: argparse.Namespace) -> int:
         top = top_mod.Top()
@@ -1031,6 +1037,21 @@ class FsckCmd(Subcmd):
             default=False,
             help="Print more verbose information about issues found.",
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=None,
+            help="The number of processes used to read the overlay.  Defaults to "
+            "the number of CPUs.",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            default=False,
+            help="Only re-read the parts of the overlay modified since the last "
+            "incremental check, reusing the saved results for the rest.",
+        )
         parser.add_argument(
             "path",
             metavar="CHECKOUT_PATH",
@@ -1078,7 +1099,9 @@ class FsckCmd(Subcmd):
     def check_one(
         self, args: argparse.Namespace, checkout_path: Path, state_dir: Path
     ) -> int:
-        with fsck_mod.FilesystemChecker(state_dir) as checker:
+        with fsck_mod.FilesystemChecker(
+            state_dir, num_workers=args.jobs, incremental=args.incremental
+        ) as checker:
             if not checker._overlay_locked:
                 if args.force:
                     print(
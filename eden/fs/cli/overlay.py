@@ -16,9 +16,9 @@ import tempfile
 import time
 import typing
 from pathlib import Path
-from typing import BinaryIO, Iterator, Optional, Tuple
+from typing import BinaryIO, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
 
-from facebook.eden.overlay.ttypes import OverlayDir, OverlayEntry
+from facebook.eden.overlay.ttypes import OverlayDir
 
 from .util import fdatasync
 
@@ -152,6 +152,207 @@ class OverlayHeader:
         )
 
 
+class OverlayDirEntry(NamedTuple):
+    """A child entry of a directory inode.
+
+    The field names match the Thrift OverlayEntry structure, so code reading
+    entries works with either one.
+    """
+
+    mode: Optional[int]
+    inodeNumber: Optional[int]
+    hash: Optional[bytes]
+
+
+# Thrift compact protocol type codes
+_CT_BOOL_TRUE = 1
+_CT_BOOL_FALSE = 2
+_CT_BYTE = 3
+_CT_I16 = 4
+_CT_I32 = 5
+_CT_I64 = 6
+_CT_DOUBLE = 7
+_CT_BINARY = 8
+_CT_LIST = 9
+_CT_SET = 10
+_CT_MAP = 11
+_CT_STRUCT = 12
+_CT_FLOAT = 13
+
+
+def decode_overlay_dir(data: bytes) -> Dict[str, OverlayDirEntry]:
+    """Decode the entries of a compact-protocol serialized OverlayDir.
+
+    This reads only the fields of OverlayDir and OverlayEntry that exist today
+    and skips any others, without building the Thrift object graph.  It is
+    much cheaper than Overlay.parse_dir_inode_data() when only the entries are
+    needed.
+    """
+    try:
+        entries, pos = _decode_overlay_dir(data)
+    except (IndexError, UnicodeDecodeError) as ex:
+        raise InvalidOverlayFile(f"truncated or invalid directory data: {ex}")
+    if pos > len(data):
+        raise InvalidOverlayFile("truncated directory data")
+    return entries
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise InvalidOverlayFile("varint is too long")
+
+
+def _read_zigzag(data: bytes, pos: int) -> Tuple[int, int]:
+    value, pos = _read_varint(data, pos)
+    return (value >> 1) ^ -(value & 1), pos
+
+
+def _read_field_header(data: bytes, pos: int, last_id: int) -> Tuple[int, int, int]:
+    """Returns the field id, type and new position.  The type is 0 at the end
+    of the struct."""
+    byte = data[pos]
+    pos += 1
+    field_type = byte & 0x0F
+    if field_type == 0:
+        return 0, 0, pos
+    delta = byte >> 4
+    if delta:
+        return last_id + delta, field_type, pos
+    field_id, pos = _read_zigzag(data, pos)
+    return field_id, field_type, pos
+
+
+def _decode_overlay_dir(data: bytes) -> Tuple[Dict[str, OverlayDirEntry], int]:
+    entries: Dict[str, OverlayDirEntry] = {}
+    pos = 0
+    field_id = 0
+    while True:
+        field_id, field_type, pos = _read_field_header(data, pos, field_id)
+        if field_type == 0:
+            return entries, pos
+        if field_id != 1 or field_type != _CT_MAP:
+            pos = _skip_field(data, pos, field_type)
+            continue
+
+        size, pos = _read_varint(data, pos)
+        if not size:
+            continue
+        kv_types = data[pos]
+        pos += 1
+        if kv_types != (_CT_BINARY << 4) | _CT_STRUCT:
+            for _ in range(size):
+                pos = _skip_value(data, pos, kv_types >> 4)
+                pos = _skip_value(data, pos, kv_types & 0x0F)
+            continue
+
+        # This is the hot loop when reading large directories, so it avoids
+        # function calls for single-byte lengths and field headers.
+        read_varint = _read_varint
+        new_entry = OverlayDirEntry
+        for _ in range(size):
+            length = data[pos]
+            if length < 0x80:
+                pos += 1
+            else:
+                length, pos = read_varint(data, pos)
+            end = pos + length
+            name = data[pos:end].decode("utf-8")
+            pos = end
+
+            mode = None
+            inode_number = None
+            hash = None
+            entry_field_id = 0
+            while True:
+                header = data[pos]
+                entry_field_type = header & 0x0F
+                if entry_field_type == 0:
+                    pos += 1
+                    break
+                if header >> 4:
+                    entry_field_id += header >> 4
+                    pos += 1
+                else:
+                    entry_field_id, entry_field_type, pos = _read_field_header(
+                        data, pos, entry_field_id
+                    )
+
+                if entry_field_id == 1 and entry_field_type == _CT_I32:
+                    value, pos = read_varint(data, pos)
+                    mode = (value >> 1) ^ -(value & 1)
+                elif entry_field_id == 2 and entry_field_type == _CT_I64:
+                    value, pos = read_varint(data, pos)
+                    inode_number = (value >> 1) ^ -(value & 1)
+                elif entry_field_id == 3 and entry_field_type == _CT_BINARY:
+                    length = data[pos]
+                    if length < 0x80:
+                        pos += 1
+                    else:
+                        length, pos = read_varint(data, pos)
+                    end = pos + length
+                    hash = data[pos:end]
+                    pos = end
+                else:
+                    pos = _skip_field(data, pos, entry_field_type)
+            entries[name] = new_entry(mode, inode_number, hash)
+
+
+def _skip_field(data: bytes, pos: int, field_type: int) -> int:
+    # Boolean struct fields store their value in the field type
+    if field_type in (_CT_BOOL_TRUE, _CT_BOOL_FALSE):
+        return pos
+    return _skip_value(data, pos, field_type)
+
+
+def _skip_value(data: bytes, pos: int, value_type: int) -> int:
+    if value_type in (_CT_BOOL_TRUE, _CT_BOOL_FALSE, _CT_BYTE):
+        return pos + 1
+    if value_type in (_CT_I16, _CT_I32, _CT_I64):
+        return _read_varint(data, pos)[1]
+    if value_type == _CT_DOUBLE:
+        return pos + 8
+    if value_type == _CT_FLOAT:
+        return pos + 4
+    if value_type == _CT_BINARY:
+        length, pos = _read_varint(data, pos)
+        return pos + length
+    if value_type in (_CT_LIST, _CT_SET):
+        header = data[pos]
+        pos += 1
+        size = header >> 4
+        if size == 15:
+            size, pos = _read_varint(data, pos)
+        for _ in range(size):
+            pos = _skip_value(data, pos, header & 0x0F)
+        return pos
+    if value_type == _CT_MAP:
+        size, pos = _read_varint(data, pos)
+        if size:
+            kv_types = data[pos]
+            pos += 1
+            for _ in range(size):
+                pos = _skip_value(data, pos, kv_types >> 4)
+                pos = _skip_value(data, pos, kv_types & 0x0F)
+        return pos
+    if value_type == _CT_STRUCT:
+        field_id = 0
+        while True:
+            field_id, field_type, pos = _read_field_header(data, pos, field_id)
+            if field_type == 0:
+                return pos
+            pos = _skip_field(data, pos, field_type)
+    raise InvalidOverlayFile(f"unknown thrift compact protocol type {value_type}")
+
+
 class Overlay:
     ROOT_INODE_NUMBER = 1
     NEXT_INODE_NUMBER_PATH = "next-inode-number"
@@ -229,6 +430,24 @@ class Overlay:
         Serializer.deserialize(protocol_factory, data, tree_data)
         return tree_data
 
+    def read_dir_entries(self, inode_number: int) -> Dict[str, OverlayDirEntry]:
+        """Read the entries of a directory inode using decode_overlay_dir()."""
+        with self.open_overlay_file(inode_number) as f:
+            self.check_header(f, inode_number, OverlayHeader.TYPE_DIR)
+            data = f.read()
+        return decode_overlay_dir(data)
+
+    def read_dir_entries_batch(
+        self, inode_numbers: Iterable[int]
+    ) -> Iterator[Tuple[int, Dict[str, OverlayDirEntry]]]:
+        """Read the entries of many directory inodes.
+
+        Yields (inode_number, entries) pairs in the order of inode_numbers.
+        Errors reading or decoding any one inode are raised from the iterator.
+        """
+        for inode_number in inode_numbers:
+            yield inode_number, self.read_dir_entries(inode_number)
+
     def open_file_inode(self, inode_number: int) -> BinaryIO:
         return self.open_file_inode_tuple(inode_number)[1]
 
@@ -270,15 +489,11 @@ class Overlay:
         parent_inode_number = self.ROOT_INODE_NUMBER
         index = 0
         while True:
-            parent_dir = self.read_dir_inode(parent_inode_number)
+            entries = self.read_dir_entries(parent_inode_number)
             desired = path.parts[index]
             index += 1
 
-            entries = [] if parent_dir.entries is None else parent_dir.entries.items()
-            entry: Optional[OverlayEntry] = None
-            for name, entry in entries:  # noqa: ignore=B007
-                if name == desired:
-                    break
+            entry = entries.get(desired)
 
             if entry is None:
                 raise InodeLookupError(f"{path} does not exist", errno.ENOENT)
@@ -349,8 +564,8 @@ class Overlay:
         If remove=True the data for the extracted inodes will be removed from the
         overlay after they have been extracted.
         """
-        data = self.read_dir_inode(inode_number)
-        for name, entry in data.entries.items():
+        entries = self.read_dir_entries(inode_number)
+        for name, entry in entries.items():
             overlay_path = Path(self.get_path(entry.inodeNumber))
             if not overlay_path.exists():
                 # Skip children that do not exist in the overlay.
@@ -4,15 +4,26 @@
 # GNU General Public License version 2.
 
 import argparse
+import concurrent.futures
 import os
 import re
 import subprocess
 import sys
+import time
 import warnings
-from pathlib import Path
-from typing import List, Optional, Set
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
 
-from facebook.eden.ttypes import Glob, GlobParams
+from facebook.eden.ttypes import FileInformationOrError, Glob, GlobParams
 
 from . import subcmd as subcmd_mod, tabulate
 from .cmd_util import get_eden_instance, require_checkout
@@ -46,6 +57,57 @@ def get_contents_for_profile(
         return {pat.strip() for pat in f.readlines()}
 
 
+# Ask arc which bookmark the user is likely to checkout next and return the
+# commits it points to.
+def predict_revisions_for_checkout(checkout: EdenCheckout) -> List[str]:
+    # The arc and hg commands need to be run in the mount. Pass the mount as
+    # the working directory rather than changing ours, so that several
+    # checkouts can be predicted from different threads.
+    bookmark_to_prefetch_command = ["arc", "stable", "best", "--verbose", "error"]
+    bookmarks_result = subprocess.run(
+        bookmark_to_prefetch_command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=checkout.path,
+    )
+
+    if bookmarks_result.returncode:
+        raise Exception(
+            "Unable to predict commits to prefetch, error finding bookmark"
+            f" to prefetch: {bookmarks_result.stderr}"
+        )
+
+    bookmark_to_prefetch = bookmarks_result.stdout.decode().strip("\n")
+
+    commit_from_bookmark_commmand = [
+        "hg",
+        "log",
+        "-r",
+        bookmark_to_prefetch,
+        "-T",
+        "{node}",
+    ]
+    commits_result = subprocess.run(
+        commit_from_bookmark_commmand,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=checkout.path,
+    )
+
+    if commits_result.returncode:
+        raise Exception(
+            "Unable to predict commits to prefetch, error converting"
+            f" bookmark to commit: {commits_result.stderr}"
+        )
+
+    raw_commits = commits_result.stdout.decode()
+    # arc stable only gives us one commit, so for now this is a single
+    # commit, but we might use multiple in the future.
+    return [re.sub("\n$", "", raw_commits)]
+
+
 # Function to actually cause the prefetch, can be called on a background process
 # or in the main process.
 # Only print here if silent is False, as that could send messages randomly to
@@ -60,64 +122,7 @@ def make_prefetch_request(
     predict_revisions: bool,
 ) -> Optional[Glob]:
     if predict_revisions:
-        # The arc and hg commands need to be run in the mount mount, so we need
-        # to change the working path if it is not within the mount.
-        current_path = Path.cwd()
-        in_checkout = False
-        try:
-            # this will throw if current_path is not a relative path of the
-            # checkout path
-            checkout.get_relative_path(current_path)
-            in_checkout = True
-        except Exception:
-            os.chdir(checkout.path)
-
-        bookmark_to_prefetch_command = ["arc", "stable", "best", "--verbose", "error"]
-        bookmarks_result = subprocess.run(
-            bookmark_to_prefetch_command,
-            stdin=subprocess.DEVNULL,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-
-        if bookmarks_result.returncode:
-            raise Exception(
-                "Unable to predict commits to prefetch, error finding bookmark"
-                f" to prefetch: {bookmarks_result.stderr}"
-            )
-
-        bookmark_to_prefetch = bookmarks_result.stdout.decode().strip("\n")
-
-        commit_from_bookmark_commmand = [
-            "hg",
-            "log",
-            "-r",
-            bookmark_to_prefetch,
-            "-T",
-            "{node}",
-        ]
-        commits_result = subprocess.run(
-            commit_from_bookmark_commmand,
-            stdin=subprocess.DEVNULL,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-
-        if commits_result.returncode:
-            raise Exception(
-                "Unable to predict commits to prefetch, error converting"
-                f" bookmark to commit: {commits_result.stderr}"
-            )
-
-        # if we changed the working path lets change it back to what it was
-        # before
-        if not in_checkout:
-            os.chdir(current_path)
-
-        raw_commits = commits_result.stdout.decode()
-        # arc stable only gives us one commit, so for now this is a single
-        # commit, but we might use multiple in the future.
-        revisions = [re.sub("\n$", "", raw_commits)]
+        revisions = predict_revisions_for_checkout(checkout)
 
         if not silent:
             print(f"Prefetching for revisions: {revisions}")
@@ -140,17 +145,290 @@ def make_prefetch_request(
         )
 
 
-# prefetch all of the files specified by a profile in the given checkout
-def prefetch_profiles(
-    checkout: EdenCheckout,
+# Number of globFiles requests sent to EdenFS at the same time by default
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# Number of paths sent in each getFileInformation request when measuring the
+# size of the fetched files
+FILE_INFO_BATCH_SIZE = 1024
+
+
+class PrefetchJob(NamedTuple):
+    checkout: EdenCheckout
+    profile: str
+    globs: List[str]
+    revisions: Optional[List[str]]
+
+
+class PrefetchJobResult(NamedTuple):
+    job: PrefetchJob
+    glob: Optional[Glob]
+    # None when the file list was suppressed
+    num_files: Optional[int]
+    # None when the files were not measured
+    num_bytes: Optional[int]
+    duration: float
+    error: Optional[str]
+
+
+def normalize_globs(globs: Iterable[str]) -> Set[str]:
+    """Strip the patterns read from a profile and drop the blank ones."""
+    return {pattern.strip() for pattern in globs} - {""}
+
+
+def _recursive_prefix(pattern: str) -> Optional[str]:
+    """Return "dir/" if pattern matches everything under dir, ie. "dir/**",
+    or "" for "**"."""
+    if pattern != "**" and not pattern.endswith("/**"):
+        return None
+    prefix = pattern[:-2]
+    if any(c in prefix for c in "*?[{\\"):
+        return None
+    return prefix
+
+
+def _is_subsumed(pattern: str, prefixes: Set[str]) -> bool:
+    """Whether one of the recursive patterns in prefixes already matches
+    everything pattern does."""
+    components = pattern.split("/")
+    for i in range(len(components)):
+        prefix = "".join(c + "/" for c in components[:i])
+        if prefix not in prefixes:
+            continue
+        if pattern == prefix + "**":
+            continue
+        # Dotfiles are not matched by "**", so patterns that name them
+        # explicitly are still needed.
+        if any(c.startswith(".") for c in components[i:]):
+            continue
+        return True
+    return False
+
+
+def plan_prefetch_jobs(
+    jobs: List[PrefetchJob], scope_key: Callable[[PrefetchJob], Hashable]
+) -> List[PrefetchJob]:
+    """Merge the patterns of jobs that would fetch the same files.
+
+    Jobs with the same scope_key glob against the same files, so each
+    pattern is only kept in the first of these jobs that has it, and
+    patterns already covered by a recursive "dir/**" pattern of another job
+    in the scope are dropped. Jobs left without patterns are removed.
+    """
+    prefixes_by_scope: Dict[Hashable, Set[str]] = {}
+    for job in jobs:
+        prefixes = prefixes_by_scope.setdefault(scope_key(job), set())
+        for pattern in normalize_globs(job.globs):
+            prefix = _recursive_prefix(pattern)
+            if prefix is not None:
+                prefixes.add(prefix)
+
+    claimed_by_scope: Dict[Hashable, Set[str]] = {}
+    planned = []
+    for job in jobs:
+        key = scope_key(job)
+        prefixes = prefixes_by_scope[key]
+        claimed = claimed_by_scope.setdefault(key, set())
+        globs = []
+        for pattern in sorted(normalize_globs(job.globs)):
+            if pattern in claimed or _is_subsumed(pattern, prefixes):
+                continue
+            claimed.add(pattern)
+            globs.append(pattern)
+        if globs:
+            planned.append(job._replace(globs=globs))
+    return planned
+
+
+def _measure_file_sizes(client, checkout: EdenCheckout, files: List[bytes]) -> int:
+    total = 0
+    for i in range(0, len(files), FILE_INFO_BATCH_SIZE):
+        batch = files[i : i + FILE_INFO_BATCH_SIZE]
+        for info in client.getFileInformation(bytes(checkout.path), batch):
+            if info.getType() == FileInformationOrError.INFO:
+                total += info.get_info().size
+    return total
+
+
+def _run_prefetch_job(
     instance: EdenInstance,
-    profiles: List[str],
-    run_in_foreground: bool,
+    job: PrefetchJob,
+    enable_prefetch: bool,
+    silent: bool,
+    measure_bytes: bool,
+) -> PrefetchJobResult:
+    start = time.monotonic()
+    glob = None
+    num_files = None
+    num_bytes = None
+    error = None
+    try:
+        glob = make_prefetch_request(
+            checkout=job.checkout,
+            instance=instance,
+            all_profile_contents=set(job.globs),
+            enable_prefetch=enable_prefetch,
+            silent=silent,
+            revisions=job.revisions,
+            predict_revisions=False,
+        )
+        if glob is not None and not silent:
+            num_files = len(glob.matchingFiles)
+            # getFileInformation loads the inodes of the files, so they are
+            # only measured when they were fetched anyway. The working copy
+            # only reflects the current commit, so files globbed in other
+            # commits can't be measured.
+            if measure_bytes and enable_prefetch and job.revisions is None:
+                with instance.get_thrift_client_legacy() as client:
+                    num_bytes = _measure_file_sizes(
+                        client, job.checkout, glob.matchingFiles
+                    )
+    except Exception as ex:
+        error = str(ex)
+    return PrefetchJobResult(
+        job, glob, num_files, num_bytes, time.monotonic() - start, error
+    )
+
+
+def run_prefetch_jobs(
+    instance: EdenInstance,
+    jobs: List[PrefetchJob],
+    enable_prefetch: bool,
+    silent: bool,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    measure_bytes: bool = False,
+) -> List[PrefetchJobResult]:
+    """Send the globFiles requests of jobs to EdenFS, at most max_in_flight
+    at a time, and return their results in the order of jobs."""
+    results: Dict[int, PrefetchJobResult] = {}
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, max_in_flight)
+    ) as executor:
+        futures = {
+            executor.submit(
+                _run_prefetch_job, instance, job, enable_prefetch, silent, measure_bytes
+            ): index
+            for index, job in enumerate(jobs)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if not silent:
+                print(
+                    f"[{len(results)}/{len(jobs)}] {result.job.profile} in "
+                    f"{result.job.checkout.path}: "
+                    + (
+                        f"failed: {result.error}"
+                        if result.error is not None
+                        else f"done in {result.duration:.1f}s"
+                    )
+                )
+    return [results[index] for index in range(len(jobs))]
+
+
+def prefetch_profiles_concurrently(
+    instance: EdenInstance,
+    profiles_by_checkout: List[Tuple[EdenCheckout, List[str]]],
     enable_prefetch: bool,
     silent: bool,
     revisions: Optional[List[str]],
     predict_revisions: bool,
-) -> Optional[Glob]:
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    measure_bytes: bool = False,
+) -> List[PrefetchJobResult]:
+    """Prefetch the given profiles of several checkouts with one globFiles
+    request per checkout and profile, after removing the patterns that
+    other requests already fetch.
+
+    When the file lists are not needed, checkouts of the same repository at
+    the same commit share their patterns, since they fetch into the same
+    local store.
+
+    With measure_bytes, the size of the fetched files is also looked up so
+    that the throughput in bytes can be reported. This is skipped when
+    prefetching is disabled, since it would load the inodes of every file.
+    """
+    jobs = []
+    for checkout, profiles in profiles_by_checkout:
+        checkout_revisions = revisions
+        if predict_revisions:
+            checkout_revisions = predict_revisions_for_checkout(checkout)
+            if not silent:
+                print(f"Prefetching for revisions: {checkout_revisions}")
+        for profile in profiles:
+            jobs.append(
+                PrefetchJob(
+                    checkout=checkout,
+                    profile=profile,
+                    globs=sorted(get_contents_for_profile(checkout, profile, silent)),
+                    revisions=checkout_revisions,
+                )
+            )
+
+    def scope_key(job: PrefetchJob) -> Hashable:
+        if not silent:
+            # Every checkout needs its own file list
+            return job.checkout.path
+        if job.revisions is not None:
+            commits: Tuple[str, ...] = tuple(job.revisions)
+        else:
+            commits = (job.checkout.get_snapshot(),)
+        return (job.checkout.get_config().backing_repo, commits)
+
+    return run_prefetch_jobs(
+        instance,
+        plan_prefetch_jobs(jobs, scope_key),
+        enable_prefetch=enable_prefetch,
+        silent=silent,
+        max_in_flight=max_in_flight,
+        measure_bytes=measure_bytes and not silent,
+    )
+
+
+def merge_prefetch_results(results: List[PrefetchJobResult]) -> Glob:
+    """Combine the file lists of several jobs into a single Glob."""
+    seen = set()
+    matching_files = []
+    origin_hashes = []
+    for result in results:
+        if result.glob is None:
+            continue
+        for name, commit in zip(result.glob.matchingFiles, result.glob.originHashes):
+            if (name, commit) in seen:
+                continue
+            seen.add((name, commit))
+            matching_files.append(name)
+            origin_hashes.append(commit)
+    return Glob(matchingFiles=matching_files, dtypes=[], originHashes=origin_hashes)
+
+
+def _format_rate(amount: Optional[float], duration: float) -> str:
+    if amount is None or duration <= 0:
+        return "-"
+    return f"{amount / duration:.1f}"
+
+
+def print_prefetch_throughput(results: List[PrefetchJobResult]) -> None:
+    print("\nProfiles Prefetched: ")
+    columns = ["Profile", "Checkout", "Files", "Bytes", "Time", "Files/s", "MB/s"]
+    data = []
+    for result in results:
+        mb = None if result.num_bytes is None else result.num_bytes / (1024 * 1024)
+        data.append(
+            {
+                "Profile": result.job.profile,
+                "Checkout": str(result.job.checkout.path),
+                "Files": "-" if result.num_files is None else str(result.num_files),
+                "Bytes": "-" if result.num_bytes is None else str(result.num_bytes),
+                "Time": f"{result.duration:.1f}s",
+                "Files/s": _format_rate(result.num_files, result.duration),
+                "MB/s": _format_rate(mb, result.duration),
+            }
+        )
+    print(tabulate.tabulate(columns, data))
+
+
+def _prefetching_enabled(instance: EdenInstance, silent: bool) -> bool:
     if not should_prefetch_profiles(instance):
         if not silent:
             print(
@@ -158,75 +436,119 @@ def prefetch_profiles(
                 "This means prefetch-profiles.allow-prefetching is set in the "
                 "eden configs."
             )
+        return False
+    return True
+
+
+# Run a copy of the fetch command in the foreground of a background process.
+# checkout_args selects the checkouts to fetch, and profiles the profiles to
+# fetch in them, or None for their active profiles.
+def _fetch_in_background(
+    checkout_args: List[str],
+    profiles: Optional[List[str]],
+    enable_prefetch: bool,
+    revisions: Optional[List[str]],
+    predict_revisions: bool,
+    max_in_flight: int,
+) -> None:
+    # note that we intentionally skip the verbose flag, since this is
+    # running in the background there is no point to printing, eventually
+    # we might write to a log at which point we would want to forward
+    # the verbose flag
+    fetch_sub_command = (
+        get_eden_cli_cmd()
+        + ["prefetch_profile", "fetch"]
+        + checkout_args
+        + [
+            # Since we have already backgrounded, the background
+            # process should run the fetch in the foreground.
+            "--foreground",
+            "--max-in-flight",
+            str(max_in_flight),
+        ]
+    )
+
+    if profiles is not None:
+        fetch_sub_command += ["--profile-names"] + profiles
+
+    if revisions is not None:
+        fetch_sub_command += ["--commits"] + revisions
+
+    if predict_revisions:
+        fetch_sub_command += ["--predict-commits"]
+
+    # we need to say if we are not suppose to prefetch as it is the
+    # default to enable_prefetching
+    if not enable_prefetch:
+        fetch_sub_command += ["--skip-prefetch"]
+
+    creation_flags = 0
+    if sys.platform == "win32":
+        # TODO add subprocess.DETACHED_PROCESS only available in python 3.7+
+        # on windows, currently only 3.6 avialable
+        creation_flags |= subprocess.CREATE_NEW_PROCESS_GROUP
+
+    # Note that we can not just try except to catch warnings, because
+    # warnings do not raise errors so the except would not catch them.
+    # We would have to turn warnings into errors with
+    # `warnings.filterwarnings('error')` and then we could catch them with
+    # try except, but this is the more idomatic way to catch warnings.
+    with warnings.catch_warnings(record=True):
+        subprocess.Popen(
+            fetch_sub_command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            creationflags=creation_flags,
+        )
+
+
+# prefetch all of the files specified by a profile in the given checkout
+def prefetch_profiles(
+    checkout: EdenCheckout,
+    instance: EdenInstance,
+    profiles: List[str],
+    run_in_foreground: bool,
+    enable_prefetch: bool,
+    silent: bool,
+    revisions: Optional[List[str]],
+    predict_revisions: bool,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+) -> Optional[Glob]:
+    if not _prefetching_enabled(instance, silent):
         return None
 
     # if we are running in the foreground, skip creating a new process to
     # run in, just run it here.
     if run_in_foreground:
-        all_profile_contents = set()
-
-        for profile in profiles:
-            all_profile_contents |= get_contents_for_profile(checkout, profile, silent)
-
-        return make_prefetch_request(
-            checkout=checkout,
-            instance=instance,
-            all_profile_contents=all_profile_contents,
+        results = prefetch_profiles_concurrently(
+            instance,
+            [(checkout, profiles)],
             enable_prefetch=enable_prefetch,
             silent=silent,
             revisions=revisions,
             predict_revisions=predict_revisions,
+            max_in_flight=max_in_flight,
         )
+        for result in results:
+            if result.error is not None:
+                raise Exception(
+                    f"Unable to prefetch profile {result.job.profile}: "
+                    f"{result.error}"
+                )
+        return merge_prefetch_results(results)
     # if we are running in the background, create a copy of the fetch command
     # but in the foreground.
     else:
-        # note that we intentionally skip the verbose flag, since this is
-        # running in the background there is no point to printing, eventually
-        # we might write to a log at which point we would want to forward
-        # the verbose flag
-        fetch_sub_command = get_eden_cli_cmd() + [
-            "prefetch_profile",
-            "fetch",
-            "--checkout",
-            str(checkout.path),
-            # Since we have already backgrounded, the background
-            # process should run the fetch in the foreground.
-            "--foreground",
-        ]
-
-        fetch_sub_command += ["--profile-names"] + profiles
-
-        if revisions is not None:
-            fetch_sub_command += ["--commits"] + revisions
-
-        if predict_revisions:
-            fetch_sub_command += ["--predict-commits"]
-
-        # we need to say if we are not suppose to prefetch as it is the
-        # default to enable_prefetching
-        if not enable_prefetch:
-            fetch_sub_command += ["--skip-prefetch"]
-
-        creation_flags = 0
-        if sys.platform == "win32":
-            # TODO add subprocess.DETACHED_PROCESS only available in python 3.7+
-            # on windows, currently only 3.6 avialable
-            creation_flags |= subprocess.CREATE_NEW_PROCESS_GROUP
-
-        # Note that we can not just try except to catch warnings, because
-        # warnings do not raise errors so the except would not catch them.
-        # We would have to turn warnings into errors with
-        # `warnings.filterwarnings('error')` and then we could catch them with
-        # try except, but this is the more idomatic way to catch warnings.
-        with warnings.catch_warnings(record=True):
-            subprocess.Popen(
-                fetch_sub_command,
-                stdin=subprocess.DEVNULL,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                creationflags=creation_flags,
-            )
-            return None
+        _fetch_in_background(
+            ["--checkout", str(checkout.path)],
+            profiles,
+            enable_prefetch=enable_prefetch,
+            revisions=revisions,
+            predict_revisions=predict_revisions,
+            max_in_flight=max_in_flight,
+        )
+        return None
 
 
 def print_prefetch_results(results, print_commits):
@@ -484,12 +806,40 @@ class FetchProfileCmd(Subcmd):
             default=False,
             action="store_true",
         )
+        parser.add_argument(
+            "--all-checkouts",
+            help="Fetch the profiles in every checkout instead of only one."
+            " Checkouts of the same repository at the same commit share the"
+            " fetched files, so patterns common to their profiles are only"
+            " fetched once.",
+            default=False,
+            action="store_true",
+        )
+        parser.add_argument(
+            "--max-in-flight",
+            help="The maximum number of profiles fetched at the same time."
+            f" Defaults to {DEFAULT_MAX_IN_FLIGHT}.",
+            type=int,
+            default=DEFAULT_MAX_IN_FLIGHT,
+        )
+        parser.add_argument(
+            "--measure-bytes",
+            help="Also report the size and the MB/s of the files fetched by"
+            " each profile when the verbose flag is used with --all-checkouts."
+            " This looks up every fetched file, and is ignored when"
+            " --skip-prefetch is passed.",
+            default=False,
+            action="store_true",
+        )
 
     def run(self, args: argparse.Namespace) -> int:
         if sys.platform == "win32":
             # TODO(kmancini) prefetch profiles is not supported on windows yet
             return 0
 
+        if args.all_checkouts:
+            return self._fetch_all_checkouts(args)
+
         checkout = args.checkout
 
         instance, checkout, _rel_path = require_checkout(args, checkout)
@@ -513,6 +863,7 @@ class FetchProfileCmd(Subcmd):
             silent=not args.verbose,
             revisions=args.commits,
             predict_revisions=args.predict_commits,
+            max_in_flight=args.max_in_flight,
         )
 
         if args.verbose and result is not None:
@@ -522,6 +873,63 @@ class FetchProfileCmd(Subcmd):
 
         return 0
 
+    def _fetch_all_checkouts(self, args: argparse.Namespace) -> int:
+        if args.checkout is not None:
+            print("--checkout and --all-checkouts are mutually exclusive")
+            return 1
+
+        instance = get_eden_instance(args)
+        silent = not args.verbose
+        if not _prefetching_enabled(instance, silent):
+            return 0
+
+        if not args.foreground:
+            _fetch_in_background(
+                ["--all-checkouts"],
+                args.profile_names,
+                enable_prefetch=not args.skip_prefetch,
+                revisions=args.commits,
+                predict_revisions=args.predict_commits,
+                max_in_flight=args.max_in_flight,
+            )
+            return 0
+
+        profiles_by_checkout = []
+        for checkout in instance.get_checkouts():
+            if args.profile_names is not None:
+                profiles = args.profile_names
+            else:
+                profiles = checkout.get_config().active_prefetch_profiles
+            if profiles:
+                profiles_by_checkout.append((checkout, profiles))
+
+        if not profiles_by_checkout:
+            if args.verbose:
+                print("No profiles to fetch.")
+            return 0
+
+        start = time.monotonic()
+        results = prefetch_profiles_concurrently(
+            instance,
+            profiles_by_checkout,
+            enable_prefetch=not args.skip_prefetch,
+            silent=silent,
+            revisions=args.commits,
+            predict_revisions=args.predict_commits,
+            max_in_flight=args.max_in_flight,
+            measure_bytes=args.measure_bytes,
+        )
+
+        if args.verbose:
+            print_prefetch_throughput(results)
+            print(
+                f"\nFetched {len(results)} profiles in "
+                f"{len(profiles_by_checkout)} checkouts in "
+                f"{time.monotonic() - start:.1f}s"
+            )
+
+        return 1 if any(result.error is not None for result in results) else 0
+
 
 class PrefetchProfileCmd(Subcmd):
     NAME = "prefetch-profile"
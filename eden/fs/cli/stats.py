@@ -5,12 +5,15 @@
 # GNU General Public License version 2.
 
 import argparse
+import functools
 import io
 import logging
 import os
+import re
 import sys
 import textwrap
-from typing import Dict, List, Optional, cast
+import time
+from typing import Callable, Dict, List, Optional, Tuple, cast
 
 from . import cmd_util, stats_print, subcmd as subcmd_mod
 from .config import EdenInstance
@@ -29,6 +32,121 @@ Table2D = Dict[str, List[List[Optional[str]]]]
 # TODO: https://github.com/python/typeshed/issues/1240
 stdoutWrapper = cast(io.TextIOWrapper, sys.stdout)
 
+# Regular expressions matching the full names of the counters used by each
+# subcommand, so only those counters are fetched from the daemon.
+FUSE_COUNTERS_REGEX = r"fuse\.[^.]*_us\..*"
+HG_IMPORTER_COUNTERS_REGEX = r"hg_importer\..*"
+THRIFT_COUNTERS_REGEX = r"thrift\.EdenService\..*"
+THRIFT_LATENCY_COUNTERS_REGEX = r"thrift\.EdenService\..*\.time_process_us\..*"
+LOCAL_STORE_COUNTERS_REGEX = r"local_store\..*"
+OBJECT_STORE_COUNTERS_REGEX = r"object_store\..*"
+
+PERIOD_INDEX = {"60": 0, "600": 1, "3600": 2}
+PERCENTILE_INDEX = {"avg": 0, "p50": 1, "p90": 2, "p99": 3}
+
+# Index of the "All Time" column in a Table
+ALL_TIME_INDEX = 3
+
+# list of io system calls, if all flag is set we return counters for all the
+# systems calls, else we return counters for io systemcalls.
+IO_SYSCALLS = frozenset(
+    [
+        "open",
+        "read",
+        "write",
+        "symlink",
+        "readlink",
+        "mkdir",
+        "mknod",
+        "opendir",
+        "readdir",
+        "rmdir",
+    ]
+)
+
+
+def get_store_counters_regex(store: str) -> str:
+    return r"store\.{}\..*".format(re.escape(store))
+
+
+def query_counters(client, *regexes: str) -> DiagInfoCounters:
+    """Fetch the counters matching any of the regexes in one call."""
+    return client.getRegexCounters("|".join(f"({regex})" for regex in regexes))
+
+
+def add_watch_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--watch",
+        metavar="N",
+        type=float,
+        help="Every N seconds, print how many times per second each counter "
+        "was incremented since the previous query",
+    )
+
+
+def get_rate_table(previous: Table, current: Table, elapsed: float) -> Dict[str, float]:
+    """Compute the per-second rate of the "All Time" counts between two
+    tables."""
+    rates = {}
+    for key, values in current.items():
+        previous_values = previous.get(key)
+        previous_total = (
+            0 if previous_values is None else previous_values[ALL_TIME_INDEX]
+        )
+        delta = values[ALL_TIME_INDEX] - previous_total
+        # The daemon restarted if a counter went down
+        rates[key] = max(delta, 0) / elapsed
+    return rates
+
+
+def watch_table(
+    client,
+    regex: str,
+    make_table: Callable[[DiagInfoCounters], Table],
+    heading: str,
+    interval: float,
+    out: io.TextIOWrapper = stdoutWrapper,
+    iterations: Optional[int] = None,
+) -> None:
+    """Print the rates of the counts in a table every interval seconds, until
+    interrupted or after the given number of iterations."""
+    previous = make_table(query_counters(client, regex))
+    previous_time = time.monotonic()
+    while iterations is None or iterations > 0:
+        time.sleep(interval)
+        current = make_table(query_counters(client, regex))
+        now = time.monotonic()
+        out.write(time.strftime("%Y-%m-%d %H:%M:%S") + "\n")
+        stats_print.write_rate_table(
+            get_rate_table(previous, current, now - previous_time), heading, out
+        )
+        out.write("\n")
+        out.flush()
+        previous = current
+        previous_time = now
+        if iterations is not None:
+            iterations -= 1
+
+
+def run_table_command(
+    args: argparse.Namespace,
+    regex: str,
+    make_table: Callable[[DiagInfoCounters], Table],
+    heading: str,
+) -> int:
+    instance = cmd_util.get_eden_instance(args)
+    with instance.get_thrift_client_legacy() as client:
+        if args.watch is not None:
+            try:
+                watch_table(client, regex, make_table, heading, args.watch)
+            except KeyboardInterrupt:
+                pass
+            return 0
+        counters = query_counters(client, regex)
+
+    stats_print.write_table(make_table(counters), heading, sys.stdout)
+    return 0
+
 
 # Shows information like memory usage, list of mount points and number of inodes
 # loaded, unloaded, and materialized in the mount points, etc.
@@ -126,20 +244,20 @@ class FuseCmd(Subcmd):
             default=False,
             help="Show status for all the system calls",
         )
+        add_watch_argument(parser)
 
     def run(self, args: argparse.Namespace) -> int:
         out = sys.stdout
         stats_print.write_heading("Counts of I/O operations performed in EdenFs", out)
-        instance = cmd_util.get_eden_instance(args)
-        with instance.get_thrift_client_legacy() as client:
-            counters = client.getCounters()
 
         # If the arguments has --all flag, we will have args.all set to
         # true.
-        fuse_counters = get_fuse_counters(counters, args.all)
-        stats_print.write_table(fuse_counters, "SystemCall", out)
-
-        return 0
+        return run_table_command(
+            args,
+            FUSE_COUNTERS_REGEX,
+            lambda counters: get_fuse_counters(counters, args.all),
+            "SystemCall",
+        )
 
 
 # Filters Fuse counters from all the counters in ServiceData and returns a
@@ -149,45 +267,109 @@ class FuseCmd(Subcmd):
 # frequently called io system calls.
 def get_fuse_counters(counters: DiagInfoCounters, all_flg: bool) -> Table:
     table: Table = {}
-    index = {"60": 0, "600": 1, "3600": 2}
-
-    # list of io system calls, if all flag is set we return counters for all the
-    # systems calls, else we return counters for io systemcalls.
-    syscalls = [
-        "open",
-        "read",
-        "write",
-        "symlink",
-        "readlink",
-        "mkdir",
-        "mknod",
-        "opendir",
-        "readdir",
-        "rmdir",
-    ]
 
     for key in counters:
-        if key.startswith("fuse") and key.find(".count") >= 0:
-            tokens = key.split(".")
-            syscall = tokens[1][:-3]  # _us
-            if not all_flg and syscall not in syscalls:
-                continue
-
-            if syscall not in table.keys():
-                table[syscall] = [0, 0, 0, 0]
-            if len(tokens) == 3:
-                table[syscall][3] = int(counters[key])
-            else:
-                table[syscall][index[tokens[3]]] = int(counters[key])
+        parsed = _parse_fuse_count_name(key)
+        if parsed is None:
+            continue
+        syscall, column = parsed
+        if not all_flg and syscall not in IO_SYSCALLS:
+            continue
+
+        if syscall not in table.keys():
+            table[syscall] = [0, 0, 0, 0]
+        table[syscall][column] = int(counters[key])
 
     return table
 
 
+# The counter name parsers below are cached, since the same few hundred
+# counter names come back from every query.
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_fuse_count_name(key: str) -> Optional[Tuple[str, int]]:
+    """Parse "fuse.<syscall>_us.count[.<period>]" into the syscall and the
+    table column."""
+    if not key.startswith("fuse") or key.find(".count") == -1:
+        return None
+    tokens = key.split(".")
+    syscall = tokens[1][:-3]  # _us
+    if len(tokens) == 3:
+        return syscall, ALL_TIME_INDEX
+    column = PERIOD_INDEX.get(tokens[3])
+    if column is None:
+        return None
+    return syscall, column
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_fuse_latency_name(key: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Parse "fuse.<syscall>_us.<percentile>[.<period>]"."""
+    if not key.startswith("fuse") or key.find(".count") != -1:
+        return None
+    tokens = key.split(".")
+    if len(tokens) < 3:
+        return None
+    syscall = tokens[1][:-3]
+    period = tokens[3] if len(tokens) > 3 else None
+    return _checked_latency_name(syscall, tokens[2], period)
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_thrift_latency_name(key: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Parse "thrift.EdenService.<method>.time_process_us.<percentile>[.<period>]"."""
+    if not key.startswith("thrift.EdenService.") or key.find("time_process_us") == -1:
+        return None
+    tokens = key.split(".")
+    if len(tokens) < 5:
+        return None
+    period = tokens[5] if len(tokens) > 5 else None
+    return _checked_latency_name(tokens[2], tokens[4], period)
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_store_latency_name(
+    key: str, store: str
+) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Parse "store.<store>.<method>.<percentile>[.<period>]"."""
+    if not key.startswith("store.{}".format(store)) or key.find(".count") != -1:
+        return None
+    tokens = key.split(".")
+    if len(tokens) < 4:
+        return None
+    period = tokens[4] if len(tokens) > 4 else None
+    return _checked_latency_name(tokens[2], tokens[3], period)
+
+
+def _checked_latency_name(
+    operation: str, percentile: str, period: Optional[str]
+) -> Optional[Tuple[str, str, Optional[str]]]:
+    # Skip other counters that share the prefix, such as the number of
+    # pending imports in the hg store.
+    if percentile not in PERCENTILE_INDEX:
+        return None
+    if period is not None and period not in PERIOD_INDEX:
+        return None
+    return operation, percentile, period
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_table_name(
+    key: str, prefix: Tuple[str, ...], suffix: Tuple[str, ...]
+) -> Optional[str]:
+    """Return the row name of "<prefix>.<row name>.<suffix>" counters."""
+    tags = tuple(key.split("."))
+    if tags[-len(suffix) :] == suffix and tags[0 : len(prefix)] == prefix:
+        return ".".join(tags[len(prefix) : -len(suffix)])
+    return None
+
+
 def insert_latency_record(
     table: Table2D, value: int, operation: str, percentile: str, period: Optional[str]
 ) -> None:
-    period_table = {"60": 0, "600": 1, "3600": 2}
-    percentile_table = {"avg": 0, "p50": 1, "p90": 2, "p99": 3}
+    period_table = PERIOD_INDEX
+    percentile_table = PERCENTILE_INDEX
 
     def with_microsecond_units(i: int) -> str:
         if i:
@@ -232,7 +414,7 @@ class LatencyCmd(Subcmd):
 
         instance = cmd_util.get_eden_instance(args)
         with instance.get_thrift_client_legacy() as client:
-            counters = client.getCounters()
+            counters = query_counters(client, FUSE_COUNTERS_REGEX)
 
         table = get_fuse_latency(counters, args.all)
         stats_print.write_latency_table(table, sys.stdout)
@@ -246,30 +428,15 @@ class LatencyCmd(Subcmd):
 # which is a list of frequently called io system calls.
 def get_fuse_latency(counters: DiagInfoCounters, all_flg: bool) -> Table2D:
     table: Table2D = {}
-    syscalls = [
-        "open",
-        "read",
-        "write",
-        "symlink",
-        "readlink",
-        "mkdir",
-        "mknod",
-        "opendir",
-        "readdir",
-        "rmdir",
-    ]
 
     for key in counters:
-        if key.startswith("fuse") and key.find(".count") == -1:
-            tokens = key.split(".")
-            syscall = tokens[1][:-3]
-            if not all_flg and syscall not in syscalls:
-                continue
-            percentile = tokens[2]
-            period = None
-            if len(tokens) > 3:
-                period = tokens[3]
-            insert_latency_record(table, counters[key], syscall, percentile, period)
+        parsed = _parse_fuse_latency_name(key)
+        if parsed is None:
+            continue
+        syscall, percentile, period = parsed
+        if not all_flg and syscall not in IO_SYSCALLS:
+            continue
+        insert_latency_record(table, counters[key], syscall, percentile, period)
 
     return table
 
@@ -287,36 +454,38 @@ def get_fuse_latency(counters: DiagInfoCounters, all_flg: bool) -> Table2D:
     ],
 )
 class HgImporterCmd(Subcmd):
+    def setup_parser(self, parser: argparse.ArgumentParser) -> None:
+        add_watch_argument(parser)
+
     def run(self, args: argparse.Namespace) -> int:
         TITLE = "Counts of HgImporter requests performed in EdenFS"
         stats_print.write_heading(TITLE, sys.stdout)
 
-        instance = cmd_util.get_eden_instance(args)
-        with instance.get_thrift_client_legacy() as client:
-            counters = client.getCounters()
-
-        table = get_counter_table(counters, ["hg_importer"], ["count"])
-        stats_print.write_table(table, "HgImporter Request", sys.stdout)
-
-        return 0
+        return run_table_command(
+            args,
+            HG_IMPORTER_COUNTERS_REGEX,
+            lambda counters: get_counter_table(counters, ["hg_importer"], ["count"]),
+            "HgImporter Request",
+        )
 
 
 @stats_cmd("thrift", "Show the number of received thrift calls")
 class ThriftCmd(Subcmd):
+    def setup_parser(self, parser: argparse.ArgumentParser) -> None:
+        add_watch_argument(parser)
+
     def run(self, args: argparse.Namespace) -> int:
         TITLE = "Counts of Thrift calls performed in EdenFS"
         stats_print.write_heading(TITLE, sys.stdout)
 
-        instance = cmd_util.get_eden_instance(args)
-        with instance.get_thrift_client_legacy() as client:
-            counters = client.getRegexCounters("thrift.EdenService\\..*")
-
         PREFIX = ["thrift", "EdenService"]
         SUFFIX = ["num_calls", "sum"]
-        table = get_counter_table(counters, PREFIX, SUFFIX)
-        stats_print.write_table(table, "Thrift Call", sys.stdout)
-
-        return 0
+        return run_table_command(
+            args,
+            THRIFT_COUNTERS_REGEX,
+            lambda counters: get_counter_table(counters, PREFIX, SUFFIX),
+            "Thrift Call",
+        )
 
 
 @stats_cmd("thrift-latency", "Show the latency of received thrift calls")
@@ -327,7 +496,7 @@ class ThriftLatencyCmd(Subcmd):
 
         instance = cmd_util.get_eden_instance(args)
         with instance.get_thrift_client_legacy() as client:
-            counters = client.getCounters()
+            counters = query_counters(client, THRIFT_LATENCY_COUNTERS_REGEX)
 
         table = get_thrift_latency(counters)
         stats_print.write_latency_table(table, sys.stdout)
@@ -338,16 +507,9 @@ class ThriftLatencyCmd(Subcmd):
 def get_thrift_latency(counters: DiagInfoCounters) -> Table2D:
     table: Table2D = {}
     for key in counters:
-        if key.startswith("thrift.EdenService.") and key.find("time_process_us") != -1:
-            tokens = key.split(".")
-            if len(tokens) < 5:
-                continue
-            method = tokens[2]
-            percentile = tokens[4]
-            period = None
-            if len(tokens) > 5:
-                period = tokens[5]
-            insert_latency_record(table, counters[key], method, percentile, period)
+        parsed = _parse_thrift_latency_name(key)
+        if parsed is not None:
+            insert_latency_record(table, counters[key], *parsed)
     return table
 
 
@@ -369,7 +531,7 @@ def backing_store_latency(store: str, args: argparse.Namespace) -> int:
 
     instance = cmd_util.get_eden_instance(args)
     with instance.get_thrift_client_legacy() as client:
-        counters = client.getCounters()
+        counters = query_counters(client, get_store_counters_regex(store))
 
     table = get_store_latency(counters, store)
     stats_print.write_latency_table(table, sys.stdout)
@@ -381,14 +543,9 @@ def get_store_latency(counters: DiagInfoCounters, store: str) -> Table2D:
     table: Table2D = {}
 
     for key in counters:
-        if key.startswith("store.{}".format(store)) and key.find(".count") == -1:
-            tokens = key.split(".")
-            method = tokens[2]
-            percentile = tokens[3]
-            period = None
-            if len(tokens) > 4:
-                period = tokens[4]
-            insert_latency_record(table, counters[key], method, percentile, period)
+        parsed = _parse_store_latency_name(key, store)
+        if parsed is not None:
+            insert_latency_record(table, counters[key], *parsed)
     return table
 
 
@@ -412,7 +569,7 @@ class LocalStoreCmd(Subcmd):
 
         instance = cmd_util.get_eden_instance(args)
         with instance.get_thrift_client_legacy() as client:
-            counters = client.getRegexCounters("local_store\\..*")
+            counters = query_counters(client, LOCAL_STORE_COUNTERS_REGEX)
 
         columns = ("Table", "Ephemeral?", "Size")
         fmt = "{:<16} {:>10} {:>15}\n"
@@ -461,7 +618,7 @@ class ObjectStoreCommand(Subcmd):
 
         eden = cmd_util.get_eden_instance(args)
         with eden.get_thrift_client_legacy() as thrift:
-            counters = thrift.getRegexCounters("object_store\\..*")
+            counters = query_counters(thrift, OBJECT_STORE_COUNTERS_REGEX)
 
         table = get_counter_table(counters, ["object_store"], ["pct"])
         stats_print.write_table(table, "Object Store", sys.stdout)
@@ -472,11 +629,12 @@ class ObjectStoreCommand(Subcmd):
 def get_counter_table(counters: DiagInfoCounters, prefix: List, suffix: List) -> Table:
     table: Table = {}
 
+    prefix_tags = tuple(prefix)
+    suffix_tags = tuple(suffix)
     for key in counters:
-        tags = key.split(".")
-        if tags[-len(suffix) :] == suffix and tags[0 : len(prefix)] == prefix:
+        row_name = _parse_table_name(key, prefix_tags, suffix_tags)
+        if row_name is not None:
             TIME_SUFFIXES = (".60", ".600", ".3600", "")
-            row_name = ".".join(tags[len(prefix) : -len(suffix)])
             table[row_name] = [counters[key + suffix] for suffix in TIME_SUFFIXES]
 
     return table
@@ -6,7 +6,7 @@
 
 # Helper function to print the heading of a Stat Call.
 
-from typing import TextIO
+from typing import Dict, TextIO
 
 
 def write_heading(heading: str, out: TextIO) -> None:
@@ -78,6 +78,17 @@ def write_table(table, heading: str, out: TextIO) -> None:
         )
 
 
+def write_rate_table(table: Dict[str, float], heading: str, out: TextIO) -> None:
+    key_width = max([len(heading)] + list(map(len, table.keys()))) + 2
+
+    format_str = "{:<{}}{:>15}\n"
+    out.write(format_str.format(heading, key_width, "Per Second"))
+    border = "-" * (key_width + 15)
+    out.write(border + "\n")
+    for key in sorted(table):
+        out.write(format_str.format(key, key_width, f"{table[key]:.1f}"))
+
+
 def _center_strip_right(text: str, width: int) -> str:
     """Returns a string with sufficient leading whitespace such that `text`
     would be centered within the specified `width` plus a trailing newline."""
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2.
+
+import os
+import sys
+import time
+import unittest
+from pathlib import Path
+
+from eden.test_support.temporary_directory import TemporaryDirectoryMixin
+
+from .. import du as du_mod
+
+
+class DiskUsageScannerTest(unittest.TestCase, TemporaryDirectoryMixin):
+    def setUp(self) -> None:
+        self.temp_dir = Path(self.make_temporary_directory())
+        self.root = self.temp_dir / "root"
+        self.cache_path = self.temp_dir / "du_cache"
+        for dir_path in ("a", "a/b", "a/b/c", "d"):
+            (self.root / dir_path).mkdir(parents=True)
+        for file_path in ("x", "a/y", "a/b/z", "a/b/c/w", "d/v"):
+            (self.root / file_path).write_bytes(b"\x01" * 10000)
+
+        # Directories modified within the last couple of seconds are always
+        # re-read, so backdate them.
+        self._backdate()
+
+    def _backdate(self) -> None:
+        past = time.time() - 60
+        for dir_path, _dirnames, _filenames in os.walk(self.root):
+            os.utime(dir_path, (past, past))
+
+    def _walk_size(self) -> int:
+        total = 0
+        for dir_path, _dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                st = os.lstat(os.path.join(dir_path, name))
+                total += st.st_size if sys.platform == "win32" else st.st_blocks * 512
+        return total
+
+    def _scan(self, use_cache: bool = True) -> du_mod.DiskUsageScanner:
+        with du_mod.DiskUsageScanner(
+            self.cache_path, use_cache=use_cache, num_workers=4
+        ) as scanner:
+            self.usage = scanner.get_usage(self.root)
+        return scanner
+
+    def test_matches_serial_walk(self) -> None:
+        scanner = self._scan()
+        self.assertEqual(self._walk_size(), self.usage.size)
+        self.assertEqual([], self.usage.failed_paths)
+        self.assertEqual(5, scanner.num_dirs_scanned)
+
+    @unittest.skipIf(sys.platform == "win32", "hard links are not deduplicated")
+    def test_hardlinks_counted_once(self) -> None:
+        expected = self._walk_size()
+        os.link(self.root / "a/b/z", self.root / "d/z_link")
+        os.link(self.root / "a/b/z", self.root / "z_link")
+        self._scan()
+        self.assertEqual(expected, self.usage.size)
+
+    def test_cache_only_rereads_modified_dirs(self) -> None:
+        self._scan()
+        expected = self.usage.size
+
+        scanner = self._scan()
+        self.assertEqual(0, scanner.num_dirs_scanned)
+        self.assertEqual(expected, self.usage.size)
+
+        (self.root / "a/b/new").write_bytes(b"\x01" * 10000)
+        past = time.time() - 30
+        os.utime(self.root / "a/b", (past, past))
+        scanner = self._scan()
+        self.assertEqual(1, scanner.num_dirs_scanned)
+        self.assertEqual(self._walk_size(), self.usage.size)
+
+        scanner = self._scan(use_cache=False)
+        self.assertEqual(5, scanner.num_dirs_scanned)
+        self.assertEqual(self._walk_size(), self.usage.size)
+
+    def test_recently_modified_dirs_not_cached(self) -> None:
+        (self.root / "d/new").write_bytes(b"\x01" * 10000)
+        self._scan()
+        scanner = self._scan()
+        self.assertEqual(1, scanner.num_dirs_scanned)
+        self.assertEqual(self._walk_size(), self.usage.size)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2.
+
+import os
+import time
+import unittest
+from pathlib import Path
+from typing import List
+
+from eden.test_support.temporary_directory import TemporaryDirectoryMixin
+
+from .. import fsck as fsck_mod
+
+
+class FsckScanTest(unittest.TestCase, TemporaryDirectoryMixin):
+    def setUp(self) -> None:
+        self.state_dir = Path(self.make_temporary_directory())
+        overlay_dir = self.state_dir / "local"
+        overlay_dir.mkdir()
+        (overlay_dir / "info").touch()
+        for subdir_num in range(256):
+            (overlay_dir / "{:02x}".format(subdir_num)).mkdir()
+
+        checker = fsck_mod.FilesystemChecker(self.state_dir)
+        checker.overlay.write_empty_dir(checker.overlay.ROOT_INODE_NUMBER)
+        # Orphan inodes spread over several subdirectories
+        for inode_number in (5, 300, 301):
+            checker.overlay.write_empty_file(inode_number)
+        checker.overlay.write_empty_dir(7)
+        (overlay_dir / "0a" / "junk").touch()
+
+        # Subdirectories modified within the last couple of seconds are always
+        # re-read by incremental checks, so backdate them.
+        past = time.time() - 60
+        for subdir in overlay_dir.iterdir():
+            os.utime(subdir, (past, past))
+
+    def _scan(self, **kwargs) -> fsck_mod.FilesystemChecker:
+        with fsck_mod.FilesystemChecker(self.state_dir, **kwargs) as checker:
+            checker.scan_for_errors()
+        return checker
+
+    def _describe(self, checker: fsck_mod.FilesystemChecker) -> List[str]:
+        result = []
+        for error in checker.errors:
+            result.append(str(error))
+            detail = error.detailed_description()
+            if detail:
+                result.append(detail)
+        return sorted(result)
+
+    def test_parallel_scan_matches_serial_scan(self) -> None:
+        serial = self._scan(num_workers=1)
+        parallel = self._scan(num_workers=4)
+        self.assertEqual(self._describe(serial), self._describe(parallel))
+        self.assertEqual(serial._max_inode_number, parallel._max_inode_number)
+        self.assertEqual(301, parallel._max_inode_number)
+        self.assertEqual(256, parallel.num_subdirs_scanned)
+
+    def test_incremental_scan_rereads_modified_subdirs(self) -> None:
+        first = self._scan(num_workers=1, incremental=True)
+        self.assertEqual(256, first.num_subdirs_scanned)
+
+        second = self._scan(num_workers=1, incremental=True)
+        self.assertEqual(0, second.num_subdirs_scanned)
+        self.assertEqual(self._describe(first), self._describe(second))
+
+        # Adding an inode only invalidates the subdirectory it was added to
+        second.overlay.write_empty_file(513)
+        third = self._scan(num_workers=1, incremental=True)
+        self.assertEqual(1, third.num_subdirs_scanned)
+        self.assertEqual(513, third._max_inode_number)
+        self.assertEqual(
+            self._describe(self._scan(num_workers=1)), self._describe(third)
+        )
+
+        # The modification was too recent to trust the subdirectory mtime
+        fourth = self._scan(num_workers=1, incremental=True)
+        self.assertEqual(1, fourth.num_subdirs_scanned)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2.
+
+import stat
+import unittest
+from typing import List, Optional
+
+from .. import overlay as overlay_mod
+
+
+def _varint(value: int) -> bytes:
+    result = bytearray()
+    while value >= 0x80:
+        result.append((value & 0x7F) | 0x80)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+
+def _zigzag(value: int) -> bytes:
+    return _varint((value << 1) ^ (value >> 63))
+
+
+def _binary(value: bytes) -> bytes:
+    return _varint(len(value)) + value
+
+
+def _encode_entry(
+    mode: int, inode_number: int, hash: Optional[bytes], extra: bytes = b""
+) -> bytes:
+    # Fields 1 (i32), 2 (i64) and 3 (binary), each with a field id delta of 1
+    data = b"\x15" + _zigzag(mode) + b"\x16" + _zigzag(inode_number)
+    if hash is not None:
+        data += b"\x18" + _binary(hash)
+    return data + extra + b"\x00"
+
+
+def _encode_dir(entries: List[bytes], extra: bytes = b"") -> bytes:
+    data = b"\x1b" + _varint(len(entries))
+    if entries:
+        data += b"\x8c" + b"".join(entries)
+    return data + extra + b"\x00"
+
+
+class OverlayDecodeTest(unittest.TestCase):
+    def test_decode_entries(self) -> None:
+        data = _encode_dir(
+            [
+                _binary(b"src") + _encode_entry(stat.S_IFDIR | 0o755, 12, None),
+                _binary(b"README")
+                + _encode_entry(stat.S_IFREG | 0o644, 0, b"\x01" * 20),
+                _binary("été".encode("utf-8"))
+                + _encode_entry(stat.S_IFLNK | 0o777, 1 << 40, b""),
+            ]
+        )
+        entries = overlay_mod.decode_overlay_dir(data)
+        self.assertEqual(
+            {
+                "src": overlay_mod.OverlayDirEntry(stat.S_IFDIR | 0o755, 12, None),
+                "README": overlay_mod.OverlayDirEntry(
+                    stat.S_IFREG | 0o644, 0, b"\x01" * 20
+                ),
+                "été": overlay_mod.OverlayDirEntry(stat.S_IFLNK | 0o777, 1 << 40, b""),
+            },
+            entries,
+        )
+
+    def test_decode_empty(self) -> None:
+        self.assertEqual({}, overlay_mod.decode_overlay_dir(b"\x00"))
+        self.assertEqual({}, overlay_mod.decode_overlay_dir(_encode_dir([])))
+
+    def test_skip_unknown_fields(self) -> None:
+        # An entry with extra bool and list<i32> fields, and a directory with
+        # extra string and struct fields.
+        entry_extra = (
+            b"\x11" + b"\x19" + b"\x35" + _zigzag(1) + _zigzag(-2) + _zigzag(3)
+        )
+        dir_extra = (
+            b"\x18" + _binary(b"future") + b"\x0c" + _zigzag(20) + b"\x16\x02\x00"
+        )
+        data = _encode_dir(
+            [_binary(b"a") + _encode_entry(0o100644, 3, None, extra=entry_extra)],
+            extra=dir_extra,
+        )
+        self.assertEqual(
+            {"a": overlay_mod.OverlayDirEntry(0o100644, 3, None)},
+            overlay_mod.decode_overlay_dir(data),
+        )
+
+    def test_truncated_data(self) -> None:
+        data = _encode_dir(
+            [_binary(b"file") + _encode_entry(0o100644, 3, b"\x02" * 20)]
+        )
+        for length in range(len(data)):
+            with self.assertRaises(overlay_mod.InvalidOverlayFile):
+                overlay_mod.decode_overlay_dir(data[:length])
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2.
+
+import contextlib
+import io
+import threading
+import time
+import typing
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Hashable, List, Optional
+
+from .. import prefetch_profile as prefetch_profile_mod
+from ..prefetch_profile import PrefetchJob
+
+
+class FakeCheckout:
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+
+
+def _job(checkout: FakeCheckout, profile: str, globs: List[str]) -> PrefetchJob:
+    return PrefetchJob(
+        checkout=typing.cast(prefetch_profile_mod.EdenCheckout, checkout),
+        profile=profile,
+        globs=globs,
+        revisions=None,
+    )
+
+
+def _by_checkout(job: PrefetchJob) -> Hashable:
+    return job.checkout.path
+
+
+class PlanPrefetchJobsTest(unittest.TestCase):
+    def test_duplicate_patterns_fetched_once(self) -> None:
+        checkout = FakeCheckout("/a")
+        jobs = prefetch_profile_mod.plan_prefetch_jobs(
+            [
+                _job(checkout, "p1", ["foo/*.py", " bar/baz\n", ""]),
+                _job(checkout, "p2", ["bar/baz", "qux/**"]),
+                _job(checkout, "p3", ["foo/*.py"]),
+            ],
+            _by_checkout,
+        )
+        self.assertEqual(
+            [("p1", ["bar/baz", "foo/*.py"]), ("p2", ["qux/**"])],
+            [(job.profile, job.globs) for job in jobs],
+        )
+
+    def test_recursive_patterns_subsume_others(self) -> None:
+        checkout = FakeCheckout("/a")
+        jobs = prefetch_profile_mod.plan_prefetch_jobs(
+            [
+                _job(checkout, "p1", ["foo/bar/*.h", "foo/.hidden", "other/x"]),
+                _job(checkout, "p2", ["foo/**", "fo*/**"]),
+            ],
+            _by_checkout,
+        )
+        self.assertEqual(
+            [("p1", ["foo/.hidden", "other/x"]), ("p2", ["fo*/**", "foo/**"])],
+            [(job.profile, job.globs) for job in jobs],
+        )
+
+        jobs = prefetch_profile_mod.plan_prefetch_jobs(
+            [_job(checkout, "p1", ["**", "a/b", "c/*"])], _by_checkout
+        )
+        self.assertEqual([["**"]], [job.globs for job in jobs])
+
+    def test_scopes_are_independent(self) -> None:
+        first = FakeCheckout("/a")
+        second = FakeCheckout("/b")
+        jobs = [
+            _job(first, "p1", ["foo/**"]),
+            _job(second, "p1", ["foo/**", "foo/x"]),
+        ]
+        self.assertEqual(
+            [["foo/**"], ["foo/**"]],
+            [
+                job.globs
+                for job in prefetch_profile_mod.plan_prefetch_jobs(jobs, _by_checkout)
+            ],
+        )
+        self.assertEqual(
+            [("/a", ["foo/**"])],
+            [
+                (str(job.checkout.path), job.globs)
+                for job in prefetch_profile_mod.plan_prefetch_jobs(
+                    jobs, lambda job: "same-repo"
+                )
+            ],
+        )
+
+
+class FakeClient:
+    def __init__(self, instance: "FakeInstance") -> None:
+        self._instance = instance
+
+    def __enter__(self) -> "FakeClient":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        pass
+
+    def globFiles(self, params: object) -> Optional[object]:
+        instance = self._instance
+        with instance.lock:
+            instance.in_flight += 1
+            instance.max_in_flight = max(instance.max_in_flight, instance.in_flight)
+        time.sleep(0.01)
+        with instance.lock:
+            instance.in_flight -= 1
+            instance.num_requests += 1
+        if instance.fail:
+            raise Exception("glob failed")
+        return FakeGlob(instance.files)
+
+    def getFileInformation(self, mount: bytes, paths: List[bytes]) -> List[object]:
+        with self._instance.lock:
+            self._instance.num_file_info_requests += 1
+        return [FakeFileInfo(len(path)) for path in paths]
+
+
+class FakeGlob:
+    def __init__(self, files: List[bytes]) -> None:
+        self.matchingFiles = files
+
+
+class FakeFileInfo:
+    def __init__(self, size: int) -> None:
+        self._size = size
+
+    def getType(self) -> int:
+        return prefetch_profile_mod.FileInformationOrError.INFO
+
+    def get_info(self) -> object:
+        return typing.cast(object, SimpleNamespace(size=self._size))
+
+
+class FakeInstance:
+    def __init__(self, fail: bool = False, files: Optional[List[bytes]] = None) -> None:
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.num_requests = 0
+        self.num_file_info_requests = 0
+        self.fail = fail
+        self.files: List[bytes] = files or []
+
+    def get_thrift_client_legacy(self) -> FakeClient:
+        return FakeClient(self)
+
+
+class RunPrefetchJobsTest(unittest.TestCase):
+    def _run(
+        self,
+        instance: FakeInstance,
+        jobs: List[PrefetchJob],
+        max_in_flight: int,
+        enable_prefetch: bool = True,
+        silent: bool = True,
+        measure_bytes: bool = False,
+    ) -> List[prefetch_profile_mod.PrefetchJobResult]:
+        return prefetch_profile_mod.run_prefetch_jobs(
+            typing.cast(prefetch_profile_mod.EdenInstance, instance),
+            jobs,
+            enable_prefetch=enable_prefetch,
+            silent=silent,
+            max_in_flight=max_in_flight,
+            measure_bytes=measure_bytes,
+        )
+
+    def test_bounded_in_flight(self) -> None:
+        instance = FakeInstance()
+        jobs = [_job(FakeCheckout(f"/{i}"), "p", ["**"]) for i in range(12)]
+        results = self._run(instance, jobs, max_in_flight=3)
+        self.assertEqual(12, instance.num_requests)
+        self.assertLessEqual(instance.max_in_flight, 3)
+        self.assertEqual(jobs, [result.job for result in results])
+        self.assertTrue(all(result.error is None for result in results))
+
+    def test_errors_are_reported_per_job(self) -> None:
+        instance = FakeInstance(fail=True)
+        jobs = [_job(FakeCheckout(f"/{i}"), "p", ["**"]) for i in range(2)]
+        results = self._run(instance, jobs, max_in_flight=2)
+        self.assertEqual(["glob failed"] * 2, [result.error for result in results])
+
+    def test_bytes_only_measured_when_requested(self) -> None:
+        instance = FakeInstance(files=[b"a", b"bc"])
+        jobs = [_job(FakeCheckout("/0"), "p", ["**"])]
+        with contextlib.redirect_stdout(io.StringIO()):
+            [result] = self._run(instance, jobs, max_in_flight=1, silent=False)
+            self.assertEqual((2, None), (result.num_files, result.num_bytes))
+            self.assertEqual(0, instance.num_file_info_requests)
+
+            [result] = self._run(
+                instance, jobs, max_in_flight=1, silent=False, measure_bytes=True
+            )
+            self.assertEqual((2, 3), (result.num_files, result.num_bytes))
+            self.assertEqual(1, instance.num_file_info_requests)
+
+    def test_bytes_not_measured_without_prefetch(self) -> None:
+        instance = FakeInstance(files=[b"a", b"bc"])
+        jobs = [_job(FakeCheckout("/0"), "p", ["**"])]
+        with contextlib.redirect_stdout(io.StringIO()):
+            [result] = self._run(
+                instance,
+                jobs,
+                max_in_flight=1,
+                enable_prefetch=False,
+                silent=False,
+                measure_bytes=True,
+            )
+        self.assertEqual((2, None), (result.num_files, result.num_bytes))
+        self.assertEqual(0, instance.num_file_info_requests)
@@ -4,10 +4,13 @@
 # This software may be used and distributed according to the terms of the
 # GNU General Public License version 2.
 
+import re
 import unittest
 from io import StringIO
+from typing import List
+from unittest.mock import patch
 
-from .. import stats_print
+from .. import stats, stats_print
 from ..stats import DiagInfoCounters, get_counter_table, get_store_latency
 
 
@@ -166,3 +169,87 @@ class HgBackingStoreStatsTest(unittest.TestCase):
                 ["9920 μs", "9930 μs", "9940 μs", "9910 μs"],
             ],
         )
+
+    def test_get_store_latency_skips_other_counters(self) -> None:
+        counters: DiagInfoCounters = {
+            "store.hg.get_blob.p50": 40,
+            "store.hg.pending_import.blob.count": 3,
+            "store.hg.pending_import.blob.max_duration_us": 30,
+        }
+        table = get_store_latency(counters, "hg")
+        self.assertEqual(["get_blob"], list(table))
+
+
+class FakeCountersClient:
+    def __init__(self, snapshots: List[DiagInfoCounters]) -> None:
+        self.snapshots = snapshots
+        self.regexes: List[str] = []
+
+    def getRegexCounters(self, regex: str) -> DiagInfoCounters:
+        self.regexes.append(regex)
+        return {
+            key: value
+            for key, value in self.snapshots.pop(0).items()
+            if re.fullmatch(regex, key)
+        }
+
+
+class CounterQueryTest(unittest.TestCase):
+    def test_query_fetches_only_requested_counters(self) -> None:
+        client = FakeCountersClient(
+            [
+                {
+                    "fuse.read_us.count": 5,
+                    "fuse.read_us.p50": 40,
+                    "fuse.fbsource.live_requests.count": 2,
+                    "hg_importer.cat_file.count": 1,
+                    "local_store.blob.size": 1000,
+                }
+            ]
+        )
+        counters = stats.query_counters(
+            client, stats.FUSE_COUNTERS_REGEX, stats.LOCAL_STORE_COUNTERS_REGEX
+        )
+        self.assertEqual(
+            {
+                "fuse.read_us.count": 5,
+                "fuse.read_us.p50": 40,
+                "local_store.blob.size": 1000,
+            },
+            counters,
+        )
+        self.assertEqual(1, len(client.regexes))
+
+    def test_rate_table(self) -> None:
+        previous = {"read": [1, 2, 3, 100], "write": [0, 0, 0, 50]}
+        current = {"read": [1, 2, 3, 120], "write": [0, 0, 0, 10], "open": [0, 0, 0, 4]}
+        self.assertEqual(
+            {"read": 10.0, "write": 0.0, "open": 2.0},
+            stats.get_rate_table(previous, current, 2.0),
+        )
+
+    def test_watch_prints_rates(self) -> None:
+        client = FakeCountersClient(
+            [
+                {"hg_importer.cat_file.count": 10},
+                {"hg_importer.cat_file.count": 40},
+            ]
+        )
+        out = StringIO()
+        with patch.object(stats.time, "sleep"), patch.object(
+            stats.time, "monotonic", side_effect=[100.0, 110.0]
+        ):
+            stats.watch_table(
+                client,
+                stats.HG_IMPORTER_COUNTERS_REGEX,
+                lambda counters: {
+                    "cat_file": [0, 0, 0, counters["hg_importer.cat_file.count"]]
+                },
+                "HgImporter Request",
+                10,
+                out=out,
+                iterations=1,
+            )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(["HgImporter", "Request", "Per", "Second"], lines[1].split())
+        self.assertEqual(["cat_file", "3.0"], lines[3].split())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2.
+
+import io
+import math
+import unittest
+
+from .. import top_history
+from ..top_history import ProcessAccess, RingBuffer, Sample, SampleHistory
+
+
+def _access(pid: int, total: int, duration_ns: int) -> ProcessAccess:
+    return ProcessAccess(
+        mount="/data/users/me/repo",
+        pid=pid,
+        cmd="ls\x00-l",
+        reads=total,
+        writes=0,
+        total=total,
+        backing_store_imports=0,
+        duration_ns=duration_ns,
+        fetches=None,
+    )
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_wraps_around(self) -> None:
+        ring = RingBuffer(3)
+        self.assertEqual([], ring.to_list())
+        for value in range(5):
+            ring.append(value)
+        self.assertEqual(3, len(ring))
+        self.assertEqual([2.0, 3.0, 4.0], ring.to_list())
+        self.assertEqual([3.0, 4.0], ring.to_list(last=2))
+        self.assertEqual(4.0, ring[-1])
+        with self.assertRaises(IndexError):
+            ring[3]
+
+
+class StatisticsTest(unittest.TestCase):
+    def test_percentile(self) -> None:
+        values = [4.0, 1.0, math.nan, 3.0, 2.0]
+        self.assertEqual(1.0, top_history.percentile(values, 0))
+        self.assertEqual(2.5, top_history.percentile(values, 50))
+        self.assertEqual(4.0, top_history.percentile(values, 100))
+        self.assertTrue(math.isnan(top_history.percentile([], 50)))
+
+    def test_rates(self) -> None:
+        rates = top_history.rates([10, 30, 5, math.nan], [0.0, 2.0, 3.0, 4.0])
+        self.assertEqual(10.0, rates[0])
+        # The counter was reset, and then missing
+        self.assertTrue(math.isnan(rates[1]))
+        self.assertTrue(math.isnan(rates[2]))
+
+    def test_interval_rates(self) -> None:
+        rates = top_history.interval_rates([5, 10, 3, 4], [0.0, 2.0, 2.0, 4.0])
+        self.assertEqual(3, len(rates))
+        self.assertEqual(5.0, rates[0])
+        # Two samples at the same time
+        self.assertTrue(math.isnan(rates[1]))
+        self.assertEqual(2.0, rates[2])
+
+
+class SampleHistoryTest(unittest.TestCase):
+    def test_series_stay_aligned(self) -> None:
+        history = SampleHistory(capacity=4)
+        history.add(Sample(1.0, {"a": 1}, [_access(10, 2, 200)]))
+        history.add(Sample(2.0, {"a": 3, "b": 7}, []))
+        history.add(Sample(3.0, {"b": 8}, [_access(10, 1, 50), _access(11, 4, 40)]))
+
+        self.assertEqual([1.0, 2.0, 3.0], history.timestamps.to_list())
+        self.assertEqual(1.0, history.counter_values("a")[0])
+        self.assertEqual(3.0, history.counter_values("a")[1])
+        self.assertTrue(math.isnan(history.counter_values("a")[2]))
+        self.assertEqual([7.0, 8.0], history.counter_values("b", last=2))
+        self.assertEqual(2.0, history.counter_rates("a")[0])
+        self.assertTrue(math.isnan(history.counter_rates("a", last=1)[0]))
+        self.assertEqual([2.0, 0.0, 1.0], history.process_values(10, "total"))
+        self.assertEqual([0.0, 0.0, 4.0], history.process_values(11, "total"))
+        self.assertEqual([100.0, 50.0], history.process_latencies_ns(10))
+        self.assertEqual([0.0, 1.0], history.process_rates(10, "total"))
+        self.assertEqual([4.0], history.process_rates(11, "total", last=1))
+
+    def test_forgets_old_processes(self) -> None:
+        history = SampleHistory(capacity=2)
+        history.add(Sample(1.0, {}, [_access(10, 1, 1)]))
+        history.add(Sample(2.0, {}, []))
+        self.assertEqual([10], history.pids())
+        history.add(Sample(3.0, {}, []))
+        self.assertEqual([], history.pids())
+        self.assertEqual([], history.process_values(10, "total"))
+
+
+class RecordingTest(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        samples = [
+            Sample(1.5, {"fuse.repo.live_requests.count": 3}, [_access(10, 2, 20)]),
+            Sample(2.5, {}, [_access(11, 0, 0)._replace(mount="\udcff", fetches=7)]),
+        ]
+        f = io.StringIO()
+        for sample in samples:
+            top_history.write_sample(f, sample)
+        f.seek(0)
+        self.assertEqual(samples, list(top_history.read_samples(f)))
+
+    def test_invalid_recording(self) -> None:
+        f = io.StringIO('{"version": 1, "timestamp": 1.0}\n')
+        with self.assertRaisesRegex(ValueError, "line 1"):
+            list(top_history.read_samples(f))
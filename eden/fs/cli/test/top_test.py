@@ -4,6 +4,7 @@
 # This software may be used and distributed according to the terms of the
 # GNU General Public License version 2.
 
+import math
 import unittest
 
 from ..top import Process, format_duration
@@ -37,3 +38,14 @@ class TopTest(unittest.TestCase):
         self.assertEqual(format_duration(1 * 1000 * 1000 * 1000 * 60), "1m")
         self.assertEqual(format_duration(1 * 1000 * 1000 * 1000 * 60 * 60), "1h")
         self.assertEqual(format_duration(1 * 1000 * 1000 * 1000 * 60 * 60 * 24), "1d")
+
+    def test_history_columns(self):
+        self.process.set_history([math.nan, 4.0, math.nan], [100.0, 300.0, 200.0])
+        other = Process(43, "ls", "fbsource")
+        other.set_history([2.0], [1000.0])
+        self.process.last_access = other.last_access = 0.0
+        self.process.aggregate(other)
+        row = self.process.get_row()
+        self.assertEqual(6.0, row.fuse_rate)
+        self.assertAlmostEqual(790.0, row.fuse_latency)
+        self.assertEqual(0.0, Process(44, "ls", "fbsource").get_latency_ns())
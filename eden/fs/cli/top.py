@@ -6,18 +6,20 @@
 
 import argparse
 import collections
+import contextlib
 import copy
 import datetime
+import math
 import os
 import socket
 import time
 from enum import Enum
 from textwrap import wrap
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple
 
 from facebook.eden.ttypes import AccessCounts
 
-from . import cmd_util
+from . import cmd_util, top_history
 from .util import format_cmd, format_mount
 
 
@@ -35,7 +37,7 @@ HELP_SECTION_CONCERN = "concern? "
 
 Row = collections.namedtuple(
     "Row",
-    "top_pid mount fuse_reads fuse_writes fuse_total fuse_fetch fuse_backing_store_imports fuse_duration fuse_last_access command",
+    "top_pid mount fuse_reads fuse_writes fuse_total fuse_rate fuse_fetch fuse_backing_store_imports fuse_duration fuse_latency fuse_last_access command",
 )
 
 COLUMN_TITLES = Row(
@@ -44,9 +46,11 @@ COLUMN_TITLES = Row(
     fuse_reads="FUSE R",
     fuse_writes="FUSE W",
     fuse_total="FUSE COUNT",
+    fuse_rate="FUSE/S",
     fuse_fetch="FUSE FETCH",
     fuse_backing_store_imports="IMPORTS",
     fuse_duration="FUSE TIME",
+    fuse_latency="FUSE P90",
     fuse_last_access="FUSE LAST",
     command="CMD",
 )
@@ -56,9 +60,11 @@ COLUMN_SPACING = Row(
     fuse_reads=10,
     fuse_writes=10,
     fuse_total=10,
+    fuse_rate=10,
     fuse_fetch=10,
     fuse_backing_store_imports=10,
     fuse_duration=10,
+    fuse_latency=10,
     fuse_last_access=10,
     command=25,
 )
@@ -68,9 +74,11 @@ COLUMN_ALIGNMENT = Row(
     fuse_reads=">",
     fuse_writes=">",
     fuse_total=">",
+    fuse_rate=">",
     fuse_fetch=">",
     fuse_backing_store_imports=">",
     fuse_duration=">",
+    fuse_latency=">",
     fuse_last_access=">",
     command="<",
 )
@@ -80,9 +88,11 @@ COLUMN_REVERSE_SORT = Row(
     fuse_reads=True,
     fuse_writes=True,
     fuse_total=True,
+    fuse_rate=True,
     fuse_fetch=True,
     fuse_backing_store_imports=True,
     fuse_duration=True,
+    fuse_latency=True,
     fuse_last_access=True,
     command=False,
 )
@@ -94,6 +104,10 @@ def format_duration(duration):
     return format_time(duration, modulos, suffixes)
 
 
+def format_rate(rate):
+    return f"{rate:.1f}"
+
+
 def format_last_access(last_access):
     elapsed = int(time.monotonic() - last_access)
 
@@ -118,9 +132,11 @@ COLUMN_FORMATTING = Row(
     fuse_reads=lambda x: x,
     fuse_writes=lambda x: x,
     fuse_total=lambda x: x,
+    fuse_rate=format_rate,
     fuse_fetch=lambda x: x,
     fuse_backing_store_imports=lambda x: x,
     fuse_duration=format_duration,
+    fuse_latency=lambda x: format_duration(int(x)),
     fuse_last_access=format_last_access,
     command=lambda x: x,
 )
@@ -157,6 +173,17 @@ class RequestMetric(Enum):
 STATS_NOT_AVAILABLE = -1
 STATS_NOT_IMPLEMENTED = -2
 
+HISTORY_PERCENTILES = (50, 90, 99)
+
+# Percentile of the per-request latency of each process, over the history
+PROCESS_LATENCY_PERCENTILE = 90
+
+# Cumulative counters of the objects imported from hg, whose rates are shown
+IMPORT_COUNTERS = {
+    ImportObject.BLOB: "store.hg.import_blob.count",
+    ImportObject.TREE: "store.hg.import_tree.count",
+}
+
 IMPORT_TIME_LOWER_WARN_THRESHOLD = 10  # seconds
 IMPORT_TIME_UPPER_WARN_THRESHOLD = 30  # seconds
 
@@ -410,20 +437,43 @@ class Top:
         self.pending_imports = {}
         self.fuse_requests_summary = {}
 
+        self.history = top_history.SampleHistory()
+        # Time of the last sample, which is in the past when replaying
+        self.sample_time: Optional[float] = None
+        self.replaying = False
+        self.recording: Optional[TextIO] = None
+
     def start(self, args: argparse.Namespace) -> int:
         self.state = State.MAIN
         self.ephemeral = args.ephemeral
         self.refresh_rate = args.refresh_rate
 
+        if args.replay:
+            self.replaying = True
+            with open(args.replay) as f:
+                samples = top_history.read_samples(f)
+                self._run_curses(lambda: next(samples, None))
+            return 0
+
         eden = cmd_util.get_eden_instance(args)
-        with eden.get_thrift_client_legacy() as client:
-            try:
-                self.curses.wrapper(self.run(client))
-            except KeyboardInterrupt:
-                pass
+        with contextlib.ExitStack() as stack:
+            if args.record:
+                self.recording = stack.enter_context(open(args.record, "a"))
+            client = stack.enter_context(eden.get_thrift_client_legacy())
+            self._run_curses(
+                lambda: top_history.fetch_sample(client, self.refresh_rate)
+            )
         return 0
 
-    def run(self, client):
+    def _run_curses(
+        self, next_sample: Callable[[], Optional[top_history.Sample]]
+    ) -> None:
+        try:
+            self.curses.wrapper(self.run(next_sample))
+        except KeyboardInterrupt:
+            pass
+
+    def run(self, next_sample: Callable[[], Optional[top_history.Sample]]):
         def mainloop(stdscr):
             window = Window(stdscr, self.refresh_rate)
 
@@ -438,7 +488,10 @@ class Top:
 
             while self.running():
                 if self.state == State.MAIN:
-                    self.update(client)
+                    sample = next_sample()
+                    # A replay stays on its last sample once it is over
+                    if sample is not None:
+                        self.update(sample)
                     self.render(window)
                 elif self.state == State.HELP:
                     self.render_help(window)
@@ -449,40 +502,48 @@ class Top:
     def running(self):
         return self.state == State.MAIN or self.state == State.HELP
 
-    def update(self, client):
+    def update(self, sample: top_history.Sample) -> None:
+        if self.recording is not None:
+            top_history.write_sample(self.recording, sample)
+        self.history.add(sample)
+        self.sample_time = sample.timestamp
+
         if self.ephemeral:
             self.processes.clear()
 
-        self._update_summary_stats(client)
-        counts = client.getAccessCounts(self.refresh_rate)
-
-        for mount, accesses in counts.accessesByMount.items():
-            for pid, access_counts in accesses.accessCountsByPid.items():
-                if pid not in self.processes:
-                    cmd = counts.cmdsByPid.get(pid, b"<kernel>")
-                    self.processes[pid] = Process(pid, cmd, mount)
+        self._update_summary_stats(sample.counters)
 
-                self.processes[pid].increment_counts(access_counts)
-                self.processes[pid].last_access = time.monotonic()
-
-            # When querying older versions of EdenFS fetchCountsByPid will be None
-            fetch_counts_by_pid = accesses.fetchCountsByPid or {}
-            for pid, fetch_counts in fetch_counts_by_pid.items():
-                if pid not in self.processes:
-                    cmd = counts.cmdsByPid.get(pid, b"<kernel>")
-                    self.processes[pid] = Process(pid, cmd, mount)
-
-                self.processes[pid].set_fetchs(fetch_counts)
-                self.processes[pid].last_access = time.monotonic()
-
-        for pid in self.processes.keys():
-            self.processes[pid].is_running = os.path.exists(f"/proc/{pid}/")
+        for access in sample.accesses:
+            if access.pid not in self.processes:
+                self.processes[access.pid] = Process(
+                    access.pid, access.cmd, access.mount
+                )
 
-    def _update_summary_stats(self, client):
-        client.flushStatsNow()
-        counter_regex = r"((store\.hg.*)|(fuse\.([^\.]*)\..*requests.*))"
-        counters = client.getRegexCounters(counter_regex)
+            process = self.processes[access.pid]
+            process.increment_counts(
+                AccessCounts(
+                    fsChannelTotal=access.total,
+                    fsChannelReads=access.reads,
+                    fsChannelWrites=access.writes,
+                    fsChannelBackingStoreImports=access.backing_store_imports,
+                    fsChannelDurationNs=access.duration_ns,
+                )
+            )
+            if access.fetches is not None:
+                process.set_fetchs(access.fetches)
+            process.last_access = time.monotonic()
+
+        if self.replaying:
+            # Processes are unlikely to still be running, or to be the same
+            # processes, on this machine.
+            sampled_pids = {access.pid for access in sample.accesses}
+            for pid, process in self.processes.items():
+                process.is_running = pid in sampled_pids
+        else:
+            for pid in self.processes.keys():
+                self.processes[pid].is_running = os.path.exists(f"/proc/{pid}/")
 
+    def _update_summary_stats(self, counters):
         self.pending_imports = self._update_import_stats(counters)
         self.fuse_requests_summary = self._update_fuse_request_stats(counters)
 
@@ -595,7 +656,11 @@ class Top:
         width = window.get_width()
         TITLE = "eden top"
         hostname = socket.gethostname()[:width]
-        date = datetime.datetime.now().strftime("%x %X")[:width]
+        if self.replaying and self.sample_time is not None:
+            now = datetime.datetime.fromtimestamp(self.sample_time)
+        else:
+            now = datetime.datetime.now()
+        date = now.strftime("%x %X")[:width]
         extra_space = width - len(TITLE + hostname + date)
 
         # left: title
@@ -616,10 +681,12 @@ class Top:
             fuse_request_header, window.get_width(), self.curses.A_UNDERLINE
         )
         self.render_fuse_request_section(window, len_longest_stage)
+        self.render_fuse_request_history(window)
 
         imports_header = "outstanding object imports:"
         window.write_line(imports_header, window.get_width(), self.curses.A_UNDERLINE)
         self.render_import_section(window, len_longest_stage)
+        self.render_import_rates(window)
 
     def render_fuse_request_section(self, window, len_longest_stage):
         section_size = window.get_width() // 2
@@ -633,6 +700,36 @@ class Top:
             separator = "  |  "
         window.write_new_line()
 
+    def render_fuse_request_history(self, window: Window) -> None:
+        durations = self._get_live_request_duration_history()
+        if not durations:
+            return
+        stats = "  ".join(
+            f"p{pct}: {top_history.percentile(durations, pct):.3f}s"
+            for pct in HISTORY_PERCENTILES
+        )
+        window.write_line(
+            f"longest live request over the last {len(durations)} samples -- "
+            f"{stats}  max: {max(durations):.3f}s",
+            window.get_width(),
+        )
+
+    def _get_live_request_duration_history(self) -> List[float]:
+        """The longest live FUSE request of any mount in each sample, in
+        seconds."""
+        series = [
+            self.history.counter_values(name)
+            for name in self.history.counter_names()
+            if self.parse_fuse_sumary_counter_name(name)
+            == (RequestStage.LIVE, RequestMetric.MAX_DURATION)
+        ]
+        durations = []
+        for values in zip(*series):
+            known = [value for value in values if not math.isnan(value)]
+            if known:
+                durations.append(max(known) / 1000000)
+        return durations
+
     def render_fuse_request_part(
         self, window, import_stage, len_longest_stage, section_size
     ):
@@ -648,6 +745,25 @@ class Top:
         for import_stage in RequestStage:
             self.render_import_row(window, import_stage, len_longest_stage)
 
+    def render_import_rates(self, window: Window) -> None:
+        for import_type, counter in IMPORT_COUNTERS.items():
+            rates = [
+                rate
+                for rate in self.history.counter_rates(counter)
+                if not math.isnan(rate)
+            ]
+            if not rates:
+                continue
+            stats = "  ".join(
+                f"p{pct}: {top_history.percentile(rates, pct):.1f}"
+                for pct in HISTORY_PERCENTILES
+            )
+            window.write_line(
+                f"{import_type.value} imports/s over the last {len(rates)} "
+                f"samples -- now: {rates[-1]:.1f}  {stats}",
+                window.get_width(),
+            )
+
     def render_import_row(
         self, window: Window, import_stage: RequestStage, len_longest_stage: int
     ) -> None:
@@ -734,7 +850,11 @@ class Top:
 
     def render_rows(self, window: Window) -> None:
         aggregated_processes: Dict[int, Process] = {}
-        for process in self.processes.values():
+        for pid, process in self.processes.items():
+            process.set_history(
+                self.history.process_rates(pid, "total", last=1),
+                self.history.process_latencies_ns(pid),
+            )
             key = process.get_key()
             if key in aggregated_processes:
                 aggregated_processes[key].aggregate(process)
@@ -807,7 +927,9 @@ class Top:
             "of all the current fuse requests. 'total pending' refers to "
             "all the current FUSE requests that are queued or live from the "
             "kernels view. 'live' only refers to FUSE requests that are "
-            "currently being processed by eden."
+            "currently being processed by eden. The line below shows "
+            "percentiles of the duration of the longest live request over the "
+            "samples taken since eden top started."
         )
         fuse_why = (
             "This indicates of for the health of the communication with FUSE, "
@@ -966,12 +1088,18 @@ class Process:
         self.fuseFetch = 0
         self.last_access_time = time.monotonic()
         self.is_running = True
+        # Requests per second in the last sample, and the average latency of
+        # the requests in each sample of the history
+        self.request_rate = 0.0
+        self.latencies_ns: List[float] = []
 
     def get_key(self):
         return (self.cmd, self.mount)
 
     def aggregate(self, other):
         self.increment_counts(other.access_counts)
+        self.request_rate += other.request_rate
+        self.latencies_ns = self.latencies_ns + other.latencies_ns
         self.is_running |= other.is_running
 
         # Check if other is more relevant
@@ -991,6 +1119,15 @@ class Process:
     def set_fetchs(self, fetch_counts):
         self.fuseFetch = fetch_counts
 
+    def set_history(self, rates: List[float], latencies_ns: List[float]) -> None:
+        known = [rate for rate in rates if not math.isnan(rate)]
+        self.request_rate = known[-1] if known else 0.0
+        self.latencies_ns = latencies_ns
+
+    def get_latency_ns(self) -> float:
+        latency = top_history.percentile(self.latencies_ns, PROCESS_LATENCY_PERCENTILE)
+        return 0.0 if math.isnan(latency) else latency
+
     def get_row(self):
         return Row(
             top_pid=self.pid,
@@ -998,9 +1135,11 @@ class Process:
             fuse_reads=self.access_counts.fsChannelReads,
             fuse_writes=self.access_counts.fsChannelWrites,
             fuse_total=self.access_counts.fsChannelTotal,
+            fuse_rate=self.request_rate,
             fuse_fetch=self.fuseFetch,
             fuse_backing_store_imports=self.access_counts.fsChannelBackingStoreImports,
             fuse_duration=self.access_counts.fsChannelDurationNs,
+            fuse_latency=self.get_latency_ns(),
             fuse_last_access=self.last_access,
             command=self.cmd,
         )
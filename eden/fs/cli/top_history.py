@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2.
+
+"""Sampling, history and recording of the data displayed by `eden top`."""
+
+import array
+import json
+import math
+import os
+import time
+from typing import IO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+# Counters polled by every sample
+COUNTER_REGEX = r"((store\.hg.*)|(fuse\.([^\.]*)\..*requests.*))"
+
+# Number of samples kept in memory
+DEFAULT_HISTORY_SIZE = 600
+
+RECORDING_VERSION = 1
+
+
+class ProcessAccess(NamedTuple):
+    mount: str
+    pid: int
+    cmd: str
+    reads: int
+    writes: int
+    total: int
+    backing_store_imports: int
+    duration_ns: int
+    # None when the daemon does not report fetch counts
+    fetches: Optional[int]
+
+
+class Sample(NamedTuple):
+    timestamp: float
+    counters: Dict[str, int]
+    accesses: List[ProcessAccess]
+
+
+def fetch_sample(client, refresh_rate: int) -> Sample:
+    """Query the counters and the per-process accesses from a running daemon.
+
+    Access counts cover the last refresh_rate seconds.
+    """
+    client.flushStatsNow()
+    counters = client.getRegexCounters(COUNTER_REGEX)
+    counts = client.getAccessCounts(refresh_rate)
+
+    accesses = []
+    for mount, mount_accesses in counts.accessesByMount.items():
+        # When querying older versions of EdenFS fetchCountsByPid will be None
+        fetch_counts_by_pid = mount_accesses.fetchCountsByPid or {}
+        access_counts_by_pid = mount_accesses.accessCountsByPid
+        for pid in sorted(set(access_counts_by_pid) | set(fetch_counts_by_pid)):
+            cmd = os.fsdecode(counts.cmdsByPid.get(pid, b"<kernel>"))
+            access_counts = access_counts_by_pid.get(pid)
+            if access_counts is None:
+                reads = writes = total = imports = duration_ns = 0
+            else:
+                reads = access_counts.fsChannelReads
+                writes = access_counts.fsChannelWrites
+                total = access_counts.fsChannelTotal
+                imports = access_counts.fsChannelBackingStoreImports
+                duration_ns = access_counts.fsChannelDurationNs
+            accesses.append(
+                ProcessAccess(
+                    mount=os.fsdecode(mount),
+                    pid=pid,
+                    cmd=cmd,
+                    reads=reads,
+                    writes=writes,
+                    total=total,
+                    backing_store_imports=imports,
+                    duration_ns=duration_ns,
+                    fetches=fetch_counts_by_pid.get(pid),
+                )
+            )
+    return Sample(time.time(), dict(counters), accesses)
+
+
+def write_sample(f: IO[str], sample: Sample) -> None:
+    """Append a sample to a recording as a line of JSON."""
+    data = {
+        "version": RECORDING_VERSION,
+        "timestamp": sample.timestamp,
+        "counters": sample.counters,
+        "accesses": [access._asdict() for access in sample.accesses],
+    }
+    f.write(json.dumps(data) + "\n")
+    f.flush()
+
+
+def read_samples(f: IO[str]) -> Iterator[Sample]:
+    """Read the samples from a recording made with write_sample()."""
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+            if data["version"] != RECORDING_VERSION:
+                raise ValueError(f"unsupported version {data['version']}")
+            yield Sample(
+                timestamp=data["timestamp"],
+                counters=data["counters"],
+                accesses=[ProcessAccess(**access) for access in data["accesses"]],
+            )
+        except (KeyError, TypeError, ValueError) as ex:
+            raise ValueError(f"line {line_number}: invalid sample: {ex}") from ex
+
+
+class RingBuffer:
+    """The last `capacity` values of a series, stored in a compact array."""
+
+    def __init__(self, capacity: int) -> None:
+        self._values = array.array("d", [math.nan]) * capacity
+        self._start = 0
+        self._len = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._values)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def append(self, value: float) -> None:
+        capacity = len(self._values)
+        if self._len < capacity:
+            self._values[(self._start + self._len) % capacity] = value
+            self._len += 1
+        else:
+            self._values[self._start] = value
+            self._start = (self._start + 1) % capacity
+
+    def __getitem__(self, index: int) -> float:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError(index)
+        return self._values[(self._start + index) % len(self._values)]
+
+    def to_list(self, last: Optional[int] = None) -> List[float]:
+        """Return the values from oldest to newest, or only the last ones."""
+        count = self._len if last is None else min(last, self._len)
+        return [self[i] for i in range(self._len - count, self._len)]
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Return the pct-th percentile of values, ignoring missing (NaN) values.
+
+    Uses linear interpolation between the closest ranks.  Returns NaN if
+    there are no values.
+    """
+    ordered = sorted(v for v in values if not math.isnan(v))
+    if not ordered:
+        return math.nan
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def rates(values: List[float], timestamps: List[float]) -> List[float]:
+    """Return the per-second rate of change between consecutive samples of a
+    cumulative counter.
+
+    Intervals where the counter went down (ie. the daemon restarted) or was
+    missing are NaN.
+    """
+    result = []
+    for i in range(1, len(values)):
+        delta = values[i] - values[i - 1]
+        elapsed = timestamps[i] - timestamps[i - 1]
+        if delta < 0 or elapsed <= 0 or math.isnan(delta):
+            result.append(math.nan)
+        else:
+            result.append(delta / elapsed)
+    return result
+
+
+def interval_rates(counts: List[float], timestamps: List[float]) -> List[float]:
+    """Return the per-second rates of counts that each cover the interval
+    since the previous sample, like the per-process access counts.
+
+    The first count has no known interval and gives no rate.
+    """
+    result = []
+    for i in range(1, len(counts)):
+        elapsed = timestamps[i] - timestamps[i - 1]
+        if elapsed <= 0 or math.isnan(counts[i]):
+            result.append(math.nan)
+        else:
+            result.append(counts[i] / elapsed)
+    return result
+
+
+# The per-process fields kept by SampleHistory
+PROCESS_FIELDS = ("total", "duration_ns", "backing_store_imports")
+
+
+class SampleHistory:
+    """Keep the last samples of every counter and every process.
+
+    All series are aligned with the sample timestamps: counters missing from
+    a sample are recorded as NaN, and processes missing from a sample had no
+    accesses during it and are recorded as 0.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_HISTORY_SIZE) -> None:
+        self.capacity = capacity
+        self.timestamps = RingBuffer(capacity)
+        self._counters: Dict[str, RingBuffer] = {}
+        self._processes: Dict[Tuple[int, str], RingBuffer] = {}
+        # Number of samples added when each process was last seen
+        self._process_last_seen: Dict[int, int] = {}
+        self._num_samples = 0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def add(self, sample: Sample) -> None:
+        self.timestamps.append(sample.timestamp)
+        self._num_samples += 1
+        for name in sample.counters:
+            if name not in self._counters:
+                self._counters[name] = self._new_series(math.nan)
+        for name, series in self._counters.items():
+            series.append(sample.counters.get(name, math.nan))
+
+        totals: Dict[Tuple[int, str], float] = {}
+        for access in sample.accesses:
+            self._process_last_seen[access.pid] = self._num_samples
+            for field in PROCESS_FIELDS:
+                key = (access.pid, field)
+                totals[key] = totals.get(key, 0) + getattr(access, field)
+                if key not in self._processes:
+                    self._processes[key] = self._new_series(0)
+        for key, series in self._processes.items():
+            series.append(totals.get(key, 0))
+
+        # Forget processes that have not been seen in the whole history
+        expired = [
+            pid
+            for pid, last_seen in self._process_last_seen.items()
+            if self._num_samples - last_seen >= self.capacity
+        ]
+        for pid in expired:
+            del self._process_last_seen[pid]
+            for field in PROCESS_FIELDS:
+                del self._processes[(pid, field)]
+
+    def _new_series(self, fill: float) -> RingBuffer:
+        series = RingBuffer(self.capacity)
+        # The new series was missing from the earlier samples
+        for _ in range(len(self.timestamps) - 1):
+            series.append(fill)
+        return series
+
+    def counter_names(self) -> List[str]:
+        return list(self._counters)
+
+    def pids(self) -> List[int]:
+        return list(self._process_last_seen)
+
+    def counter_values(self, name: str, last: Optional[int] = None) -> List[float]:
+        series = self._counters.get(name)
+        if series is None:
+            return []
+        return series.to_list(last)
+
+    def process_values(
+        self, pid: int, field: str, last: Optional[int] = None
+    ) -> List[float]:
+        series = self._processes.get((pid, field))
+        if series is None:
+            return []
+        return series.to_list(last)
+
+    def counter_rates(self, name: str, last: Optional[int] = None) -> List[float]:
+        """Per-second rates of a cumulative counter between the last samples."""
+        count = None if last is None else last + 1
+        return rates(self.counter_values(name, count), self.timestamps.to_list(count))
+
+    def process_rates(
+        self, pid: int, field: str, last: Optional[int] = None
+    ) -> List[float]:
+        """Per-second rates of a per-process field in the last samples."""
+        count = None if last is None else last + 1
+        return interval_rates(
+            self.process_values(pid, field, count), self.timestamps.to_list(count)
+        )
+
+    def process_latencies_ns(self, pid: int, last: Optional[int] = None) -> List[float]:
+        """The average duration of the process's FUSE requests in each sample
+        where it made any."""
+        totals = self.process_values(pid, "total", last)
+        durations = self.process_values(pid, "duration_ns", last)
+        return [duration / total for total, duration in zip(totals, durations) if total]
@@ -439,7 +439,8 @@ parse_fstat parse_gitmodules parse_hgsub parse_hgsubstate parse_info
 parse_subrepos parse_usermap parse_where print_time process_request proxy_open
 pull_shallow put_inmemory range_header_to_tuple range_tuple_normalize
 range_tuple_to_header read_allowed read_context_hunk read_pkt_refs
-read_unified_hunk remote_name remote_refs replacelines_vec reset_retry_count
+read_unified_hunk rebuild_nodemap remote_name remote_refs replacelines_vec
+reset_retry_count
 retry_http_basic_auth revset_fromgit revset_gitnode root_tree_sha run_command
 run_wsgi save_map save_state save_tags screen_size send_bug_modify_email
 send_cookies send_headers serialize_hgsub serialize_hgsubstate serve_cleanup
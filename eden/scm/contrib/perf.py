@@ -475,9 +475,72 @@ def perfstatus(ui, repo, **opts):
     fm.end()
 
 
-@command("perfaddremove", formatteropts)
+class _syntheticfctx(object):
+    """minimal in-memory file context for rename detection benchmarks"""
+
+    def __init__(self, path, data):
+        self._path = path
+        self._data = data
+
+    def path(self):
+        return self._path
+
+    def data(self):
+        return self._data
+
+    def size(self):
+        return len(self._data)
+
+
+def _syntheticrenames(count, seed=0):
+    """build (added, removed) file contexts for COUNT renamed files
+
+    Each added file is a copy of a removed file with about a quarter of its
+    lines rewritten, so rename detection has to score similar content.
+    """
+    rng = random.Random(seed)
+    added = []
+    removed = []
+    for i in xrange(count):
+        lines = [
+            "line %d of file %d: %d\n" % (j, i, rng.randint(0, 1 << 30))
+            for j in xrange(rng.randint(20, 400))
+        ]
+        removed.append(_syntheticfctx("old/%d" % i, "".join(lines)))
+        for j in xrange(len(lines) // 4):
+            lines[rng.randrange(len(lines))] = "changed %d\n" % rng.randint(0, 1 << 30)
+        added.append(_syntheticfctx("new/%d" % i, "".join(lines)))
+    return added, removed
+
+
+@command(
+    "perfaddremove",
+    [
+        ("", "renames", 0, "score COUNT synthetic renames instead of the working copy"),
+        ("s", "similarity", 50.0, "similarity threshold (0-100) for --renames"),
+    ]
+    + formatteropts,
+)
 def perfaddremove(ui, repo, **opts):
+    """benchmark addremove on the working copy
+
+    With --renames, benchmark similarity based rename detection between
+    COUNT synthetic removed files and COUNT synthetic added files instead.
+    """
     timer, fm = gettimer(ui, opts)
+    if opts.get("renames"):
+        from edenscm.mercurial import similar
+
+        added, removed = _syntheticrenames(opts["renames"])
+        threshold = float(opts["similarity"]) / 100.0
+
+        def d():
+            for _match in similar._findsimilarmatches(repo, added, removed, threshold):
+                pass
+
+        timer(d)
+        fm.end()
+        return
     try:
         oldquiet = repo.ui.quiet
         repo.ui.quiet = True
@@ -554,6 +617,19 @@ def perfbookmarks(ui, repo, **opts):
     fm.end()
 
 
+@command("perfbundlechunking", formatteropts, "BUNDLE")
+def perfbundlechunking(ui, repo, bundlepath, **opts):
+    """benchmark splitting a bundle in the chunks of the chunked bundle store
+    of infinitepush"""
+    from edenscm.hgext.infinitepush import bundlestore
+
+    with open(bundlepath, "rb") as fh:
+        data = fh.read()
+    timer, fm = gettimer(ui, opts)
+    timer(lambda: len(list(bundlestore._chunkboundaries(data))))
+    fm.end()
+
+
 @command("perfbundleread", formatteropts, "BUNDLE")
 def perfbundleread(ui, repo, bundlepath, **opts):
     """Benchmark reading of bundle files.
@@ -671,6 +747,31 @@ def perfbundleread(ui, repo, bundlepath, **opts):
         fm.end()
 
 
+@command(
+    "perfstreamclone",
+    [("", "clear", False, "scan the store again for every run")] + formatteropts,
+)
+def perfstreamclone(ui, repo, clear=False, **opts):
+    """benchmark generating the data of a stream clone
+
+    Like a long-lived server, runs reuse the snapshot of the store taken by
+    the first one unless --clear is given. Use --config
+    server.streamreadthreads=N to change the number of reader threads."""
+    from edenscm.mercurial import streamclone
+
+    timer, fm = gettimer(ui, opts)
+
+    def d():
+        if clear and safehasattr(streamclone, "_snapshots"):
+            streamclone._snapshots.clear()
+        filecount, bytecount, it = streamclone.generatev1(repo)
+        for chunk in it:
+            pass
+
+    timer(d)
+    fm.end()
+
+
 @command("perfdirs", formatteropts)
 def perfdirs(ui, repo, **opts):
     timer, fm = gettimer(ui, opts)
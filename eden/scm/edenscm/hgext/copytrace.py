@@ -415,6 +415,40 @@ def _domergecopies(orig, repo, cdst, csrc, base):
     if not _fastcopytraceenabled(repo.ui):
         return orig(repo, cdst, csrc, base)
 
+    ui = repo.ui
+    extrakey = (
+        ui.configint("copytrace", "sourcecommitlimit"),
+        ui.configint("copytrace", "maxmovescandidatestocheck"),
+        ui.configbool("copytrace", "enableamendcopytrace"),
+        ui.configbool("copytrace", "draftusefullcopytrace", False),
+        ui.config("experimental", "copytrace.movecandidateslimit"),
+        # depends on phases, which can change for the same commits
+        _isfullcopytraceable(ui, cdst, base),
+        _amendcopytracestate(repo),
+    )
+    return copiesmod.cachedmergecopies(
+        repo,
+        cdst,
+        csrc,
+        base,
+        "fastcopytrace",
+        lambda repo, cdst, csrc, base: _fastmergecopies(orig, repo, cdst, csrc, base),
+        extrakey=extrakey,
+    )
+
+
+def _amendcopytracestate(repo):
+    """Identify the current amend copytrace data, so cached copies that
+    include it are not used after it changes."""
+    state = []
+    for fname in sorted(repo.localvfs.listdir()):
+        if fname.startswith("amendcopytrace"):
+            st = repo.localvfs.stat(fname)
+            state.append((fname, st.st_size, st.st_mtime))
+    return state
+
+
+def _fastmergecopies(orig, repo, cdst, csrc, base):
     # If base, source and destination are all draft branches, let's use full
     # copytrace for increased capabilities since it will work fast enough
     if _isfullcopytraceable(repo.ui, cdst, base):
@@ -53,6 +53,10 @@ annotate cache greatly. Run "debugbuildlinkrevcache" before
     # cronjob building the cache.
     serverbuildondemand = True
 
+    # send the revmap in the old format that every client can read. clients
+    # convert it to the new format when they load it. (default: True)
+    serverlegacyrevmap = True
+
     # update local annotate cache from remote on demand
     # (default: True for remotefilelog repo, False otherwise)
     client = True
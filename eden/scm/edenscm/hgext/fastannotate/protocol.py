@@ -21,7 +21,7 @@ from edenscm.mercurial import (
 from edenscm.mercurial.i18n import _
 from edenscm.mercurial.node import bin, hex
 
-from . import context
+from . import context, error as faerror, revmap as revmapmod
 
 
 try:
@@ -65,6 +65,7 @@ def _getannotate(repo, proto, path, lastnode):
     #   OUTPUT := '' | FILE + OUTPUT
     result = b""
     buildondemand = repo.ui.configbool("fastannotate", "serverbuildondemand", True)
+    legacyrevmap = repo.ui.configbool("fastannotate", "serverlegacyrevmap", True)
     with context.annotatecontext(repo, path) as actx:
         if buildondemand:
             # update before responding to the client
@@ -92,9 +93,17 @@ def _getannotate(repo, proto, path, lastnode):
             for p in [actx.revmappath, actx.linelogpath]:
                 if not os.path.exists(p):
                     continue
-                content = b""
-                with open(p, "rb") as f:
-                    content = f.read()
+                content = None
+                if p == actx.revmappath and legacyrevmap:
+                    # older clients only read the old format, newer ones
+                    # convert it when they load it
+                    try:
+                        content = revmapmod.revmap(p).legacydata()
+                    except faerror.CorruptedFileError:
+                        pass
+                if content is None:
+                    with open(p, "rb") as f:
+                        content = f.read()
                 vfsbaselen = len(repo.localvfs.base + "/")
                 relpath = p[vfsbaselen:]
                 result += b"%s\0%s\0%s" % (
@@ -7,34 +7,43 @@
 
 from __future__ import absolute_import
 
-import bisect
 import os
 import struct
 
-from edenscm.mercurial import error as hgerror, pycompat
+from edenscm.mercurial import error as hgerror, pycompat, util
 from edenscm.mercurial.node import hex
 from edenscm.mercurial.pycompat import range
 
 from . import error
 
-
-# the revmap file format is straightforward:
+# the revmap file uses fixed-width sections so it can be memory-mapped and
+# queried without parsing:
+#
+#   32 bytes: header - magic (8 bytes), capacity, count and string table size
+#             (uint32 each), 12 reserved bytes
+#   28 bytes: record for linelog revision 1 - hg hash (20 bytes), flag
+#             (uint8), 3 padding bytes, offset of its path in the string
+#             table (uint32)
+#   28 bytes: record for linelog revision 2
+#   ....      (capacity records in total, unused ones are zero-filled)
+#    4 bytes: hash table slot 0 - linelog revision (uint32), 0 if empty
+#   ....      (2 * capacity slots in total, open addressing with linear
+#             probing, used by hsh2rev)
+#    ? bytes: string table - '\0'-terminated paths, starting with the empty
+#             path at offset 0. a path is only stored again when the path
+#             changes (ie. the revision is a rename).
 #
-#    8 bytes: header
-#    1 byte : flag for linelog revision 1
-#    ? bytes: (optional) '\0'-terminated path string
-#             only exists if (flag & renameflag) != 0
-#   20 bytes: hg hash for linelog revision 1
-#    1 byte : flag for linelog revision 2
-#    ? bytes: (optional) '\0'-terminated path string
-#   20 bytes: hg hash for linelog revision 2
-#   ....
+# capacity is the smallest power of 2 that holds the revisions, so small
+# revmaps stay small. appending revisions fills the next free records and
+# hash table slots in place, adds new paths to the end of the file, and
+# updates the header last. if the capacity is exceeded, the whole file is
+# rewritten with twice the capacity. the layout only depends on the content,
+# so writing the whole file and appending incrementally produce the same
+# bytes.
 #
-# the implementation is kinda stupid: __init__ loads the whole revmap.
-# no laziness. benchmark shows loading 10000 revisions is about 0.015
-# seconds, which looks enough for our use-case. if this implementation
-# becomes a bottleneck, we can change it to lazily read the file
-# from the end.
+# files using the old format (REVMAP1, variable-length records) are parsed
+# once and rewritten in the new format. legacydata() produces the old format
+# for peers that cannot read the new one.
 
 # whether the changeset is in the side branch. i.e. not in the linear main
 # branch but only got referenced by lines in merge changesets.
@@ -46,6 +55,45 @@ renameflag = 2
 # len(mercurial.node.nullid)
 _hshlen = 20
 
+_header = struct.Struct(">8sIII12x")
+_record = struct.Struct(">20sB3xI")
+_slot = struct.Struct(">I")
+_hshwords = struct.Struct(">5I")
+
+_mincapacity = 1
+
+_legacyheader = b"REVMAP1\0"
+
+
+def _capacityfor(count):
+    """return the number of records to reserve for count revisions"""
+    capacity = _mincapacity
+    while capacity < count:
+        capacity *= 2
+    return capacity
+
+
+def _slotsoffset(capacity):
+    return _header.size + capacity * _record.size
+
+
+def _stringsoffset(capacity):
+    return _slotsoffset(capacity) + 2 * capacity * _slot.size
+
+
+def _hashslot(hsh, mask):
+    """return the first hash table slot to probe for hsh"""
+    a, b, c, d, e = _hshwords.unpack(hsh)
+    # mix the bits (murmur3 finalizer) so hashes that only differ in a few
+    # bytes still spread over the table
+    h = a ^ b ^ c ^ d ^ e
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & 0xFFFFFFFF
+    h ^= h >> 16
+    return h & mask
+
 
 class revmap(object):
     """trivial hg bin hash - linelog rev bidirectional map
@@ -53,7 +101,7 @@ class revmap(object):
     also stores a flag (uint8) for each revision, and track renames.
     """
 
-    HEADER = b"REVMAP1\0"
+    HEADER = b"REVMAP2\0"
 
     def __init__(self, path=None):
         """create or load the revmap, optionally associate to a file
@@ -63,14 +111,7 @@ class revmap(object):
         the caller needs to make sure one file is associated to at most one
         revmap object at a time."""
         self.path = path
-        self._rev2hsh = [None]
-        self._rev2flag = [None]
-        self._hsh2rev = {}
-        # since rename does not happen frequently, do not store path for every
-        # revision. self._renamerevs can be used for bisecting.
-        self._renamerevs = [0]
-        self._renamepaths = [""]
-        self._lastmaxrev = -1
+        self._clearstate()
         if path:
             if os.path.exists(path):
                 self._load()
@@ -78,80 +119,137 @@ class revmap(object):
                 # write the header so "append" can do incremental updates
                 self.flush()
 
+    def _clearstate(self):
+        # the mapped file content. revisions up to self._diskcount are read
+        # from it, later revisions are kept in the lists below until flush.
+        self._data = b""
+        self._capacity = 0
+        self._diskcount = 0
+        self._stringsize = 0
+        self._pathcache = {}
+        self._hshs = []
+        self._flags = []
+        self._paths = []
+        self._hsh2rev = {}
+        self._lastpath = ""
+        # whether flush needs to write the entire file
+        self._rewrite = True
+
     def copyfrom(self, rhs):
         """copy the map data from another revmap. do not affect self.path"""
-        self._rev2hsh = rhs._rev2hsh[:]
-        self._rev2flag = rhs._rev2flag[:]
-        self._hsh2rev = rhs._hsh2rev.copy()
-        self._renamerevs = rhs._renamerevs[:]
-        self._renamepaths = rhs._renamepaths[:]
-        self._lastmaxrev = -1
+        entries = [
+            (rhs.rev2hsh(rev), rhs.rev2flag(rev), rhs.rev2path(rev))
+            for rev in range(1, rhs.maxrev + 1)
+        ]
+        self._clearstate()
+        for hsh, flag, path in entries:
+            self._addpending(hsh, flag, path)
+        self._lastpath = rhs._lastpath
 
     @property
     def maxrev(self):
         """return max linelog revision number"""
-        return len(self._rev2hsh) - 1
+        return self._diskcount + len(self._hshs)
 
     def append(self, hsh, sidebranch=False, path=None, flush=False):
         """add a binary hg hash and return the mapped linelog revision.
         if flush is True, incrementally update the file.
         """
-        if hsh in self._hsh2rev:
-            raise error.CorruptedFileError("%r is in revmap already" % hex(hsh))
         if len(hsh) != _hshlen:
             raise hgerror.ProgrammingError("hsh must be %d-char long" % _hshlen)
+        if self.hsh2rev(hsh) is not None:
+            raise error.CorruptedFileError("%r is in revmap already" % hex(hsh))
         if path is not None and not isinstance(path, str):
             raise hgerror.ProgrammingError("path must be str")
-        idx = len(self._rev2hsh)
         flag = 0
         if sidebranch:
             flag |= sidebranchflag
-        if path is not None and path != self._renamepaths[-1]:
+        if path is not None and path != self._lastpath:
             flag |= renameflag
-            self._renamerevs.append(idx)
-            self._renamepaths.append(path)
-        self._rev2hsh.append(hsh)
-        self._rev2flag.append(flag)
-        self._hsh2rev[hsh] = idx
+            self._lastpath = path
+        idx = self._addpending(hsh, flag, self._lastpath)
         if flush:
             self.flush()
         return idx
 
+    def _addpending(self, hsh, flag, path):
+        self._hshs.append(hsh)
+        self._flags.append(flag)
+        self._paths.append(path)
+        rev = self.maxrev
+        self._hsh2rev[hsh] = rev
+        return rev
+
+    def _pending(self, values, rev):
+        idx = rev - self._diskcount - 1
+        if 0 <= idx < len(values):
+            return values[idx]
+        return None
+
+    def _readrecord(self, rev):
+        return _record.unpack_from(self._data, _header.size + (rev - 1) * _record.size)
+
     def rev2hsh(self, rev):
         """convert linelog revision to hg hash. return None if not found."""
-        if rev > self.maxrev or rev < 0:
-            return None
-        return self._rev2hsh[rev]
+        if 0 < rev <= self._diskcount:
+            offset = _header.size + (rev - 1) * _record.size
+            return self._data[offset : offset + _hshlen]
+        return self._pending(self._hshs, rev)
 
     def rev2flag(self, rev):
         """get the flag (uint8) for a given linelog revision.
         return None if revision does not exist.
         """
-        if rev > self.maxrev or rev < 0:
-            return None
-        return self._rev2flag[rev]
+        if 0 < rev <= self._diskcount:
+            return self._readrecord(rev)[1]
+        return self._pending(self._flags, rev)
 
     def rev2path(self, rev):
         """get the path for a given linelog revision.
         return None if revision does not exist.
         """
-        if rev > self.maxrev or rev < 0:
-            return None
-        idx = bisect.bisect_right(self._renamerevs, rev) - 1
-        return self._renamepaths[idx]
+        if 0 < rev <= self._diskcount:
+            return self._readpath(self._readrecord(rev)[2])
+        if rev == 0:
+            return ""
+        return self._pending(self._paths, rev)
+
+    def _readpath(self, offset):
+        path = self._pathcache.get(offset)
+        if path is None:
+            start = _stringsoffset(self._capacity) + offset
+            end = self._data.find(b"\0", start)
+            if end < 0:
+                raise error.CorruptedFileError("path at %d is not terminated" % offset)
+            path = pycompat.decodeutf8(self._data[start:end])
+            self._pathcache[offset] = path
+        return path
 
     def hsh2rev(self, hsh):
         """convert hg hash to linelog revision. return None if not found."""
-        return self._hsh2rev.get(hsh)
+        rev = self._hsh2rev.get(hsh)
+        if rev is None and self._diskcount > 0:
+            rev = self._lookup(hsh)
+        return rev
+
+    def _lookup(self, hsh):
+        """find hsh in the on-disk hash table"""
+        data = self._data
+        slotsoffset = _slotsoffset(self._capacity)
+        mask = 2 * self._capacity - 1
+        slot = _hashslot(hsh, mask)
+        while True:
+            rev = _slot.unpack_from(data, slotsoffset + slot * _slot.size)[0]
+            if rev == 0:
+                return None
+            if rev <= self._diskcount and self.rev2hsh(rev) == hsh:
+                return rev
+            slot = (slot + 1) & mask
 
     def clear(self, flush=False):
         """make the map empty. if flush is True, write to disk"""
         # rev 0 is reserved, real rev starts from 1
-        self._rev2hsh = [None]
-        self._rev2flag = [None]
-        self._hsh2rev = {}
-        self._rev2path = [""]
-        self._lastmaxrev = -1
+        self._clearstate()
         if flush:
             self.flush()
 
@@ -159,72 +257,162 @@ class revmap(object):
         """write the state down to the file"""
         if not self.path:
             return
-        if self._lastmaxrev == -1:  # write the entire file
-            with open(self.path, "wb") as f:
-                f.write(self.HEADER)
-                for i in range(1, len(self._rev2hsh)):
-                    self._writerev(i, f)
-        else:  # append incrementally
-            with open(self.path, "ab") as f:
-                for i in range(self._lastmaxrev + 1, len(self._rev2hsh)):
-                    self._writerev(i, f)
-        self._lastmaxrev = self.maxrev
+        if self._rewrite or self.maxrev > self._capacity:
+            self._writeall()
+        elif self._hshs:
+            self._writepending()
+        else:
+            return
+        self._load()
+
+    def _encoderecords(self, start, capacity, slots, lastpath, pathoffset, stringsize):
+        """encode revisions from start to maxrev
+
+        slots is a function returning the revision stored in a hash table
+        slot, it is updated with the new revisions. return the records, new
+        strings, updated hash table slots and the new string table size.
+        """
+        mask = 2 * capacity - 1
+        records = []
+        strings = []
+        newslots = {}
+        for rev in range(start, self.maxrev + 1):
+            hsh = self.rev2hsh(rev)
+            path = self.rev2path(rev)
+            if path != lastpath:
+                encoded = pycompat.encodeutf8(path) + b"\0"
+                strings.append(encoded)
+                pathoffset = stringsize
+                stringsize += len(encoded)
+                lastpath = path
+            records.append(_record.pack(hsh, self.rev2flag(rev), pathoffset))
+            slot = _hashslot(hsh, mask)
+            while slot in newslots or slots(slot):
+                slot = (slot + 1) & mask
+            newslots[slot] = rev
+        return records, strings, newslots, stringsize
+
+    def _writeall(self):
+        """write the entire file"""
+        count = self.maxrev
+        capacity = _capacityfor(count)
+        records, strings, newslots, stringsize = self._encoderecords(
+            1, capacity, lambda slot: 0, "", 0, 1
+        )
+        slots = [0] * (2 * capacity)
+        for slot, rev in newslots.items():
+            slots[slot] = rev
+        buf = b"".join(
+            [_header.pack(self.HEADER, capacity, count, stringsize)]
+            + records
+            + [b"\0" * ((capacity - count) * _record.size)]
+            + [struct.pack(">%dI" % len(slots), *slots), b"\0"]
+            + strings
+        )
+        # release the mapping before truncating the file
+        self._data = b""
+        with open(self.path, "wb") as f:
+            f.write(buf)
+
+    def _writepending(self):
+        """write the revisions that are not on disk yet into the free space"""
+        count = self.maxrev
+        capacity = self._capacity
+        slotsoffset = _slotsoffset(capacity)
+        stringsoffset = _stringsoffset(capacity)
+        data = self._data
+        start = self._diskcount + 1
+        pathoffset = self._readrecord(self._diskcount)[2] if self._diskcount else 0
+
+        def slots(slot):
+            return _slot.unpack_from(data, slotsoffset + slot * _slot.size)[0]
+
+        records, strings, newslots, stringsize = self._encoderecords(
+            start,
+            capacity,
+            slots,
+            self.rev2path(self._diskcount),
+            pathoffset,
+            self._stringsize,
+        )
+        with open(self.path, "r+b") as f:
+            f.seek(_header.size + (start - 1) * _record.size)
+            f.write(b"".join(records))
+            for slot, rev in sorted(newslots.items()):
+                f.seek(slotsoffset + slot * _slot.size)
+                f.write(_slot.pack(rev))
+            f.seek(stringsoffset + self._stringsize)
+            f.write(b"".join(strings))
+            # the header goes last so the new revisions only become visible
+            # once everything else is written
+            f.seek(0)
+            f.write(_header.pack(self.HEADER, capacity, count, stringsize))
+
+    def legacydata(self):
+        """return the content of the map in the old format (REVMAP1)"""
+        buf = [_legacyheader]
+        for rev in range(1, self.maxrev + 1):
+            flag = self.rev2flag(rev)
+            buf.append(struct.pack("B", flag))
+            if flag & renameflag:
+                buf.append(pycompat.encodeutf8(self.rev2path(rev)) + b"\0")
+            buf.append(self.rev2hsh(rev))
+        return b"".join(buf)
 
     def _load(self):
         """load state from file"""
         if not self.path:
             return
-        # use local variables in a loop. CPython uses LOAD_FAST for them,
-        # which is faster than both LOAD_CONST and LOAD_GLOBAL.
-        flaglen = 1
-        hshlen = _hshlen
         with open(self.path, "rb") as f:
-            if f.read(len(self.HEADER)) != self.HEADER:
-                raise error.CorruptedFileError()
-            self.clear(flush=False)
-            while True:
-                buf = f.read(flaglen)
-                if not buf:
-                    break
-                flag = ord(buf)
-                rev = len(self._rev2hsh)
-                if flag & renameflag:
-                    path = self._readcstr(f)
-                    self._renamerevs.append(rev)
-                    self._renamepaths.append(pycompat.decodeutf8(path))
-                hsh = f.read(hshlen)
-                if len(hsh) != hshlen:
+            if f.read(len(_legacyheader)) == _legacyheader:
+                self._loadlegacy(f.read())
+                try:
+                    self.flush()
+                except (IOError, OSError):
+                    # keep using the in-memory copy if the file is read-only
+                    pass
+                return
+            data = util.mmapread(f)
+        if len(data) < _header.size:
+            raise error.CorruptedFileError()
+        magic, capacity, count, stringsize = _header.unpack_from(data)
+        if (
+            magic != self.HEADER
+            or capacity < _mincapacity
+            or capacity & (capacity - 1)
+            or count > capacity
+            or stringsize < 1
+            or len(data) != _stringsoffset(capacity) + stringsize
+        ):
+            raise error.CorruptedFileError()
+        self._clearstate()
+        self._data = data
+        self._capacity = capacity
+        self._diskcount = count
+        self._stringsize = stringsize
+        self._lastpath = self.rev2path(count)
+        self._rewrite = False
+
+    def _loadlegacy(self, buf):
+        """load state from the content of an old format file"""
+        self._clearstate()
+        path = ""
+        pos = 0
+        while pos < len(buf):
+            flag = ord(buf[pos : pos + 1])
+            pos += 1
+            if flag & renameflag:
+                end = buf.find(b"\0", pos)
+                if end < 0:  # unexpected eof
                     raise error.CorruptedFileError()
-                self._hsh2rev[hsh] = rev
-                self._rev2flag.append(flag)
-                self._rev2hsh.append(hsh)
-        self._lastmaxrev = self.maxrev
-
-    def _writerev(self, rev, f):
-        """append a revision data to file"""
-        flag = self._rev2flag[rev]
-        hsh = self._rev2hsh[rev]
-        f.write(struct.pack("B", flag))
-        if flag & renameflag:
-            path = self.rev2path(rev)
-            if path is None:
-                raise error.CorruptedFileError("cannot find path for %s" % rev)
-            path = pycompat.encodeutf8(path)
-            f.write(path + b"\0")
-        f.write(hsh)
-
-    @staticmethod
-    def _readcstr(f):
-        """read a C-language-like '\0'-terminated string"""
-        buf = b""
-        while True:
-            ch = f.read(1)
-            if not ch:  # unexpected eof
+                path = pycompat.decodeutf8(buf[pos:end])
+                pos = end + 1
+            hsh = buf[pos : pos + _hshlen]
+            if len(hsh) != _hshlen:
                 raise error.CorruptedFileError()
-            if ch == b"\0":
-                break
-            buf += ch
-        return buf
+            pos += _hshlen
+            self._addpending(hsh, flag, path)
+        self._lastpath = path
 
     def __contains__(self, f):
         """(fctx or (node, path)) -> bool.
@@ -250,9 +438,18 @@ def getlastnode(path):
     hsh = None
     try:
         with open(path, "rb") as f:
-            f.seek(-_hshlen, 2)
-            if f.tell() > len(revmap.HEADER):
-                hsh = f.read(_hshlen)
+            header = f.read(_header.size)
+            if header.startswith(_legacyheader):
+                f.seek(-_hshlen, 2)
+                if f.tell() > len(_legacyheader):
+                    hsh = f.read(_hshlen)
+            elif len(header) == _header.size:
+                magic, capacity, count, stringsize = _header.unpack(header)
+                if magic == revmap.HEADER and 0 < count <= capacity:
+                    f.seek(_header.size + (count - 1) * _record.size)
+                    hsh = f.read(_hshlen)
+                    if len(hsh) != _hshlen:
+                        hsh = None
     except IOError:
         pass
     return hsh
@@ -19,9 +19,17 @@ Config::
     # Also use fastlog for files. Otherwise only use fastlog for directories.
     # (default: false)
     files=true
+
+    # Number of threads reading and matching changesets while walking the
+    # history locally. (default: 4)
+    localworkers=4
+
+    # Number of changesets each local thread reads at a time. (default: 256)
+    localbatchsize=256
 """
 
 import heapq
+import itertools
 from collections import deque
 from threading import Event, Thread
 
@@ -47,6 +55,8 @@ conduit = None
 FASTLOG_MAX = 500
 FASTLOG_QUEUE_SIZE = 1000
 FASTLOG_TIMEOUT = 20
+FASTLOG_LOCAL_WORKERS = 4
+FASTLOG_LOCAL_BATCH = 256
 
 
 def extsetup(ui):
@@ -348,6 +358,16 @@ class readonlythreadsafechangelog(object):
         return self._changelog.rev(node)
 
 
+class _localbatch(object):
+    """consecutive revisions of the local walk, matched by one worker"""
+
+    def __init__(self, revs):
+        self.revs = revs
+        self.matches = []
+        self.error = None
+        self.done = Event()
+
+
 class LocalIteratorThread(Thread):
     """Class which reads from an iterator and sends results to a queue.
 
@@ -361,6 +381,12 @@ class LocalIteratorThread(Thread):
     Used to allow parallel fetching of results from both a local and
     remote source.
 
+    The ancestors are walked in batches. Reading the file lists of a batch
+    and matching them is done by a pool of worker threads, and results are
+    sent in the walk order. At most two batches per worker are in flight, so
+    when the consumer is slow the walk waits for it instead of reading
+    ahead without limit.
+
     * queue - self explanatory
     * id - tag to use when sending messages
     * rev - rev to start iterating at
@@ -384,12 +410,20 @@ class LocalIteratorThread(Thread):
         self.ui = repo.ui
         self._stop = Event()
 
-        # Create a private instance of changelog to avoid trampling
+        numworkers = max(
+            1, repo.ui.configint("fastlog", "localworkers", FASTLOG_LOCAL_WORKERS)
+        )
+        self.batchsize = max(
+            1, repo.ui.configint("fastlog", "localbatchsize", FASTLOG_LOCAL_BATCH)
+        )
+
+        # Create private instances of changelog to avoid trampling
         # internal caches of other threads
         c = readonlythreadsafechangelog(repo)
         self.generator = originator(c.parentrevs, rev)
-        self.filefunc = c.readfiles
-        self.ui = repo.ui
+        self.filefuncs = [c.readfiles] + [
+            readonlythreadsafechangelog(repo).readfiles for _i in range(numworkers - 1)
+        ]
 
     def stop(self):
         self._stop.set()
@@ -397,24 +431,67 @@ class LocalIteratorThread(Thread):
     def stopped(self):
         return self._stop.isSet()
 
+    def _work(self, tasks, filefunc):
+        match = self.localmatch
+        dirs = self.dirs
+        while True:
+            batch = tasks.get()
+            if batch is None:
+                return
+            try:
+                for rev in batch.revs:
+                    if self.stopped():
+                        break
+                    if not match or match(filefunc(rev), dirs):
+                        batch.matches.append(rev)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+
     def run(self):
         # type: () -> None
         generator = self.generator
-        match = self.localmatch
-        dirs = self.dirs
-        filefunc = self.filefunc
         queue = self.queue
+        tasks = util.queue()
+        workers = []
+        for filefunc in self.filefuncs:
+            worker = Thread(target=self._work, args=(tasks, filefunc))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        maxinflight = 2 * len(workers)
+        inflight = deque()
+        exhausted = False
 
         try:
-            for result in generator:
-                if self.stopped():
+            while not self.stopped():
+                while not exhausted and len(inflight) < maxinflight:
+                    revs = list(itertools.islice(generator, self.batchsize))
+                    if not revs:
+                        exhausted = True
+                        break
+                    batch = _localbatch(revs)
+                    inflight.append(batch)
+                    tasks.put(batch)
+                if not inflight:
                     break
-                if not match or match(filefunc(result), dirs):
+                batch = inflight.popleft()
+                batch.done.wait()
+                if batch.error is not None:
+                    raise batch.error
+                for result in batch.matches:
+                    if self.stopped():
+                        break
                     queue.put((self.id, True, result))
         except Exception as e:
             self.ui.traceback()
             queue.put((self.id, False, str(e)))
         finally:
+            # stop the workers once they are done with their batch
+            self.stop()
+            for _worker in workers:
+                tasks.put(None)
             queue.put((self.id, True, None))
 
 
@@ -19,12 +19,10 @@ For more information and instructions, see :hg:`help git`
 
 # global modules
 import os
-import shutil
 import sys
 import warnings
 from bisect import insort
 
-from bindings import nodemap as nodemapmod
 from edenscm.mercurial import (
     bundlerepo,
     cmdutil,
@@ -317,23 +315,8 @@ def gverify(ui, repo, **opts):
 @command("git-cleanup")
 def git_cleanup(ui, repo):
     """clean up Git commit map after history editing"""
-    items = repo.githandler._map.items()
-    if ui.configbool("hggit", "indexedlognodemap", False):
-        dir = repo.sharedvfs.join(repo.githandler.map_file + "-log")
-        tempdir = dir + ".temp"
-        if os.path.exists(tempdir):
-            hgutil.removedirs(tempdir)
-
-        nodemap = nodemapmod.nodemap(tempdir)
-        for gitsha, hgsha in items:
-            if hgsha in repo:
-                nodemap.add(gitsha, hgsha)
-        nodemap.flush()
-        with repo.wlock():
-            tempdir2 = dir + ".temp2"
-            hgutil.rename(dir, tempdir2)
-            hgutil.rename(tempdir, dir)
-            shutil.rmtree(tempdir2)
+    githandler = repo.githandler
+    items = [(gitsha, hgsha) for gitsha, hgsha in githandler._map.items()]
 
     new_map = []
     for gitsha, hgsha in items:
@@ -343,6 +326,12 @@ def git_cleanup(ui, repo):
     try:
         f = repo.sharedvfs(GitHandler.map_file, "wb")
         list(map(f.write, new_map))
+        f.close()
+        if githandler._use_nodemap():
+            githandler.rebuild_nodemap(
+                (gitsha, hgsha) for gitsha, hgsha in items if hgsha in repo
+            )
+            githandler.save_map_state()
     finally:
         wlock.release()
     ui.status(_("git commit map cleaned\n"))
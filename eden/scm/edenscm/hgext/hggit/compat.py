@@ -79,7 +79,13 @@ CONFIG_DEFAULTS = {
         "renamelimit": 400,
         "similarity": 0,
     },
-    "hggit": {"mapsavefrequency": 0, "usephases": False},
+    "hggit": {
+        "blobcache": True,
+        "exportbatchsize": 1000,
+        "indexedlognodemap": True,
+        "mapsavefrequency": 0,
+        "usephases": False,
+    },
 }
 
 hasconfigitems = False
@@ -22,6 +22,7 @@ from edenscm.mercurial import (
     pycompat,
     util as hgutil,
     vfs as vfsmod,
+    worker,
 )
 from edenscm.mercurial.i18n import _
 from edenscm.mercurial.node import bin, hex, nullid, nullrev
@@ -178,22 +179,12 @@ class GitHandler(object):
             node = hex(node)
         return node
 
-    def load_map(self):
-        if self.ui.configbool("hggit", "indexedlognodemap", False):
-            dir = self.vfs.join(self.map_file + "-log")
-
-            # Check for log existance before we instantiate it.
-            logexists = self.vfs.exists(dir)
+    def _use_nodemap(self):
+        return compat.config(self.ui, "bool", "hggit", "indexedlognodemap")
 
-            self._map_real = nodemap.nodemap(dir)
-
-            # If the indexedlog map doesn't exist, populate it.
-            if not logexists and self.vfs.exists(self.map_file):
-                # Don't construct
-                oldmap = GitMap(self.vfs(self.map_file))
-                for gitsha, hgsha in oldmap.items():
-                    self._map_real.add(gitsha, hgsha)
-                self._map_real.flush()
+    def load_map(self):
+        if self._use_nodemap():
+            self._map_real = self._load_nodemap()
         else:
             content = []
             if os.path.exists(self.vfs.join(self.map_file)):
@@ -201,28 +192,135 @@ class GitHandler(object):
 
             self._map_real = GitMap(content)
 
+    def _load_nodemap(self):
+        """open the indexed map, after indexing the changes made to the text
+        map file since it was last indexed
+
+        The text file stays the reference other tools read and edit, the
+        indexed map records the size and mtime of the text file it matches.
+        Usually nothing changed, and opening the map does not depend on its
+        size. Lines appended to the text file are indexed incrementally,
+        other changes rebuild the indexed map.
+        """
+        dir = self.vfs.join(self.map_file + "-log")
+        logexists = self.vfs.exists(dir)
+        textstat = self._text_map_stat()
+        indexed = _readmapstate(dir) if logexists else None
+        if logexists and textstat is not None and indexed == textstat:
+            return nodemap.nodemap(dir)
+
+        with self.repo.wlock():
+            if not logexists:
+                # Index the existing text map, if any
+                if textstat is None:
+                    self.vfs.write(self.map_file, b"")
+                self.rebuild_nodemap(self._read_text_map(0)[0])
+            elif textstat is None:
+                # The text file is gone, recreate it from the index
+                map = nodemap.nodemap(dir)
+                with self.vfs(self.map_file, "wb", atomictemp=True) as f:
+                    f.write(_formatmaplines(map.items()))
+            elif indexed is None:
+                # Indexed maps used to be written without updating the text
+                # map, merge both
+                map = nodemap.nodemap(dir)
+                items = collections.OrderedDict(self._read_text_map(0)[0])
+                for gitnode, hgnode in map.items():
+                    items.setdefault(gitnode, hgnode)
+                del map
+                with self.vfs(self.map_file, "wb", atomictemp=True) as f:
+                    f.write(_formatmaplines(items.items()))
+                self.rebuild_nodemap(items.items())
+            elif 0 < indexed[0] < textstat[0]:
+                # Lines were appended to the text map
+                map = nodemap.nodemap(dir)
+                items, textsize = self._read_text_map(indexed[0])
+                for gitnode, hgnode in items:
+                    map.add(gitnode, hgnode)
+                map.flush()
+                self.save_map_state(textsize)
+                return map
+            else:
+                # The text map was rewritten
+                self.rebuild_nodemap(self._read_text_map(0)[0])
+            self.save_map_state()
+        return nodemap.nodemap(dir)
+
+    def _text_map_stat(self):
+        try:
+            st = self.vfs.stat(self.map_file)
+        except OSError:
+            return None
+        return (st.st_size, int(st.st_mtime * 1000000))
+
+    def _read_text_map(self, offset):
+        """read the entries of the text map starting at offset
+
+        Returns the entries and the offset following the last complete line.
+        """
+        with self.vfs(self.map_file) as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        return GitMap.parselines(data[:end].splitlines(True)), offset + end
+
+    def save_map_state(self, textsize=None):
+        """record the text map file the indexed map matches"""
+        textstat = self._text_map_stat()
+        if textstat is None:
+            textstat = (0, 0)
+        if textsize is not None and textsize != textstat[0]:
+            # An incomplete line was not indexed, index it next time
+            textstat = (textsize, -1)
+        dir = self.vfs.join(self.map_file + "-log")
+        hgutil.writefile(os.path.join(dir, _map_state_file), b"%d %d\n" % textstat)
+
+    def rebuild_nodemap(self, items):
+        """replace the indexed map with one holding the given entries"""
+        dir = self.vfs.join(self.map_file + "-log")
+        tempdir = dir + ".temp"
+        if os.path.exists(tempdir):
+            shutil.rmtree(tempdir)
+
+        map = nodemap.nodemap(tempdir)
+        for gitsha, hgsha in items:
+            map.add(gitsha, hgsha)
+        map.flush()
+        del map
+
+        if os.path.exists(dir):
+            tempdir2 = dir + ".temp2"
+            hgutil.rename(dir, tempdir2)
+            hgutil.rename(tempdir, dir)
+            shutil.rmtree(tempdir2)
+        else:
+            hgutil.rename(tempdir, dir)
+        self._map_real = None
+
     def save_map(self, map_file):
         wlock = self.repo.wlock()
         try:
             map = self._map
 
-            if self.ui.configbool("hggit", "indexedlognodemap", False):
+            entries = []
+            for hgnode in self._map_hg_modifications:
+                gitnode = map.lookupbysecond(hgnode)
+                if gitnode is None:
+                    raise KeyError(hex(hgnode))
+                entries.append((gitnode, hgnode))
+
+            if self._use_nodemap():
                 self._map_real.flush()
-            else:
-                file = self.vfs(map_file, "a+", atomictemp=True)
-                buf = hgutil.stringio()
-                bwrite = buf.write
-                # Append new entries to the end of the file so we can search
-                # backwards from the end for recently added entries.
-                for hgnode in self._map_hg_modifications:
-                    gitnode = map.lookupbysecond(hgnode)
-                    if gitnode is None:
-                        raise KeyError(hex(hgnode))
-                    bwrite(pycompat.encodeutf8("%s %s\n" % (hex(gitnode), hex(hgnode))))
-                file.write(buf.getvalue())
-                buf.close()
-                # If this complains, atomictempfile no longer has close
-                file.close()
+
+            # Append new entries to the end of the file so we can search
+            # backwards from the end for recently added entries. Only the new
+            # entries are written, the existing ones are left in place.
+            if entries:
+                with self.vfs(map_file, "ab") as f:
+                    f.write(_formatmaplines(entries))
+
+            if self._use_nodemap() and map_file == self.map_file:
+                self.save_map_state()
             self._map_hg_modifications.clear()
         finally:
             wlock.release()
@@ -458,7 +556,7 @@ class GitHandler(object):
 
     def clear(self):
         mapfile = self.vfs.join(self.map_file)
-        if self.ui.configbool("hggit", "indexedlognodemap", False):
+        if os.path.exists(mapfile + "-log"):
             shutil.rmtree(mapfile + "-log")
 
         if os.path.exists(self.gitdir):
@@ -565,14 +663,56 @@ class GitHandler(object):
             self.repo, pctx, self.git.object_store, gitcommit
         )
 
+        # The deltas between consecutive changesets are computed, and the new
+        # blobs written, in worker processes if possible. Trees depend on the
+        # previous changeset and are computed here, in order.
+        pairs = []
+        for ctx in export:
+            pairs.append((pctx.node(), ctx.node()))
+            pctx = ctx
+        blobcache = self._openblobcache()
+        batchsize = compat.config(self.ui, "int", "hggit", "exportbatchsize")
+        deltas = worker.worker(
+            self.ui,
+            0.01,
+            hg2git.exportdeltas,
+            (
+                self.repo,
+                self.git.object_store,
+                blobcache if blobcache is not None else {},
+                batchsize,
+            ),
+            pairs,
+            callsite="hggit-export",
+            ordered=True,
+            threadsafe=False,
+        )
+
+        objects = hg2git.ObjectBatch(self.git.object_store, batchsize)
         mapsavefreq = compat.config(self.ui, "int", "hggit", "mapsavefrequency")
-        with progress.bar(self.ui, _("exporting"), total=total) as prog:
-            for i, ctx in enumerate(export):
-                prog.value = i
-                self.export_hg_commit(ctx.node(), exporter)
-                if mapsavefreq and i % mapsavefreq == 0:
-                    self.ui.debug("saving mapfile\n")
-                    self.save_map(self.map_file)
+        try:
+            with progress.bar(self.ui, _("exporting"), total=total) as prog:
+                for i, (node, removed, changed, newblobs) in enumerate(deltas):
+                    prog.value = i
+                    if blobcache is not None:
+                        for filenode, blobid in newblobs:
+                            blobcache.addwritten(filenode, blobid)
+                    self.export_hg_commit(node, exporter, (removed, changed), objects)
+                    if mapsavefreq and i % mapsavefreq == 0:
+                        self.ui.debug("saving mapfile\n")
+                        objects.flush()
+                        self.save_map(self.map_file)
+        finally:
+            # the map may be saved even if the export fails, the objects it
+            # refers to must be written first
+            objects.flush()
+            if blobcache is not None:
+                blobcache.flush()
+
+    def _openblobcache(self):
+        if not compat.config(self.ui, "bool", "hggit", "blobcache"):
+            return None
+        return GitBlobCache(os.path.join(self.gitdir, "hg-blobmap"))
 
     def set_commiter_from_author(self, commit):
         commit.committer = commit.author
@@ -582,7 +722,13 @@ class GitHandler(object):
     # convert this commit into git objects
     # go through the manifest, convert all blobs/trees we don't have
     # write the commit object (with metadata info)
-    def export_hg_commit(self, rev, exporter):
+    def export_hg_commit(self, rev, exporter, delta, objects):
+        """Write the Git commit for a changeset.
+
+        delta is the difference between the changeset and the previous one
+        exported by exporter, as computed by hg2git.changesetdelta(). The
+        trees and the commit are added to the objects batch.
+        """
         self.ui.note(_("converting revision %s\n") % hex(rev))
 
         oldenc = self.swap_out_encoding()
@@ -633,7 +779,7 @@ class GitHandler(object):
             git_sha = self.map_git_get(hgsha)
             if git_sha:
                 git_sha = pycompat.encodeutf8(git_sha)
-                if git_sha not in self.git.object_store:
+                if git_sha not in objects:
                     raise error.Abort(
                         _("Parent SHA-1 not present in Git " "repo: %s")
                         % pycompat.decodeutf8(git_sha)
@@ -647,21 +793,23 @@ class GitHandler(object):
         if b"encoding" in extra:
             commit.encoding = pycompat.encodeutf8(extra["encoding"])
 
-        for obj, nodeid in exporter.update_changeset(ctx):
+        removed, changed = delta
+        for tree in exporter.applydelta(ctx, removed, changed):
             # In theory we should check if the object exists before adding it,
             # but in practice it's unlikely to exist, and scanning all the packs
-            # to determine that is expensive.
-            self.git.object_store.add_object(obj)
+            # to determine that is expensive. The exporter keeps modifying its
+            # trees, so add a copy.
+            objects.add(tree.copy())
 
         tree_sha = exporter.root_tree_sha
 
-        if tree_sha not in self.git.object_store:
+        if tree_sha not in objects:
             raise error.Abort(_("Tree SHA-1 not present in Git repo: %s") % tree_sha)
 
         commit.tree = tree_sha
 
-        if commit.id not in self.git.object_store:
-            self.git.object_store.add_object(commit)
+        if commit.id not in objects:
+            objects.add(commit)
         self.map_set(pycompat.decodeutf8(commit.id), ctx.hex())
 
         self.swap_out_encoding(oldenc)
@@ -1856,10 +2004,79 @@ class GitHandler(object):
         return client.SubprocessGitClient(), uri
 
 
+# File in the indexed map directory recording the size and mtime of the text
+# map file it was last synchronized with
+_map_state_file = "textmapstate"
+
+
+def _readmapstate(dir):
+    try:
+        with open(os.path.join(dir, _map_state_file), "rb") as f:
+            size, mtime = f.read().split()
+        return (int(size), int(mtime))
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _formatmaplines(items):
+    return b"".join(
+        pycompat.encodeutf8("%s %s\n" % (hex(gitnode), hex(hgnode)))
+        for gitnode, hgnode in items
+    )
+
+
+class GitBlobCache(object):
+    """Persistent cache of Mercurial file nodeids to the SHA-1s of the Git
+    blobs with the same content, so files exported by earlier pushes are not
+    read and hashed again.
+
+    The cache lives in the Git repository, so it never refers to blobs
+    missing from it. Only blobs known to be written are persisted.
+    """
+
+    def __init__(self, path):
+        self._nodemap = nodemap.nodemap(path)
+        # file nodeid to blob SHA-1 for the blobs computed by this process
+        self._seen = {}
+        self._written = []
+
+    def get(self, filenode, default=None):
+        blobid = self._seen.get(filenode)
+        if blobid is None:
+            node = self._nodemap.lookupbyfirst(filenode)
+            if node is None:
+                return default
+            blobid = pycompat.encodeutf8(hex(node))
+        return blobid
+
+    def __setitem__(self, filenode, blobid):
+        self._seen[filenode] = blobid
+
+    def addwritten(self, filenode, blobid):
+        self._seen[filenode] = blobid
+        self._written.append((filenode, blobid))
+
+    def flush(self):
+        for filenode, blobid in self._written:
+            self._nodemap.add(filenode, bin(blobid))
+        self._nodemap.flush()
+        self._written = []
+
+
 class GitMap(object):
     def __init__(self, content):
         mapgit = {}
         maphg = {}
+        for gitnode, hgnode in self.parselines(content):
+            mapgit[gitnode] = hgnode
+            maphg[hgnode] = gitnode
+        self._mapgit = mapgit
+        self._maphg = maphg
+
+    @staticmethod
+    def parselines(content):
+        """return the (gitnode, hgnode) entries of the lines of a text map"""
+        entries = []
         for line in content:
             # format is <40 hex digits> <40 hex digits>\n
             if len(line) != 82:
@@ -1867,12 +2084,8 @@ class GitMap(object):
                     _("corrupt mapfile: incorrect line length %d %s")
                     % (len(line), content)
                 )
-            gitnode = bin(line[:40])
-            hgnode = bin(line[41:81])
-            mapgit[gitnode] = hgnode
-            maphg[hgnode] = gitnode
-        self._mapgit = mapgit
-        self._maphg = maphg
+            entries.append((bin(line[:40]), bin(line[41:81])))
+        return entries
 
     def lookupbyfirst(self, gitnode):
         return self._mapgit.get(gitnode)
@@ -223,21 +223,27 @@ class IncrementalChangesetExporter(object):
         update_changeset. If this is the first call to update_chanageset, all
         objects in the tree are emitted.
         """
-        # Our general strategy is to accumulate dulwich.objects.Blob and
-        # dulwich.objects.Tree instances for the current Mercurial changeset.
-        # We do this incremental by iterating over the Mercurial-reported
-        # changeset delta. We rely on the behavior of Mercurial to lazy
-        # calculate a Tree's SHA-1 when we modify it. This is critical to
-        # performance.
-
-        # In theory we should be able to look at changectx.files(). This is
-        # *much* faster. However, it may not be accurate, especially with older
-        # repositories, which may not record things like deleted files
-        # explicitly in the manifest (which is where files() gets its data).
-        # The only reliable way to get the full set of changes is by looking at
-        # the full manifest. And, the easy way to compare two manifests is
-        # localrepo.status().
-        modified, added, removed = self._hg.status(self._ctx, newctx)[0:3]
+        removed, changed, blobs = changesetdelta(
+            self._hg, self._ctx, newctx, self._blob_cache
+        )
+        for blob, filenode in blobs:
+            yield (blob, filenode)
+        for tree in self.applydelta(newctx, removed, changed):
+            yield (tree, None)
+
+    def applydelta(self, newctx, removed, changed):
+        """Set the tree to track a new Mercurial changeset, given the
+        difference computed by changesetdelta() from the current changeset.
+
+        This is a generator of the dulwich Trees that changed. The blobs of
+        the changed files are not emitted, callers are expected to have
+        written them already.
+        """
+        # Our general strategy is to accumulate dulwich.objects.Tree instances
+        # for the current Mercurial changeset. We do this incremental by
+        # iterating over the Mercurial-reported changeset delta. We rely on the
+        # behavior of Mercurial to lazy calculate a Tree's SHA-1 when we modify
+        # it. This is critical to performance.
 
         # We track which directories/trees have modified in this update and we
         # only export those.
@@ -246,23 +252,12 @@ class IncrementalChangesetExporter(object):
         for path in removed:
             self._remove_path(path, dirty_trees)
 
-        # For every file that changed or was added, we need to calculate the
-        # corresponding Git blob and its tree entry. We emit the blob
-        # immediately and update trees to be aware of its presence.
-        for path in set(modified) | set(added):
+        for path, mode, blobid in changed:
             audit_git_path(self._hg.ui, path)
             d = os.path.dirname(path)
             tree = self._dirs.setdefault(d, dulobjs.Tree())
             dirty_trees.add(d)
-
-            fctx = newctx[path]
-
-            func = IncrementalChangesetExporter.tree_entry
-            entry, blob = func(fctx, self._blob_cache)
-            if blob is not None:
-                yield (blob, fctx.filenode())
-
-            tree.add(*entry)
+            tree.add(pycompat.encodeutf8(os.path.basename(path)), mode, blobid)
 
         # Now that all the trees represent the current changeset, recalculate
         # the tree IDs and emit them. Note that we wait until now to calculate
@@ -270,7 +265,7 @@ class IncrementalChangesetExporter(object):
         # dulwich.index.commit_tree(), which builds new Tree instances for each
         # series of blobs.
         for obj in self._populate_tree_entries(dirty_trees):
-            yield (obj, None)
+            yield obj
 
         self._ctx = newctx
 
@@ -407,3 +402,97 @@ class IncrementalChangesetExporter(object):
             ),
             blob,
         )
+
+
+def changesetdelta(repo, oldctx, newctx, blobcache):
+    """Compute the difference between two changesets in terms of Git tree
+    entries.
+
+    Returns a 3-tuple: the removed paths, a list of (path, mode, blob SHA-1)
+    for the modified and added files, and a list of (dulwich.objects.Blob,
+    Mercurial file nodeid) for the blobs that were not in blobcache. The new
+    blobs are added to blobcache.
+
+    This only reads from the repository, so the deltas of several pairs of
+    changesets can be computed in parallel.
+    """
+    # In theory we should be able to look at changectx.files(). This is
+    # *much* faster. However, it may not be accurate, especially with older
+    # repositories, which may not record things like deleted files
+    # explicitly in the manifest (which is where files() gets its data).
+    # The only reliable way to get the full set of changes is by looking at
+    # the full manifest. And, the easy way to compare two manifests is
+    # localrepo.status().
+    modified, added, removed = repo.status(oldctx, newctx)[0:3]
+
+    # For every file that changed or was added, we need to calculate the
+    # corresponding Git blob and its tree entry.
+    changed = []
+    blobs = []
+    for path in set(modified) | set(added):
+        fctx = newctx[path]
+        entry, blob = IncrementalChangesetExporter.tree_entry(fctx, blobcache)
+        if blob is not None:
+            blobs.append((blob, fctx.filenode()))
+        changed.append((path, entry.mode, entry.sha))
+    return removed, changed, blobs
+
+
+def exportdeltas(repo, store, blobcache, batchsize, pairs):
+    """Compute the deltas of (old node, new node) pairs of changesets and
+    write the new blobs to a Git object store.
+
+    This is a generator of (new node, removed, changed, new blobs) for each
+    pair, in order, where removed and changed are as returned by
+    changesetdelta() and new blobs is a list of (Mercurial file nodeid, Git
+    blob SHA-1) for the blobs that were written. Blobs are written in packs
+    of about batchsize objects, and a delta is only emitted once the blobs it
+    refers to are in the object store.
+    """
+    deltas = []
+    blobs = []
+    for oldnode, newnode in pairs:
+        removed, changed, newblobs = changesetdelta(
+            repo, repo[oldnode], repo[newnode], blobcache
+        )
+        blobs.extend((blob, None) for blob, filenode in newblobs)
+        newblobids = [(filenode, blob.id) for blob, filenode in newblobs]
+        deltas.append((newnode, removed, changed, newblobids))
+        if len(blobs) >= batchsize:
+            store.add_objects(blobs)
+            blobs = []
+            for delta in deltas:
+                yield delta
+            deltas = []
+    if blobs:
+        store.add_objects(blobs)
+    for delta in deltas:
+        yield delta
+
+
+class ObjectBatch(object):
+    """Git objects waiting to be written to an object store as a single pack.
+
+    Writing objects one at a time creates a loose object file for each of
+    them, which is much slower than writing a pack of many. Objects added to
+    a batch must not be modified afterwards.
+    """
+
+    def __init__(self, store, size):
+        self._store = store
+        self._size = size
+        # SHA-1 to dulwich object
+        self._objects = {}
+
+    def __contains__(self, sha):
+        return sha in self._objects or sha in self._store
+
+    def add(self, obj):
+        self._objects[obj.id] = obj
+        if len(self._objects) >= self._size:
+            self.flush()
+
+    def flush(self):
+        if self._objects:
+            self._store.add_objects([(obj, None) for obj in self._objects.values()])
+            self._objects.clear()
@@ -26,8 +26,10 @@ Configs::
     # Filesystem path to the index store
     indexpath = PATH
 
-    # Server-side option. Possible values: 'disk' or 'external'
-    # Fails if not set
+    # Server-side option. Possible values: 'disk', 'chunked' or 'external'
+    # Fails if not set. 'chunked' stores bundles on disk split in
+    # content-defined chunks, so that similar bundles share their chunks.
+    # It needs uncompressed bundles, see `bundlecompression`.
     storetype = disk
 
     # Server-side option.
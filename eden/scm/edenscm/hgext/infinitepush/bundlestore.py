@@ -6,13 +6,19 @@
 # Infinitepush Bundle Store
 """store for infinitepush bundles"""
 
+import binascii
 import hashlib
 import os
+import struct
 import subprocess
+import sys
+import time
+import zlib
 from tempfile import NamedTemporaryFile
 
-from edenscm.mercurial import error
+from edenscm.mercurial import error, pycompat, util
 from edenscm.mercurial.i18n import _
+from edenscm.mercurial.pycompat import range
 
 
 class bundlestore(object):
@@ -20,6 +26,8 @@ class bundlestore(object):
         storetype = repo.ui.config("infinitepush", "storetype", "")
         if storetype == "disk":
             self.store = filebundlestore(repo)
+        elif storetype == "chunked":
+            self.store = chunkedbundlestore(repo)
         elif storetype == "external":
             self.store = externalbundlestore(repo)
         else:
@@ -87,6 +95,239 @@ class filebundlestore(object):
         return f.read()
 
 
+# Chunk boundaries are content-defined, so that an insertion or a removal in
+# a bundle only changes the chunks around it. A boundary is placed after a
+# byte where a hash of the last _chunkhashsize bytes is zero and the crc32 of
+# the last _chunkwindow bytes has its _chunkmask bits unset. Both only depend
+# on the content near the boundary.
+#
+# The first hash is computed for a whole block of the bundle at once: it is
+# the xor of one byte translation per position in the window, and the xor is
+# done on the translated blocks read as big integers. Only the positions where
+# it is zero, 1 in 256 on random data, are then checked in Python.
+_chunkminsize = 2 * 1024
+_chunkmaxsize = 64 * 1024
+_chunkhashsize = 4
+_chunkwindow = 32
+# 8KB chunks on average on random data, on top of the minimum size
+_chunkmask = (1 << 5) - 1
+_chunkblocksize = 64 * 1024
+_chunktables = [
+    bytes(
+        bytearray(
+            bytearray(hashlib.sha1(struct.pack(">BB", k, i)).digest())[0]
+            for i in range(256)
+        )
+    )
+    for k in range(_chunkhashsize)
+]
+_chunkcandidates = bytes(bytearray(0 if i == 0 else 1 for i in range(256)))
+
+if sys.version_info[0] >= 3:
+
+    def _bytestoint(data):
+        return int.from_bytes(data, "big")
+
+    def _inttobytes(value, size):
+        return value.to_bytes(size, "big")
+
+else:
+
+    def _bytestoint(data):
+        return int(binascii.hexlify(data) or "0", 16)
+
+    def _inttobytes(value, size):
+        return binascii.unhexlify("%0*x" % (size * 2, value))
+
+
+def _chunkcandidatemap(data):
+    """return a string with a zero byte at each offset of data where a chunk
+    may end"""
+    size = len(data)
+    padded = b"\0" * (_chunkhashsize - 1) + data
+    blocks = []
+    for start in range(0, size, _chunkblocksize):
+        end = min(start + _chunkblocksize, size)
+        value = 0
+        for k, table in enumerate(_chunktables):
+            # the bytes k positions before those of the block
+            offset = _chunkhashsize - 1 - k
+            value ^= _bytestoint(padded[offset + start : offset + end].translate(table))
+        blocks.append(_inttobytes(value, end - start).translate(_chunkcandidates))
+    return b"".join(blocks)
+
+
+def _chunkboundaries(data):
+    """yield the end offsets of the content-defined chunks of data"""
+    candidates = _chunkcandidatemap(data)
+    size = len(data)
+    start = 0
+    while start < size:
+        end = min(start + _chunkmaxsize, size)
+        pos = start + _chunkminsize
+        while pos < end:
+            pos = candidates.find(b"\0", pos, end) + 1
+            if not pos:
+                break
+            window = data[max(pos - _chunkwindow, 0) : pos]
+            if not zlib.crc32(window) & _chunkmask:
+                end = pos
+                break
+        yield end
+        start = end
+
+
+class chunkedbundlestore(object):
+    """bundle store in filesystem, deduplicating the bundles in chunks
+
+    Bundles are split in content-defined chunks. Each chunk is stored once
+    under ``chunks/``, keyed by its sha1, and each bundle is stored under
+    ``bundles/`` as the list of its chunks. Bundles of stacks that are
+    rebased and pushed again share most of their chunks, which are then
+    neither written nor stored twice. This only works with uncompressed
+    bundles (``infinitepush.bundlecompression=UN``).
+
+    Chunks are never removed on write, ``hg debuggcbundlestore`` removes the
+    chunks that no bundle references anymore.
+    """
+
+    def __init__(self, repo):
+        self.storepath = repo.ui.configpath("scratchbranch", "storepath")
+        if not self.storepath:
+            self.storepath = repo.localvfs.join("scratchbranches", "chunkedbundlestore")
+        self._bundlespath = os.path.join(self.storepath, "bundles")
+        self._chunkspath = os.path.join(self.storepath, "chunks")
+        for path in (self._bundlespath, self._chunkspath):
+            if not os.path.exists(path):
+                os.makedirs(path)
+
+    def _bundlepath(self, key):
+        return os.path.join(self._bundlespath, key[0:2], key[2:4], key)
+
+    def _chunkpath(self, key):
+        return os.path.join(self._chunkspath, key[0:2], key[2:4], key)
+
+    def _writefile(self, path, data):
+        dirpath = os.path.dirname(path)
+        if not os.path.exists(dirpath):
+            try:
+                os.makedirs(dirpath)
+            except OSError:
+                # created by a concurrent write
+                if not os.path.isdir(dirpath):
+                    raise
+        with util.atomictempfile(path) as f:
+            f.write(data)
+
+    def write(self, data):
+        filename = hashlib.sha1(data).hexdigest()
+        bundlepath = self._bundlepath(filename)
+        if os.path.exists(bundlepath):
+            return filename
+
+        entries = []
+        start = 0
+        for end in _chunkboundaries(data):
+            chunk = data[start:end]
+            chunkkey = hashlib.sha1(chunk).hexdigest()
+            chunkpath = self._chunkpath(chunkkey)
+            try:
+                # mark the chunk as used so that a concurrent garbage
+                # collection keeps it
+                os.utime(chunkpath, None)
+            except OSError:
+                self._writefile(chunkpath, chunk)
+            entries.append("%s %d\n" % (chunkkey, end - start))
+            start = end
+
+        self._writefile(bundlepath, pycompat.encodeutf8("".join(entries)))
+        return filename
+
+    def _readentries(self, key):
+        """return the [(chunk key, size)] of a bundle, or None if the bundle
+        is unknown"""
+        try:
+            with open(self._bundlepath(key), "rb") as f:
+                data = pycompat.decodeutf8(f.read())
+        except IOError:
+            return None
+        entries = []
+        for line in data.splitlines():
+            chunkkey, size = line.split(" ", 1)
+            entries.append((chunkkey, int(size)))
+        return entries
+
+    def getchunks(self, key):
+        """return an iterator over the data of a bundle, or None if the
+        bundle is unknown
+
+        The bundle is reassembled chunk by chunk, without holding it in
+        memory.
+        """
+        entries = self._readentries(key)
+        if entries is None:
+            return None
+        return self._iterchunks(key, entries)
+
+    def _iterchunks(self, key, entries):
+        for chunkkey, size in entries:
+            try:
+                with open(self._chunkpath(chunkkey), "rb") as f:
+                    chunk = f.read()
+            except IOError:
+                chunk = None
+            if chunk is None or len(chunk) != size:
+                raise error.Abort(_("bundle %s is missing chunk %s") % (key, chunkkey))
+            yield chunk
+
+    def read(self, key):
+        chunks = self.getchunks(key)
+        if chunks is None:
+            return None
+        return b"".join(chunks)
+
+    def _walk(self, path):
+        for dirpath, _dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                # skip the temporary files of writes in progress
+                if not filename.startswith("."):
+                    yield filename, os.path.join(dirpath, filename)
+
+    def gc(self, minage, dryrun=False):
+        """remove the chunks that no bundle references
+
+        Chunks modified less than ``minage`` seconds ago are kept, as they
+        may belong to a bundle that is being written.
+
+        Return (number of bundles, {chunk key: reference count}, number of
+        chunks removed, size of the chunks removed).
+        """
+        refcounts = {}
+        nbundles = 0
+        for key, _path in self._walk(self._bundlespath):
+            nbundles += 1
+            for chunkkey, _size in self._readentries(key) or []:
+                refcounts[chunkkey] = refcounts.get(chunkkey, 0) + 1
+
+        deadline = time.time() - minage
+        removed = 0
+        removedsize = 0
+        for chunkkey, path in self._walk(self._chunkspath):
+            if chunkkey in refcounts:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_mtime > deadline:
+                continue
+            if not dryrun:
+                util.tryunlink(path)
+            removed += 1
+            removedsize += st.st_size
+        return nbundles, refcounts, removed, removedsize
+
+
 class externalbundlestore(object):
     def __init__(self, repo):
         """
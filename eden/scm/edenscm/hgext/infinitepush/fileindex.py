@@ -8,13 +8,23 @@
     # Server-side option. Used only if indextype=disk.
     # Filesystem path to the index store
     indexpath = PATH
+
+The nodes are also kept in a sorted binary index next to the nodemap
+directory, for node prefix lookups. ``nodeindex`` holds the sorted nodes as
+of its creation, and ``nodeindex.log`` the nodes added since. Both record
+the mtime of the nodemap directory after they were written: if it changed
+since, the nodemap was modified by something else, and the index is rebuilt
+from the directory on the next lookup.
 """
 
+import bisect
 import os
 import posixpath
+import struct
 
 from edenscm.mercurial import error, pycompat, util
 from edenscm.mercurial.i18n import _
+from edenscm.mercurial.node import bin, hex
 
 
 if pycompat.iswindows:
@@ -32,6 +42,62 @@ else:
         return path
 
 
+# nodeindex: magic, nodemap directory mtime, then the sorted binary nodes
+_indexheader = struct.Struct(">8sd")
+_indexmagic = b"HGINPNI1"
+# nodeindex.log: records of a binary node and the nodemap directory mtime
+_logrecord = struct.Struct(">20sd")
+# number of log records after which the log is merged into the index
+_maxlogrecords = 10000
+
+# characters that end the literal prefix of a regular expression
+_remeta = set(".^$*+?{}[]\\|()")
+
+
+def _literalprefix(regex):
+    """Return the literal string an anchored regex requires its matches to
+    start with
+
+    >>> _literalprefix("^scratch/.*")
+    'scratch/'
+    >>> _literalprefix("^infinitepush/backups/test/host/repo/heads/[0-9a-f]+")
+    'infinitepush/backups/test/host/repo/heads/'
+    >>> _literalprefix("^ab?c")
+    'a'
+    >>> _literalprefix("^a|b")
+    ''
+    >>> _literalprefix("abc")
+    ''
+    """
+    if not regex.startswith("^") or "|" in regex:
+        return ""
+    prefix = []
+    for i, c in enumerate(regex[1:], 1):
+        if c in _remeta:
+            if c in "*?{" and prefix:
+                # the previous character is optional
+                prefix.pop()
+            break
+        prefix.append(c)
+    return "".join(prefix)
+
+
+class _sortednodes(object):
+    """read-only sequence of the hex nodes of an index, for use with bisect"""
+
+    def __init__(self, data, offset):
+        self._data = data
+        self._offset = offset
+        self._count = (len(data) - offset) // 20
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        start = self._offset + i * 20
+        return hex(self._data[start : start + 20])
+
+
 class fileindex(object):
     """File-based backend for infinitepush index.
 
@@ -49,6 +115,8 @@ class fileindex(object):
             root = os.path.join("scratchbranches", "index")
 
         self._nodemap = os.path.join(root, "nodemap")
+        self._nodeindex = os.path.join(root, "nodeindex")
+        self._nodeindexlog = os.path.join(root, "nodeindex.log")
         self._bookmarkmap = os.path.join(root, "bookmarkmap")
         self._metadatamap = os.path.join(root, "nodemetadatamap")
         self._lock = None
@@ -64,9 +132,16 @@ class fileindex(object):
     def addbundle(self, bundleid, nodesctx, iscrossbackendsync=False):
         """Record a bundleid containing the given nodes."""
 
+        # the index can only be updated if it was up to date before
+        index = self._readnodeindex()
+        uptodate = index is not None and index[2] == self._nodemapmtime()
+        nodes = []
         for node in nodesctx:
             nodepath = os.path.join(self._nodemap, node.hex())
             self._write(nodepath, bundleid)
+            nodes.append(node.node())
+        if uptodate:
+            self._appendnodeindex(nodes)
 
     def addbookmark(self, bookmark, node, _isbackup):
         """Record a bookmark pointing to a particular node."""
@@ -101,8 +176,17 @@ class fileindex(object):
         if not vfs.exists(self._nodemap):
             return None
 
-        files = vfs.listdir(self._nodemap)
-        nodefiles = list(filter(lambda n: n.startswith(hashprefix), files))
+        nodes, lognodes = self._loadnodeindex()
+        nodefiles = set()
+        i = bisect.bisect_left(nodes, hashprefix)
+        while i < len(nodes) and len(nodefiles) < 2:
+            node = nodes[i]
+            if not node.startswith(hashprefix):
+                break
+            nodefiles.add(node)
+            i += 1
+        nodefiles.update(n for n in lognodes if n.startswith(hashprefix))
+        nodefiles = sorted(nodefiles)
 
         if not nodefiles:
             return None
@@ -133,12 +217,110 @@ class fileindex(object):
         vfs = self._repo.localvfs
         vfs.write(os.path.join(self._metadatamap, node), jsonmetadata)
 
+    def _nodemapmtime(self):
+        try:
+            return self._repo.localvfs.stat(self._nodemap).st_mtime
+        except OSError:
+            return None
+
+    def _readnodeindex(self):
+        """Return the data of the index, the binary nodes of the log added
+        since it was built, and the last nodemap mtime they recorded, or
+        None if there is no valid index"""
+        vfs = self._repo.localvfs
+        try:
+            with vfs(self._nodeindex, "rb") as fp:
+                data = util.mmapread(fp)
+        except (IOError, OSError):
+            return None
+        if len(data) < _indexheader.size:
+            return None
+        magic, indexmtime = _indexheader.unpack_from(data)
+        if magic != _indexmagic:
+            return None
+        # Readers rebuild the index without the lock and leave the log alone,
+        # so the log may hold records older than the index: skip them.
+        log = vfs.tryread(self._nodeindexlog)
+        lognodes = []
+        mtime = indexmtime
+        for offset in range(0, len(log) - _logrecord.size + 1, _logrecord.size):
+            node, logmtime = _logrecord.unpack_from(log, offset)
+            if logmtime >= indexmtime:
+                lognodes.append(node)
+                mtime = logmtime
+        return data, lognodes, mtime
+
+    def _loadnodeindex(self):
+        """Return the sorted hex nodes of the index and the hex nodes added
+        since, rebuilding the index if the nodemap was modified outside of
+        this class"""
+        index = self._readnodeindex()
+        if index is not None:
+            data, lognodes, mtime = index
+            if mtime == self._nodemapmtime():
+                lognodes = [hex(node) for node in lognodes]
+                return _sortednodes(data, _indexheader.size), lognodes
+        return self._rebuildnodeindex(), []
+
+    def _rebuildnodeindex(self, locked=False):
+        """Write the index from the content of the nodemap
+
+        The log is only removed if the caller holds the lock, as nodes may be
+        appended to it concurrently otherwise.
+        """
+        vfs = self._repo.localvfs
+        # read the mtime first: nodes written while listing the directory
+        # change it again and make the index look outdated
+        mtime = self._nodemapmtime()
+        nodes = []
+        for name in vfs.listdir(self._nodemap):
+            if len(name) == 40:
+                try:
+                    nodes.append(bin(name))
+                except (TypeError, ValueError):
+                    pass
+        nodes.sort()
+        data = _indexheader.pack(_indexmagic, mtime or 0.0) + b"".join(nodes)
+        try:
+            with vfs(self._nodeindex, "wb", atomictemp=True) as fp:
+                fp.write(data)
+            if locked:
+                vfs.tryunlink(self._nodeindexlog)
+        except (IOError, OSError):
+            # the index is only an optimization
+            pass
+        return _sortednodes(data, _indexheader.size)
+
+    def _appendnodeindex(self, nodes):
+        """Record nodes just written to the nodemap in the index, with the
+        lock held"""
+        vfs = self._repo.localvfs
+        if not nodes:
+            return
+        logrecords = len(vfs.tryread(self._nodeindexlog)) // _logrecord.size
+        if logrecords + len(nodes) > _maxlogrecords:
+            self._rebuildnodeindex(locked=True)
+            return
+        mtime = self._nodemapmtime() or 0.0
+        with vfs(self._nodeindexlog, "ab") as fp:
+            fp.write(b"".join(_logrecord.pack(node, mtime) for node in nodes))
+
     def _listbookmarks(self, pattern):
         if pattern.endswith("*"):
             pattern = "re:^" + pattern[:-1] + ".*"
         kind, pat, matcher = util.stringmatcher(pattern)
+        if kind == "literal":
+            bookmarkpath = _normalizepath(os.path.join(self._bookmarkmap, pat))
+            if self._repo.localvfs.isfile(bookmarkpath):
+                yield pat, pycompat.decodeutf8(self._read(bookmarkpath))
+            return
+        # Only walk the directory that all the matching bookmarks are in
+        walkpath = self._bookmarkmap
+        prefixdir = posixpath.dirname(_literalprefix(pat))
+        if prefixdir:
+            walkpath = _normalizepath(os.path.join(self._bookmarkmap, prefixdir))
         prefixlen = len(self._bookmarkmap) + 1
-        for dirpath, _dirs, books in self._repo.localvfs.walk(self._bookmarkmap):
+        for dirpath, _dirs, books in self._repo.localvfs.walk(walkpath):
             for book in books:
                 bookmark = posixpath.join(dirpath, book)[prefixlen:]
                 if not matcher(bookmark):
@@ -185,3 +185,49 @@ def debugmovescratchbookmark(ui, repo, *args, **opts):
         targetnode = _resolvetargetnode(repo, opts.get("rev"))
         index.deletebookmarks([scratchbookmarkname])
         index.addbookmark(scratchbookmarkname, targetnode, False)
+
+
+@command(
+    "debuggcbundlestore",
+    [
+        (
+            "",
+            "min-age",
+            3600,
+            _("keep the chunks modified less than SECONDS ago"),
+            _("SECONDS"),
+        ),
+        ("n", "dry-run", None, _("do not remove anything, just report")),
+    ],
+    _("[--min-age SECONDS] [-n]"),
+)
+def debuggcbundlestore(ui, repo, **opts):
+    """remove the chunks that no bundle references from the bundle store
+
+    Only the 'chunked' store type splits bundles in chunks. The chunks that
+    were modified recently are kept, as they may belong to a bundle that is
+    still being written.
+    """
+    if not common.isserver(ui):
+        raise error.Abort(
+            _("the bundle store can only be collected on an infinitepush server")
+        )
+
+    store = repo.bundlestore.store
+    if not util.safehasattr(store, "gc"):
+        raise error.Abort(_("the bundle store does not support garbage collection"))
+
+    dryrun = opts.get("dry_run")
+    nbundles, refcounts, removed, removedsize = store.gc(
+        opts.get("min_age"), dryrun=dryrun
+    )
+    shared = sum(1 for count in refcounts.values() if count > 1)
+    ui.status(
+        _("%d bundles reference %d chunks, %d of them shared\n")
+        % (nbundles, len(refcounts), shared)
+    )
+    if dryrun:
+        msg = _("would remove %d unreferenced chunks (%s)\n")
+    else:
+        msg = _("removed %d unreferenced chunks (%s)\n")
+    ui.status(msg % (removed, util.bytecount(removedsize)))
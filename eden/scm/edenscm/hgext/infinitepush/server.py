@@ -287,13 +287,23 @@ def downloadbundle(repo, unknownbinhead):
     bundleid = index.getbundle(nodemod.hex(unknownbinhead))
     if bundleid is None:
         raise error.Abort("%s head is not known" % nodemod.hex(unknownbinhead))
-    data = store.read(bundleid)
+    if util.safehasattr(store, "getchunks"):
+        chunks = store.getchunks(bundleid)
+    else:
+        data = store.read(bundleid)
+        chunks = None if data is None else [data]
+    if chunks is None:
+        raise error.Abort(
+            _("bundle %s of head %s is missing from the bundle store")
+            % (bundleid, nodemod.hex(unknownbinhead))
+        )
     fp = None
     fd, bundlefile = tempfile.mkstemp()
     try:  # guards bundlefile
         try:  # guards fp
             fp = util.fdopen(fd, "wb")
-            fp.write(data)
+            for chunk in chunks:
+                fp.write(chunk)
         finally:
             fp.close()
     except Exception:
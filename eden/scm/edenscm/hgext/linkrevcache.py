@@ -19,17 +19,17 @@ revisions and fill the database incrementally.
 
 If the building process is slow, try setting `checkancestor` to False.
 
-The database won't be updated on demand for I/O and locking concerns. It may be
-addressed if we could have some (partially) "append-only" map-like data
-structure.
+The database won't be updated on demand for I/O and locking concerns.
 
-The linkrev caching database would generally speed up the log (following a
-file) and annotate operations.
+The database is a single file of fixed-width records sorted by file node,
+which is memory-mapped and binary searched. Writers replace the file
+atomically, so readers never block them.
 
-.. note::
+`debugbuildlinkrevcache` scans the changelog in several processes when
+`worker.backend` is set to `processes`.
 
-   The database format is not guaranteed portable. Copying it from a machine
-   to another may make it unreadable.
+The linkrev caching database would generally speed up the log (following a
+file) and annotate operations.
 
 Config examples::
 
@@ -56,9 +56,9 @@ Config examples::
     maxpagesize = 2441406
 """
 
+import bisect
 import os
-import shutil
-import sys
+import struct
 
 from edenscm.mercurial import (
     context,
@@ -69,6 +69,7 @@ from edenscm.mercurial import (
     pycompat,
     registrar,
     util,
+    worker,
 )
 from edenscm.mercurial.i18n import _
 from edenscm.mercurial.pycompat import range
@@ -79,233 +80,266 @@ testedwith = "ships-with-fb-hgext"
 cmdtable = {}
 command = registrar.command(cmdtable)
 
-_chosendbm = None
-
-
-def _choosedbm():
-    """return (name, module)"""
-    global _chosendbm
-    if not _chosendbm:
-        if sys.version_info >= (3, 0):
-            candidates = [
-                ("gdbm", "dbm.gnu"),
-                ("ndbm", "dbm.ndbm"),
-                ("dumb", "dbm.dumb"),
-            ]
-        else:
-            candidates = [
-                ("gdbm", "gdbm"),
-                ("bsd", "dbhash"),
-                ("ndbm", "dbm"),
-                ("dumb", "dumbdbm"),
-            ]
-        for name, modname in candidates:
-            try:
-                mod = __import__(modname)
-                mod.open  # sanity check with demandimport enabled
-                _chosendbm = (name, __import__(modname))
-                break
-            except ImportError:
-                pass
-    return _chosendbm
+# The index file has the following layout:
+#
+#   header: magic, last scanned revision, number of paths, number of records
+#   path offsets: (number of paths + 1) * u32, offsets of the paths in the
+#                 path table, the paths being sorted
+#   records: number of records * (file node, path id, linkrev), sorted
+#   path table: the paths, concatenated
+#
+# A path id is the index of the path in the sorted paths.
+_header = struct.Struct(">8sQII")
+_offset = struct.Struct(">I")
+_record = struct.Struct(">20sII")
+_keylen = 24  # file node and path id
 
+_magic = b"HGLRIDX1"
+_indexname = "index"
 
-# dbm is a bytes -> bytes map, so we need to convert integers to bytes.
-# the conversion functions are optimized for space usage.
-# not using struct.(un)pack is because we may have things > 4 bytes (revlog
-# defines the revision number to be 6 bytes) and 8-byte is wasteful.
+# the database files of the old dbm-based format
+_legacysuffixes = ("0meta", "1path", "2node", "3linkrev")
 
 
-def _strinc(s):
-    """return the "next" string. useful as an incremental "ID"."""
-    if not s:
-        # avoid '\0' so '\0' could be used as a separator
-        return "\x01"
-    n = ord(s[-1])
-    if n == 255:
-        return _strinc(s[:-1]) + "\x01"
-    else:
-        return s[:-1] + chr(n + 1)
+class _sortedkeys(object):
+    """read-only sequence of the (file node, path id) keys of the records,
+    for use with bisect"""
 
+    def __init__(self, data, offset, count):
+        self._data = data
+        self._offset = offset
+        self._count = count
 
-def _str2int(s):
-    # this is faster than "bytearray().extend(map(ord, s))"
-    x = 0
-    for ch in s:
-        x <<= 8
-        x += ord(ch)
-    return x
+    def __len__(self):
+        return self._count
 
+    def __getitem__(self, i):
+        start = self._offset + i * _record.size
+        return self._data[start : start + _keylen]
 
-def _int2str(x):
-    s = ""
-    while x:
-        s = chr(x & 255) + s
-        x >>= 8
-    return s
 
+class _sortedpaths(object):
+    """read-only sequence of the paths of the index, for use with bisect"""
 
-def _intlist2str(intlist):
-    result = ""
-    for n in intlist:
-        s = _int2str(n)
-        l = len(s)
-        # do not accept huge integers
-        assert l < 256
-        result += chr(l) + s
-    return result
+    def __init__(self, data, offset, count, tableoffset):
+        self._data = data
+        self._offset = offset
+        self._count = count
+        self._tableoffset = tableoffset
 
+    def __len__(self):
+        return self._count
 
-def _str2intlist(s):
-    result = []
-    i = 0
-    end = len(s)
-    while i < end:
-        l = ord(s[i])
-        i += 1
-        result.append(_str2int(s[i : i + l]))
-        i += l
-    return result
+    def __getitem__(self, i):
+        start = _offset.unpack_from(self._data, self._offset + i * _offset.size)[0]
+        end = _offset.unpack_from(self._data, self._offset + (i + 1) * _offset.size)[0]
+        return self._data[self._tableoffset + start : self._tableoffset + end]
 
 
 class linkrevdbreadonly(object):
-    _openflag = "r"
-
-    # numbers are useful in the atomic replace case: they can be sorted
-    # and replaced in a safer order. however, atomic caller should always
-    # use repo lock so the order only protects things when the repo lock
-    # does not work.
-    _metadbname = "0meta"
-    _pathdbname = "1path"
-    _nodedbname = "2node"
-    _linkrevdbname = "3linkrev"
-
     def __init__(self, dirname):
-        dbmname, self._dbm = _choosedbm()
-        # use different file names for different dbm engine, to make the repo
-        # rsync-friendly across different platforms.
-        self._path = os.path.join(dirname, dbmname)
-        self._dbs = {}
-
-    def getlinkrevs(self, path, fnode):
-        pathdb = self._getdb(self._pathdbname)
-        nodedb = self._getdb(self._nodedbname)
-        lrevdb = self._getdb(self._linkrevdbname)
+        self._dirname = dirname
+        self._path = os.path.join(dirname, _indexname)
+        self._data = None
+        # {path: path id or None}
+        self._pathids = {}
+
+    def _load(self):
+        if self._data is not None:
+            return
+        try:
+            with open(self._path, "rb") as f:
+                data = util.mmapread(f)
+        except (IOError, OSError):
+            data = b""
+        if len(data) < _header.size:
+            magic, lastrev, npaths, nrecords = _magic, 0, 0, 0
+        else:
+            magic, lastrev, npaths, nrecords = _header.unpack_from(data)
+        recordsoffset = _header.size + (npaths + 1) * _offset.size
+        tableoffset = recordsoffset + nrecords * _record.size
+        if magic != _magic or len(data) < tableoffset:
+            # not an index, or a truncated one: ignore it
+            lastrev, npaths, nrecords = 0, 0, 0
+            recordsoffset = tableoffset = 0
+        self._data = data
+        self._lastrev = lastrev
+        self._paths = _sortedpaths(data, _header.size, npaths, tableoffset)
+        self._keys = _sortedkeys(data, recordsoffset, nrecords)
+        self._recordsoffset = recordsoffset
+        self._pathids.clear()
+
+    def _getpathid(self, path):
         try:
-            pathid = pathdb[path]
-            nodeid = nodedb[fnode]
-            v = lrevdb[pathid + "\0" + nodeid]
-            return _str2intlist(v)
+            return self._pathids[path]
         except KeyError:
+            pass
+        encoded = pycompat.encodeutf8(path)
+        paths = self._paths
+        i = bisect.bisect_left(paths, encoded)
+        pathid = i if i < len(paths) and paths[i] == encoded else None
+        self._pathids[path] = pathid
+        return pathid
+
+    def _getdisklinkrevs(self, path, fnode):
+        self._load()
+        pathid = self._getpathid(path)
+        if pathid is None:
             return []
+        key = fnode + _offset.pack(pathid)
+        keys = self._keys
+        i = bisect.bisect_left(keys, key)
+        linkrevs = []
+        while i < len(keys) and keys[i] == key:
+            offset = self._recordsoffset + i * _record.size
+            linkrevs.append(_record.unpack_from(self._data, offset)[2])
+            i += 1
+        return linkrevs
+
+    def getlinkrevs(self, path, fnode):
+        return self._getdisklinkrevs(path, fnode)
 
     def getlastrev(self):
-        return _str2int(self._getmeta("lastrev"))
+        self._load()
+        return self._lastrev
+
+    def iterentries(self):
+        """yield (path, fnode, linkrevs) for all entries on disk"""
+        for path, fnode, linkrevs in self._iterrawentries():
+            yield pycompat.decodeutf8(path), fnode, linkrevs
+
+    def _iterrawentries(self):
+        self._load()
+        paths = self._paths
+        current = None
+        linkrevs = []
+        for i in range(len(self._keys)):
+            offset = self._recordsoffset + i * _record.size
+            fnode, pathid, linkrev = _record.unpack_from(self._data, offset)
+            if (fnode, pathid) != current:
+                if current is not None:
+                    yield paths[current[1]], current[0], linkrevs
+                current = (fnode, pathid)
+                linkrevs = []
+            linkrevs.append(linkrev)
+        if current is not None:
+            yield paths[current[1]], current[0], linkrevs
 
     def close(self):
-        # the check is necessary if __init__ fails - the caller may call
-        # "close" in a "finally" block and it probably does not want close() to
-        # raise an exception there.
-        if util.safehasattr(self, "_dbs"):
-            for db in pycompat.itervalues(self._dbs):
-                db.close()
-            self._dbs.clear()
-
-    def _getmeta(self, name):
-        try:
-            return self._getdb(self._metadbname)[name]
-        except KeyError:
-            return ""
-
-    def _getdb(self, name):
-        if name not in self._dbs:
-            self._dbs[name] = self._dbm.open(self._path + name, self._openflag)
-        return self._dbs[name]
+        # unmap the file, the next read maps the latest one. the sequences
+        # over the mapping are dropped too, so that nothing keeps it open
+        # and the file can be replaced on Windows.
+        data = self._data
+        self._data = None
+        self._paths = self._keys = None
+        self._pathids.clear()
+        if util.safehasattr(data, "close"):
+            data.close()
 
 
 class linkrevdbreadwrite(linkrevdbreadonly):
-    _openflag = "c"
+    # number of new entries kept in memory before they are merged into the
+    # index file
+    _maxpending = 1000000
 
     def __init__(self, dirname):
         util.makedirs(dirname)
         super(linkrevdbreadwrite, self).__init__(dirname)
+        # {(path, fnode): [linkrev]}
+        self._pending = {}
+        self._npending = 0
+        self._pendinglastrev = None
+
+    def getlinkrevs(self, path, fnode):
+        linkrevs = self._getdisklinkrevs(path, fnode)
+        pending = self._pending.get((path, fnode))
+        if pending:
+            linkrevs = sorted(set(linkrevs).union(pending))
+        return linkrevs
+
+    def getlastrev(self):
+        if self._pendinglastrev is not None:
+            return self._pendinglastrev
+        return super(linkrevdbreadwrite, self).getlastrev()
 
     def appendlinkrev(self, path, fnode, linkrev):
-        pathdb = self._getdb(self._pathdbname)
-        nodedb = self._getdb(self._nodedbname)
-        lrevdb = self._getdb(self._linkrevdbname)
-        metadb = self._getdb(self._metadbname)
-        try:
-            pathid = pathdb[path]
-        except KeyError:
-            pathid = _strinc(self._getmeta("pathid"))
-            pathdb[path] = pathid
-            metadb["pathid"] = pathid
-        try:
-            nodeid = nodedb[fnode]
-        except KeyError:
-            nodeid = _strinc(self._getmeta("nodeid"))
-            nodedb[fnode] = nodeid
-            metadb["nodeid"] = nodeid
-        k = pathid + "\0" + nodeid
-        try:
-            v = _str2intlist(lrevdb[k])
-        except KeyError:
-            v = []
-        if linkrev in v:
+        if linkrev in self.getlinkrevs(path, fnode):
             return
-        v.append(linkrev)
-        lrevdb[k] = _intlist2str(v)
+        self._pending.setdefault((path, fnode), []).append(linkrev)
+        self._npending += 1
+        if self._npending >= self._maxpending:
+            self.flush()
 
     def setlastrev(self, rev):
-        self._getdb(self._metadbname)["lastrev"] = _int2str(rev)
-
-
-class linkrevdbwritewithtemprename(linkrevdbreadwrite):
-    # Some dbm (ex. gdbm) disallows writer and reader to co-exist. This is
-    # basically to workaround that so a writer can still write to the (copied)
-    # database when there is a reader.
-    # Unlike "atomictemp", this applies to a directory. A directory cannot
-    # work like "atomictemp" unless symlink is used. Symlink is not portable so
-    # we don't use them. Therefore this is not atomic (while probably good
-    # enough because we write files in a reasonable order - in the worst case,
-    # we just drop those cache files).
-    # Ideally, we can have other dbms which support reader and writer to
-    # co-exist, and this will become unnecessary.
-    def __init__(self, dirname):
-        self._origpath = dirname
-        head, tail = os.path.split(dirname)
-        tempdir = "%s-%s" % (dirname, os.getpid())
-        self._tempdir = tempdir
-        try:
-            shutil.copytree(dirname, tempdir)
-            super(linkrevdbwritewithtemprename, self).__init__(tempdir)
-        except Exception:
-            shutil.rmtree(tempdir)
-            raise
+        self._pendinglastrev = rev
+
+    def flush(self):
+        """merge the new entries into the index file"""
+        if not self._pending and self._pendinglastrev is None:
+            return
+        self._load()
+        lastrev = self.getlastrev()
+
+        entries = []
+        for path, fnode, linkrevs in self._iterrawentries():
+            entries.extend((path, fnode, linkrev) for linkrev in linkrevs)
+        for (path, fnode), linkrevs in pycompat.iteritems(self._pending):
+            encoded = pycompat.encodeutf8(path)
+            entries.extend((encoded, fnode, linkrev) for linkrev in linkrevs)
+
+        paths = sorted(set(entry[0] for entry in entries))
+        pathids = dict((path, i) for i, path in enumerate(paths))
+        records = sorted(
+            set((fnode, pathids[path], linkrev) for path, fnode, linkrev in entries)
+        )
+
+        offsets = []
+        end = 0
+        for path in paths:
+            offsets.append(_offset.pack(end))
+            end += len(path)
+        offsets.append(_offset.pack(end))
+
+        # release the mapping so the file can be replaced on all platforms
+        linkrevdbreadonly.close(self)
+        with util.atomictempfile(self._path) as f:
+            f.write(_header.pack(_magic, lastrev, len(paths), len(records)))
+            f.write(b"".join(offsets))
+            f.write(b"".join(_record.pack(*record) for record in records))
+            f.write(b"".join(paths))
+
+        self._pending.clear()
+        self._npending = 0
+        self._pendinglastrev = None
+        _removelegacy(self._dirname)
 
     def close(self):
-        super(linkrevdbwritewithtemprename, self).close()
-        if util.safehasattr(self, "_tempdir"):
-            for name in sorted(os.listdir(self._tempdir)):
-                oldpath = os.path.join(self._tempdir, name)
-                newpath = os.path.join(self._origpath, name)
-                os.rename(oldpath, newpath)
-            os.rmdir(self._tempdir)
+        # the check is necessary if __init__ fails - the caller may call
+        # "close" in a "finally" block and it probably does not want close() to
+        # raise an exception there.
+        if util.safehasattr(self, "_pending"):
+            self.flush()
+        super(linkrevdbreadwrite, self).close()
+
+
+def _removelegacy(dirname):
+    """remove the files of the old dbm-based database"""
+    for name in os.listdir(dirname):
+        if any(suffix in name for suffix in _legacysuffixes):
+            try:
+                os.unlink(os.path.join(dirname, name))
+            except OSError:
+                pass
 
 
 def linkrevdb(dirname, write=False, copyonwrite=False):
-    # As commented in the "linkrevdbwritewithtemprename" above, these flags
-    # (write, copyonwrite) are mainly designed to workaround gdbm's locking
-    # issues. If we have a dbm that uses a less aggressive lock, we could get
-    # rid of these workarounds.
+    # copyonwrite was a workaround for dbm engines that do not allow a reader
+    # and a writer at the same time. Writes now always replace the index
+    # atomically, so it is ignored.
     if not write:
         return linkrevdbreadonly(dirname)
     else:
-        if copyonwrite:
-            return linkrevdbwritewithtemprename(dirname)
-        else:
-            return linkrevdbreadwrite(dirname)
+        return linkrevdbreadwrite(dirname)
 
 
 _linkrevdbpath = "cache/linkrevdb"
@@ -325,17 +359,13 @@ def reposetup(ui, repo):
             "",
             "copy",
             False,
-            _("copy the database files to modify them " "lock-free (EXPERIMENTAL)"),
+            _("copy the database files to modify them " "lock-free (DEPRECATED)"),
         ),
     ],
 )
 def debugbuildlinkrevcache(ui, repo, *pats, **opts):
     """build the linkrev database from filelogs"""
-    db = linkrevdb(
-        repo.localvfs.join(_linkrevdbpath),
-        write=True,
-        copyonwrite=opts.get("atomic_temp"),
-    )
+    db = linkrevdb(repo.localvfs.join(_linkrevdbpath), write=True)
     end = int(opts.get("end") or (len(repo) - 1))
     try:
         _buildlinkrevcache(ui, repo, db, end)
@@ -353,14 +383,55 @@ def _getrsspagecount():
         return 0
 
 
-def _buildlinkrevcache(ui, repo, db, end):
-    checkancestor = ui.configbool("linkrevcache", "checkancestor", True)
-    readfilelog = ui.configbool("linkrevcache", "readfilelog", True)
-    # 2441406: 10G by default (assuming page size = 4K).
-    maxpagesize = ui.configint("linkrevcache", "maxpagesize") or 2441406
+# the number of ancestor tests when the slow (Python) stateful (cache
+# ancestors) algorithm is faster than the fast (C) stateless (walk through
+# the changelog index every time) algorithm.
+_ancestorcountthreshold = 10
+
 
+def _isancestorfunc(repo, rev, count):
+    """return a function testing if a revision is an ancestor of rev, for
+    about count tests"""
+    cl = repo.changelog
+    if count >= _ancestorcountthreshold:
+        # we may need to frequently test ancestors against rev,
+        # in this case, pre-calculating rev's ancestors helps.
+        ancestors = cl.ancestors([rev])
+
+        def isancestor(x):
+            return x in ancestors
+
+    else:
+        # the C index ancestor testing is faster than Python's
+        # lazyancestors.
+        idx = cl.index
+
+        def isancestor(x):
+            return x in idx.commonancestorsheads(x, rev)
+
+    return isancestor
+
+
+def _isnewlinkrev(db, path, fnode, rev, lrev, isancestor):
+    """test if rev introduces fnode at path, given the linkrevs in db and the
+    filelog linkrev lrev"""
+    linkrevs = set(db.getlinkrevs(path, fnode))
+    if lrev is not None:
+        linkrevs.add(lrev)
+    if rev in linkrevs:
+        return False
+    return not any(isancestor(l) for l in linkrevs)
+
+
+def _findlinkrevs(repo, db, checkancestor, readfilelog, maxpagesize, revs):
+    """yield (rev, [(path, fnode, filelog linkrev)]) with the files of each
+    revision in revs that need a linkrev in the database
+
+    This may run in a worker process with a copy of db, which misses the
+    linkrevs found by the other workers, so the caller has to check the
+    candidates again.
+    """
     cl = repo.changelog
-    idx = cl.index
     ml = repo.manifestlog
 
     filelogcache = {}
@@ -374,57 +445,71 @@ def _buildlinkrevcache(ui, repo, db, end):
             filelogcache[path] = filelog.filelog(repo.svfs, path)
         return filelogcache[path]
 
-    start = db.getlastrev() + 1
+    for rev in revs:
+        clr = cl.changelogrevision(rev)
+        md = ml[clr.manifest].read()
 
-    # the number of ancestor tests when the slow (Python) stateful (cache
-    # ancestors) algorithm is faster than the fast (C) stateless (walk through
-    # the changelog index every time) algorithm.
-    ancestorcountthreshold = 10
+        if checkancestor:
+            isancestor = _isancestorfunc(repo, rev, len(clr.files))
 
-    with progress.bar(ui, _("building"), _("changesets"), end) as prog:
-        for rev in range(start, end + 1):
-            prog.value = rev
-            clr = cl.changelogrevision(rev)
-            md = ml[clr.manifest].read()
+        candidates = []
+        for path in clr.files:
+            if path not in md:
+                continue
 
-            if checkancestor:
-                if len(clr.files) >= ancestorcountthreshold:
-                    # we may need to frequently test ancestors against rev,
-                    # in this case, pre-calculating rev's ancestors helps.
-                    ancestors = cl.ancestors([rev])
+            fnode = md[path]
 
-                    def isancestor(x):
-                        return x in ancestors
+            if readfilelog:
+                fl = _getfilelog(path)
+                frev = fl.rev(fnode)
+                lrev = fl.linkrev(frev)
+                if lrev == rev:
+                    continue
+            else:
+                lrev = None
 
-                else:
-                    # the C index ancestor testing is faster than Python's
-                    # lazyancestors.
-                    def isancestor(x):
-                        return x in idx.commonancestorsheads(x, rev)
+            if checkancestor and not _isnewlinkrev(
+                db, path, fnode, rev, lrev, isancestor
+            ):
+                continue
 
-            for path in clr.files:
-                if path not in md:
-                    continue
+            candidates.append((path, fnode, lrev))
+        yield rev, candidates
 
-                fnode = md[path]
 
-                if readfilelog:
-                    fl = _getfilelog(path)
-                    frev = fl.rev(fnode)
-                    lrev = fl.linkrev(frev)
-                    if lrev == rev:
-                        continue
-                else:
-                    lrev = None
+def _buildlinkrevcache(ui, repo, db, end):
+    checkancestor = ui.configbool("linkrevcache", "checkancestor", True)
+    readfilelog = ui.configbool("linkrevcache", "readfilelog", True)
+    # 2441406: 10G by default (assuming page size = 4K).
+    maxpagesize = ui.configint("linkrevcache", "maxpagesize") or 2441406
 
-                if checkancestor:
-                    linkrevs = set(db.getlinkrevs(path, fnode))
-                    if lrev is not None:
-                        linkrevs.add(lrev)
-                    if rev in linkrevs:
-                        continue
-                    if any(isancestor(l) for l in linkrevs):
-                        continue
+    start = db.getlastrev() + 1
+
+    # Reading manifests and filelogs dominates, and is spread over worker
+    # processes if possible. The results come back in revision order, so
+    # the database is updated exactly like a serial scan would.
+    results = worker.worker(
+        ui,
+        0.001,
+        _findlinkrevs,
+        (repo, db, checkancestor, readfilelog, maxpagesize),
+        list(range(start, end + 1)),
+        callsite="linkrevcache",
+        ordered=True,
+        threadsafe=False,
+    )
+
+    with progress.bar(ui, _("building"), _("changesets"), end) as prog:
+        for rev, candidates in results:
+            prog.value = rev
+            if checkancestor and candidates:
+                isancestor = _isancestorfunc(repo, rev, len(candidates))
+
+            for path, fnode, lrev in candidates:
+                if checkancestor and not _isnewlinkrev(
+                    db, path, fnode, rev, lrev, isancestor
+                ):
+                    continue
 
                 # found a new linkrev!
                 if ui.debugflag:
@@ -442,30 +527,17 @@ def debugverifylinkrevcache(ui, repo, *pats, **opts):
     c = context.basefilectx
     extensions.unwrapfunction(c, "_adjustlinkrev", _adjustlinkrev)
 
-    paths = {}  # {id: name}
-    nodes = {}  # {id: name}
-
     idx = repo.changelog.index
 
     db = repo._linkrevcache
-    paths = dict(db._getdb(db._pathdbname))
-    nodes = dict(db._getdb(db._nodedbname))
-    pathsrev = dict((v, pycompat.decodeutf8(k)) for k, v in pycompat.iteritems(paths))
-    nodesrev = dict((v, k) for k, v in pycompat.iteritems(nodes))
-    lrevs = dict(db._getdb(db._linkrevdbname))
+    entries = list(db.iterentries())
 
     readfilelog = ui.configbool("linkrevcache", "readfilelog", True)
 
-    total = len(lrevs)
+    total = len(entries)
     with progress.bar(ui, _("verifying"), total=total) as prog:
-        for i, (k, v) in enumerate(pycompat.iteritems(lrevs)):
+        for i, (path, fnode, linkrevs) in enumerate(entries):
             prog.value = i
-            pathid, nodeid = k.split(b"\0")
-            path = pathsrev[pathid]
-            fnode = nodesrev[nodeid]
-            linkrevs = _str2intlist(pycompat.decodeutf8(v))
-            linkrevs.sort()
-
             for linkrev in linkrevs:
                 fctx = repo[linkrev][path]
                 introrev = fctx.introrev()
@@ -502,14 +574,8 @@ def _adjustlinkrev(orig, self, *args, **kwds):
         try:
             linkrevs = set(cache.getlinkrevs(self._path, self._filenode))
         except Exception:
-            # the database may be locked - cannot be used correctly
+            # the database may be unreadable - cannot be used correctly
             linkrevs = set()
-        finally:
-            # do not keep the database open so others can write to it
-            # note: this is bad for perf. but it's here to workaround the gdbm
-            # locking pattern: reader and writer cannot co-exist. if we have
-            # a dbm engine that locks differently, we don't need this.
-            cache.close()
         linkrevs.add(lkr)
         for rev in sorted(linkrevs):  # sorted filters out unnecessary linkrevs
             if rev in index.commonancestorsheads(rev, srcrev):
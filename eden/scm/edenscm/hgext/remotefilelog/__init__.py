@@ -29,6 +29,10 @@ Configs:
 
     ``remotefilelog.localdatarepack`` runs repack on local data loose files
 
+    ``remotefilelog.packsummaries`` keeps a Bloom filter of the nodes of each
+    pack file next to its index, so lookups skip packs that cannot contain a
+    key. Defaults to False.
+
     ``remotefilelog.getfilesstep`` the number of files per batch during fetching
 
     ``remotefilelog.repackonhggc`` runs repack on hg gc when True
@@ -39,6 +43,13 @@ Configs:
     ``remotefilelog.prefetchchunksize`` specifies how many files to fetch from the
     server in one go.
 
+    ``remotefilelog.prefetchconnections`` specifies how many pooled
+    connections to fetch packs over concurrently. Defaults to 1.
+
+    ``remotefilelog.prefetchwritequeue`` specifies how many received entries
+    may wait to be written to the local store during a concurrent fetch
+    before receiving pauses.
+
     ``remotefilelog.prefetchdelay`` specifies delay between background
     prefetches in seconds after operations that change the working copy parent
 
@@ -159,6 +170,7 @@ from edenscm.mercurial import (
     repair,
     revset,
     scmutil,
+    similar,
     smartset,
     store,
     templatekw,
@@ -210,6 +222,9 @@ configitem("remotefilelog", "server", default=None)
 configitem("remotefilelog", "getpackversion", default=1)
 configitem("remotefilelog", "commitsperrepack", default=100)
 configitem("remotefilelog", "http", default=False)
+configitem("remotefilelog", "packsummaries", default=False)
+configitem("remotefilelog", "prefetchconnections", default=1)
+configitem("remotefilelog", "prefetchwritequeue", default=10000)
 configitem("edenapi", "url", default=None)
 
 testedwith = "ships-with-fb-hgext"
@@ -460,20 +475,43 @@ def onetimeclientsetup(ui):
     wrapfunction(merge, "_checkunknownfiles", checkunknownfiles)
 
     # Prefetch the logic that compares added and removed files for renames
-    def findrenames(orig, repo, matcher, added, removed, *args, **kwargs):
+    def findrenames(orig, repo, matcher, added, removed, similarity, *args, **kwargs):
         if shallowrepo.requirement in repo.requirements:
             files = []
             parentctx = repo["."]
             m1 = parentctx.manifest()
+            contentstore = repo.fileslog.contentstore
             for f in removed:
                 if f in m1:
-                    files.append((f, hex(parentctx.filenode(f))))
+                    node = parentctx.filenode(f)
+                    if similarity >= 1.0:
+                        # exact rename detection only needs the size and
+                        # content hash, which the metadata already has
+                        try:
+                            contentstore.metadata(f, node)
+                            continue
+                        except KeyError:
+                            pass
+                    files.append((f, hex(node)))
             # batch fetch the needed files from the server
             repo.fileservice.prefetch(files)
-        return orig(repo, matcher, added, removed, *args, **kwargs)
+        return orig(repo, matcher, added, removed, similarity, *args, **kwargs)
 
     wrapfunction(scmutil, "_findrenames", findrenames)
 
+    # Let exact rename detection use the content hash from the metadata
+    # instead of reading the file
+    def knownsha256(orig, repo, fctx):
+        if shallowrepo.requirement in repo.requirements and fctx.filenode() is not None:
+            try:
+                meta = repo.fileslog.contentstore.metadata(fctx.path(), fctx.filenode())
+                return meta["sha256"]
+            except KeyError:
+                pass
+        return orig(repo, fctx)
+
+    wrapfunction(similar, "_knownsha256", knownsha256)
+
     # prefetch files before mergecopies check
     def computenonoverlap(orig, repo, c1, c2, *args, **kwargs):
         u1, u2 = orig(repo, c1, c2, *args, **kwargs)
@@ -33,6 +33,92 @@ else:
     PACKOPENMODE = "rb"
 
 
+# Pack summaries are Bloom filters over the nodes in a pack, stored next to
+# the pack index. 10 bits per node with 7 hash functions give a false
+# positive rate of about 1%.
+SUMMARYMAGIC = b"PSUM"
+SUMMARYVERSION = 1
+# (magic, version, number of hashes, unused, number of bits)
+SUMMARYHEADERFORMAT = "!4sBBHQ"
+SUMMARYHEADERLENGTH = struct.calcsize(SUMMARYHEADERFORMAT)
+SUMMARYBITSPERNODE = 10
+SUMMARYNUMHASHES = 7
+
+
+class packsummary(object):
+    """Bloom filter telling which nodes a pack cannot contain
+
+    Nodes are SHA-1 hashes, so their bytes are used directly as the hash
+    values. Summaries on disk are memory-mapped and never parsed.
+    """
+
+    def __init__(self, data, numbits, numhashes, offset=0):
+        self._data = data
+        self._offset = offset
+        self._numbits = numbits
+        self._numhashes = numhashes
+
+    @classmethod
+    def build(cls, nodes):
+        nodes = set(nodes)
+        numbits = max(64, len(nodes) * SUMMARYBITSPERNODE)
+        data = bytearray((numbits + 7) // 8)
+        for node in nodes:
+            for bit in cls._bits(node, numbits, SUMMARYNUMHASHES):
+                data[bit >> 3] |= 1 << (bit & 7)
+        return cls(data, numbits, SUMMARYNUMHASHES)
+
+    @classmethod
+    def load(cls, path):
+        """load a summary written by write(), or return None"""
+        try:
+            with open(path, PACKOPENMODE) as fp:
+                data = util.mmapread(fp)
+        except (IOError, OSError, ValueError):
+            return None
+        if len(data) < SUMMARYHEADERLENGTH:
+            return None
+        magic, version, numhashes, _unused, numbits = struct.unpack(
+            SUMMARYHEADERFORMAT, data[:SUMMARYHEADERLENGTH]
+        )
+        if (
+            magic != SUMMARYMAGIC
+            or version != SUMMARYVERSION
+            or len(data) != SUMMARYHEADERLENGTH + (numbits + 7) // 8
+        ):
+            return None
+        return cls(data, numbits, numhashes, offset=SUMMARYHEADERLENGTH)
+
+    def write(self, path):
+        header = struct.pack(
+            SUMMARYHEADERFORMAT,
+            SUMMARYMAGIC,
+            SUMMARYVERSION,
+            self._numhashes,
+            0,
+            self._numbits,
+        )
+        with util.atomictempfile(path, mode="wb") as fp:
+            fp.write(header)
+            fp.write(bytes(self._data[self._offset :]))
+
+    @staticmethod
+    def _bits(node, numbits, numhashes):
+        # double hashing: the i-th bit is h1 + i * h2
+        h1, h2 = struct.unpack("!QQ", node[:16])
+        for i in range(numhashes):
+            yield (h1 + i * h2) % numbits
+
+    def __contains__(self, node):
+        data = self._data
+        offset = self._offset
+        for bit in self._bits(node, self._numbits, self._numhashes):
+            byte = offset + (bit >> 3)
+            if not ord(data[byte : byte + 1]) & (1 << (bit & 7)):
+                return False
+        return True
+
+
 class _cachebackedpacks(object):
     def __init__(self, packs, cachesize):
         self._packs = set(packs)
@@ -109,6 +195,11 @@ class basepackstore(object):
         self.packs = _cachebackedpacks([], self.DEFAULTCACHESIZE)
         self.packspath = set()
 
+        self.usesummaries = ui.configbool("remotefilelog", "packsummaries", False)
+        # pack path -> packsummary, or None if the pack has no summary
+        self._summaries = {}
+        self._summarymetrics = collections.defaultdict(lambda: 0)
+
     def repackstore(self, incremental=True):
         from .repack import runrepacklegacy
 
@@ -133,6 +224,13 @@ class basepackstore(object):
                 id, ext = os.path.splitext(filename)
 
                 if id not in currentpacks:
+                    if ext == self.SUMMARYSUFFIX:
+                        # summaries outlive their pack when a repack removes
+                        # it, clean them up
+                        if not os.path.exists(id + self.INDEXSUFFIX):
+                            util.tryunlink(filename)
+                        continue
+
                     # Since we expect to have two files corresponding to each ID
                     # (the index file and the pack file), we can yield once we see
                     # it twice.
@@ -185,18 +283,88 @@ class basepackstore(object):
         return totalsize, count
 
     def getmetrics(self):
-        """Returns metrics on the state of this store."""
+        """Returns metrics on the state of this store.
+
+        The summary metrics count pack probes (lookups that reached a pack
+        index), packs skipped because their summary ruled the keys out, and
+        probes that the summary let through but that missed anyway.
+        """
         size, count = self.gettotalsizeandcount()
-        return {"numpacks": count, "totalpacksize": size}
+        metrics = {"numpacks": count, "totalpacksize": size}
+        metrics.update(self._summarymetrics)
+        return metrics
 
     def getpack(self, path):
         raise NotImplemented()
 
+    def getpacknodes(self, pack):
+        """Returns the nodes in a pack, to build its summary."""
+        return (entry[1] for entry in pack.iterentries())
+
+    def _summarypath(self, pack):
+        return pack.path() + self.SUMMARYSUFFIX
+
+    def getsummary(self, pack):
+        """Returns the packsummary of a pack, or None if it has none.
+
+        Summaries are loaded from disk, or built and written next to the pack
+        index the first time a pack is seen. If the store is read-only the
+        summary is only kept in memory.
+        """
+        if not self.usesummaries:
+            return None
+        path = pack.path()
+        if path in self._summaries:
+            return self._summaries[path]
+        summarypath = self._summarypath(pack)
+        summary = packsummary.load(summarypath)
+        if summary is None:
+            try:
+                summary = packsummary.build(self.getpacknodes(pack))
+            except Exception:
+                summary = None
+            else:
+                try:
+                    summary.write(summarypath)
+                    self._summarymetrics["summarybuilds"] += 1
+                except (IOError, OSError):
+                    pass
+        self._summaries[path] = summary
+        return summary
+
+    def mightcontain(self, pack, node):
+        """Returns False if the pack summary shows node is not in pack."""
+        summary = self.getsummary(pack)
+        if summary is not None and node not in summary:
+            self._summarymetrics["summaryskips"] += 1
+            return False
+        self._summarymetrics["packprobes"] += 1
+        return True
+
     def getmissing(self, keys):
         missing = keys
 
         def func(pack):
-            return pack.getmissing(missing)
+            summary = self.getsummary(pack)
+            if summary is None:
+                self._summarymetrics["packprobes"] += 1
+                return pack.getmissing(missing)
+
+            # only ask the pack about keys its summary cannot rule out
+            candidates = []
+            notinpack = []
+            for key in missing:
+                if key[1] in summary:
+                    candidates.append(key)
+                else:
+                    notinpack.append(key)
+            if not candidates:
+                self._summarymetrics["summaryskips"] += 1
+                return missing
+            self._summarymetrics["packprobes"] += 1
+            stillmissing = pack.getmissing(candidates)
+            self._summarymetrics["summaryfalsepositives"] += len(stillmissing)
+            return notinpack + list(stillmissing)
 
         for newmissing in self.runonpacks(func):
             missing = newmissing
@@ -226,6 +394,7 @@ class basepackstore(object):
         if len(self.packs) == self.DEFAULTCACHESIZE:
             self.packs.clear()
             self.packspath.clear()
+            self._summaries.clear()
             try:
                 self.repackstore()
             except Exception:
@@ -273,10 +442,17 @@ class basepackstore(object):
 
         return newpacks
 
-    def runonpacks(self, func):
+    def runonpacks(self, func, node=None):
+        """Yields func(pack) for the packs in this store, skipping packs
+        that fail with a KeyError.
+
+        If node is given, packs whose summary rules out node are skipped.
+        """
         badpacks = []
 
         for pack in self.packs:
+            if node is not None and not self.mightcontain(pack, node):
+                continue
             try:
                 yield func(pack)
             except KeyError:
@@ -291,6 +467,8 @@ class basepackstore(object):
             newpacks = set(newpacks)
             for pack in self.packs:
                 if pack in newpacks:
+                    if node is not None and not self.mightcontain(pack, node):
+                        continue
                     try:
                         yield func(pack)
                     except KeyError:
@@ -305,11 +483,13 @@ class basepackstore(object):
                 for pack, err in badpacks:
                     self.packs.remove(pack)
                     self.packspath.remove(pack.path())
+                    self._summaries.pop(pack.path(), None)
 
                     if err != errno.ENOENT:
                         self.ui.warn(_("deleting corrupt pack '%s'\n") % pack.path())
                         util.tryunlink(pack.packpath())
                         util.tryunlink(pack.indexpath())
+                        util.tryunlink(self._summarypath(pack))
             else:
                 for pack, err in badpacks:
                     if err != errno.ENOENT:
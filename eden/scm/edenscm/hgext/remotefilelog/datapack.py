@@ -24,11 +24,21 @@ NOBASEINDEXMARK = -2
 
 INDEXSUFFIX = ".dataidx"
 PACKSUFFIX = ".datapack"
+SUMMARYSUFFIX = ".datasummary"
+
+# Index layout: (version, config) header, fanout table, entry count (version
+# 1 only), then sorted entries of (node, deltabase index, offset, size).
+INDEXHEADERLENGTH = 2
+INDEXCONFIGLARGEFANOUT = 0b10000000
+SMALLFANOUTSIZE = 1024
+LARGEFANOUTSIZE = 262144
+INDEXENTRYLENGTH = 40
 
 
 class datapackstore(basepack.basepackstore):
     INDEXSUFFIX = INDEXSUFFIX
     PACKSUFFIX = PACKSUFFIX
+    SUMMARYSUFFIX = SUMMARYSUFFIX
 
     def __init__(self, ui, path, shared, deletecorruptpacks=False):
         super(datapackstore, self).__init__(
@@ -38,6 +48,25 @@ class datapackstore(basepack.basepackstore):
     def getpack(self, path):
         return revisionstore.datapack(path)
 
+    def getpacknodes(self, pack):
+        # Read the nodes straight from the index. iterentries() would read
+        # every delta in the pack.
+        with open(pack.indexpath(), basepack.PACKOPENMODE) as fp:
+            index = fp.read()
+        version, config = struct.unpack("!BB", index[:INDEXHEADERLENGTH])
+        if version > 1:
+            raise ValueError(_("unsupported datapack index version %d") % version)
+        start = INDEXHEADERLENGTH
+        if config & INDEXCONFIGLARGEFANOUT:
+            start += LARGEFANOUTSIZE
+        else:
+            start += SMALLFANOUTSIZE
+        if version == 1:
+            # entry count
+            start += 8
+        for offset in range(start, len(index), INDEXENTRYLENGTH):
+            yield index[offset : offset + NODELENGTH]
+
     def get(self, name, node):
         raise RuntimeError("must use getdeltachain with datapackstore")
 
@@ -45,7 +74,7 @@ class datapackstore(basepack.basepackstore):
         def func(pack):
             return pack.getmeta(name, node)
 
-        for meta in self.runonpacks(func):
+        for meta in self.runonpacks(func, node=node):
             return meta
 
         raise KeyError((name, hex(node)))
@@ -54,7 +83,7 @@ class datapackstore(basepack.basepackstore):
         def func(pack):
             return pack.getdelta(name, node)
 
-        for delta in self.runonpacks(func):
+        for delta in self.runonpacks(func, node=node):
             return delta
 
         raise KeyError((name, hex(node)))
@@ -63,7 +92,7 @@ class datapackstore(basepack.basepackstore):
         def func(pack):
             return pack.getdeltachain(name, node)
 
-        for deltachain in self.runonpacks(func):
+        for deltachain in self.runonpacks(func, node=node):
             return deltachain
 
         raise KeyError((name, hex(node)))
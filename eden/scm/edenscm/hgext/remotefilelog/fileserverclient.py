@@ -147,8 +147,44 @@ class getpackclient(object):
             self.repo.fallbackpath, reason="prefetchpacks"
         )
 
+    def _fetchbatch(self, remote, ids, datastore, historystore, prog=None):
+        """Requests ids over one connection and receives the pack, returning
+        the number of data entries received."""
+        getpackversion = self.ui.configint("remotefilelog", "getpackversion")
+
+        remote._callstream("getpackv%d" % getpackversion)
+
+        self._sendpackrequest(remote, ids)
+
+        pipei = shallowutil.trygetattr(remote, ("_pipei", "pipei"))
+
+        receiveddata, _receivedhistory = wirepack.receivepack(
+            self.repo.ui,
+            pipei,
+            datastore,
+            historystore,
+            version=getpackversion,
+            prog=prog,
+        )
+        return len(receiveddata)
+
     def getpack(self, datastore, historystore, fileids):
         chunksize = self.ui.configint("remotefilelog", "prefetchchunksize", 200000)
+        numconnections = self.ui.configint("remotefilelog", "prefetchconnections")
+
+        if numconnections > 1 and len(fileids) > 1:
+            # Use a few batches per connection, so connections that are
+            # faster than the others pick up more of the work.
+            batchsize = -(-len(fileids) // (numconnections * _BATCHESPERCONNECTION))
+            batchsize = max(1, min(chunksize, batchsize))
+            batches = [
+                fileids[start_id : start_id + batchsize]
+                for start_id in range(0, len(fileids), batchsize)
+            ]
+            if len(batches) > 1:
+                return self._getpackconcurrently(
+                    datastore, historystore, batches, numconnections
+                )
 
         receiveddatalen = 0
         for start_id in range(0, len(fileids), chunksize):
@@ -158,21 +194,96 @@ class getpackclient(object):
                 self.ui.metrics.gauge("ssh_getpack_revs", len(ids))
                 self.ui.metrics.gauge("ssh_getpack_calls", 1)
 
-                getpackversion = self.ui.configint("remotefilelog", "getpackversion")
+                receiveddatalen += self._fetchbatch(
+                    conn.peer, ids, datastore, historystore
+                )
 
-                remote = conn.peer
-                remote._callstream("getpackv%d" % getpackversion)
+        return receiveddatalen
 
-                self._sendpackrequest(remote, ids)
+    def _getpackconcurrently(self, datastore, historystore, batches, numconnections):
+        """Fetches batches of fileids over several pooled connections.
 
-                pipei = shallowutil.trygetattr(remote, ("_pipei", "pipei"))
+        Each connection has at most one request in flight. Received entries
+        are queued to a single writer thread, so the mutable stores are only
+        written from one thread and disk writes overlap with the network.
+        """
+        writer = _packwriter(self.ui.configint("remotefilelog", "prefetchwritequeue"))
+        queueddatastore = _queuedstore(writer, datastore)
+        queuedhistorystore = _queuedstore(writer, historystore)
+
+        pending = util.queue()
+        for ids in batches:
+            pending.put(ids)
+            self.ui.metrics.gauge("ssh_getpack_revs", len(ids))
+            self.ui.metrics.gauge("ssh_getpack_calls", 1)
+
+        received = []
+        errors = []
+        counter = _progresscounter()
+        stopping = threading.Event()
+
+        def fetch(conn):
+            try:
+                with conn:
+                    while not stopping.is_set():
+                        try:
+                            ids = pending.get_nowait()
+                        except util.empty:
+                            return
+                        received.append(
+                            self._fetchbatch(
+                                conn.peer,
+                                ids,
+                                queueddatastore,
+                                queuedhistorystore,
+                                prog=counter,
+                            )
+                        )
+            except Exception as ex:
+                errors.append(ex)
+
+        # Connections are taken from the pool on this thread, since the pool
+        # is not thread-safe. All of them are opened before any thread starts,
+        # so a failure to connect leaves nothing running. They go back to the
+        # pool when their thread is done, or are closed if it failed.
+        conns = []
+        try:
+            for _i in range(min(numconnections, len(batches))):
+                conns.append(self._connect())
+        except Exception:
+            for conn in conns:
+                conn.close()
+            raise
 
-                receiveddata, _receivedhistory = wirepack.receivepack(
-                    self.repo.ui, pipei, datastore, historystore, version=getpackversion
-                )
-                receiveddatalen += len(receiveddata)
+        threads = []
+        for conn in conns:
+            t = threading.Thread(target=fetch, args=(conn,))
+            t.daemon = True
+            threads.append(t)
 
-        return receiveddatalen
+        writer.start()
+        try:
+            for t in threads:
+                t.start()
+            with progress.bar(self.ui, _("receiving packs")) as prog:
+                for t in threads:
+                    while t.is_alive():
+                        t.join(0.1)
+                        prog.value = counter.value
+        finally:
+            # On failure, let the threads finish their current batch and stop
+            # before the writer does, so none is left blocked on its queue.
+            # Queued entries are written even then, so callers see everything
+            # that was received.
+            stopping.set()
+            for t in threads:
+                if t.is_alive():
+                    t.join()
+            writer.finish()
+
+        if errors:
+            raise errors[0]
+        return sum(received)
 
     @perftrace.tracefunc("Fetch Pack")
     def prefetch(self, datastore, historystore, fileids):
@@ -225,6 +336,67 @@ class getpackclient(object):
             raise
 
 
+# Number of batches a large prefetch is split into per connection
+_BATCHESPERCONNECTION = 4
+
+
+class _progresscounter(object):
+    """progress shared by threads, rendered by the main thread"""
+
+    def __init__(self):
+        self.value = 0
+
+
+class _packwriter(threading.Thread):
+    """Applies store writes queued by the receiving threads, in order.
+
+    The queue is bounded, so receiving threads block instead of buffering
+    without limit when the disk is slower than the network.
+    """
+
+    def __init__(self, maxqueued):
+        super(_packwriter, self).__init__(name="packwriter")
+        self.daemon = True
+        self._queue = util.queue(maxqueued)
+        self._exception = None
+
+    def put(self, func, args, kwargs):
+        if self._exception is not None:
+            raise self._exception
+        self._queue.put((func, args, kwargs))
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._exception is not None:
+                # drain the queue so senders don't block
+                continue
+            func, args, kwargs = item
+            try:
+                func(*args, **kwargs)
+            except Exception as ex:
+                self._exception = ex
+
+    def finish(self):
+        self._queue.put(None)
+        self.join()
+        if self._exception is not None:
+            raise self._exception
+
+
+class _queuedstore(object):
+    """A mutable store whose add() is applied by a _packwriter."""
+
+    def __init__(self, writer, store):
+        self._writer = writer
+        self._store = store
+
+    def add(self, *args, **kwargs):
+        self._writer.put(self._store.add, args, kwargs)
+
+
 class fileserverclient(object):
     """A client for requesting files from the remote file server."""
 
@@ -32,6 +32,7 @@ ENTRYCOUNTSIZE = 4
 
 INDEXSUFFIX = ".histidx"
 PACKSUFFIX = ".histpack"
+SUMMARYSUFFIX = ".histsummary"
 
 ANC_NODE = 0
 ANC_P1NODE = 1
@@ -43,6 +44,7 @@ ANC_COPYFROM = 4
 class historypackstore(basepack.basepackstore):
     INDEXSUFFIX = INDEXSUFFIX
     PACKSUFFIX = PACKSUFFIX
+    SUMMARYSUFFIX = SUMMARYSUFFIX
 
     def __init__(self, ui, path, shared, deletecorruptpacks=False):
         super(historypackstore, self).__init__(
@@ -56,7 +58,7 @@ class historypackstore(basepack.basepackstore):
         def func(pack):
             return pack.getnodeinfo(name, node)
 
-        for nodeinfo in self.runonpacks(func):
+        for nodeinfo in self.runonpacks(func, node=node):
             return nodeinfo
 
         raise KeyError((name, hex(node)))
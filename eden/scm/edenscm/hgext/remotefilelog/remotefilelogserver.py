@@ -117,9 +117,16 @@ def onetimesetup(ui):
             for x in orig(repo):
                 yield x
 
+    # the files streamed also depend on what the client asked for
+    def _streamsnapshotkey(orig, repo):
+        shallowtrees = repo.ui.configbool("remotefilelog", "shallowtrees", False)
+        return (orig(repo), state.shallowremote, state.noflatmf, shallowtrees)
+
     # This function moved in Mercurial 3.5 and 3.6
     if hasstreamclone:
         wrapfunction(streamclone, "_walkstreamfiles", _walkstreamfiles)
+        if util.safehasattr(streamclone, "_streamsnapshotkey"):
+            wrapfunction(streamclone, "_streamsnapshotkey", _streamsnapshotkey)
     elif util.safehasattr(wireproto, "_walkstreamfiles"):
         wrapfunction(wireproto, "_walkstreamfiles", _walkstreamfiles)
     else:
@@ -9,7 +9,18 @@ from __future__ import absolute_import
 import struct
 import time
 from collections import defaultdict
-from typing import IO, Dict, Generator, Iterable, List, Optional, Sequence, Tuple, cast
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
 
 from edenscm.mercurial import perftrace, progress, pycompat
 from edenscm.mercurial.i18n import _
@@ -87,35 +98,23 @@ def closepart():
     return b"\0" * 10
 
 
-def receivepack(ui, fh, dpack, hpack, version=1):
-    # type: (UI, IO[bytes], mutabledatastore, mutablehistorystore, int) -> Tuple[List[Tuple[bytes, bytes]], List[Tuple[bytes, bytes]]]
-    receiveddata = []
-    receivedhistory = []
+def receivepack(ui, fh, dpack, hpack, version=1, prog=None):
+    # type: (UI, IO[bytes], mutabledatastore, mutablehistorystore, int, Optional[Any]) -> Tuple[List[Tuple[bytes, bytes]], List[Tuple[bytes, bytes]]]
+    """Reads a wirepack from fh and adds its entries to dpack and hpack.
 
-    size = 0
+    prog is an object whose ``value`` is incremented for every file
+    received. If it is None, a "receiving pack" progress bar is shown.
+    """
     start = time.time()
-    with progress.bar(ui, _("receiving pack")) as prog:
-        while True:
-            filename = readpath(fh)
-            count = 0
-
-            # Store the history for later sorting
-            for value in readhistory(fh):
-                node, p1, p2, linknode, copyfrom = value
-                hpack.add(filename, node, p1, p2, linknode, copyfrom)
-                receivedhistory.append((filename, node))
-                count += 1
-                size += len(filename) + len(node) + sum(len(x or "") for x in value)
-
-            for node, deltabase, delta, metadata in readdeltas(fh, version=version):
-                dpack.add(filename, node, deltabase, delta, metadata=metadata)
-                receiveddata.append((filename, node))
-                count += 1
-                size += len(filename) + len(node) + len(deltabase) + len(delta)
-
-            if count == 0 and filename == "":
-                break
-            prog.value += 1
+    if prog is None:
+        with progress.bar(ui, _("receiving pack")) as prog:
+            receiveddata, receivedhistory, size = _receiveparts(
+                fh, dpack, hpack, version, prog
+            )
+    else:
+        receiveddata, receivedhistory, size = _receiveparts(
+            fh, dpack, hpack, version, prog
+        )
     perftrace.tracebytes("Received Pack Size", size)
     duration = time.time() - start
     megabytes = float(size) / 1024 / 1024
@@ -130,6 +129,37 @@ def receivepack(ui, fh, dpack, hpack, version=1):
     return receiveddata, receivedhistory
 
 
+def _receiveparts(fh, dpack, hpack, version, prog):
+    # type: (IO[bytes], mutabledatastore, mutablehistorystore, int, Any) -> Tuple[List[Tuple[bytes, bytes]], List[Tuple[bytes, bytes]], int]
+    receiveddata = []
+    receivedhistory = []
+
+    size = 0
+    while True:
+        filename = readpath(fh)
+        count = 0
+
+        # Store the history for later sorting
+        for value in readhistory(fh):
+            node, p1, p2, linknode, copyfrom = value
+            hpack.add(filename, node, p1, p2, linknode, copyfrom)
+            receivedhistory.append((filename, node))
+            count += 1
+            size += len(filename) + len(node) + sum(len(x or "") for x in value)
+
+        for node, deltabase, delta, metadata in readdeltas(fh, version=version):
+            dpack.add(filename, node, deltabase, delta, metadata=metadata)
+            receiveddata.append((filename, node))
+            count += 1
+            size += len(filename) + len(node) + len(deltabase) + len(delta)
+
+        if count == 0 and filename == "":
+            break
+        prog.value += 1
+
+    return receiveddata, receivedhistory, size
+
+
 def readhistory(fh):
     # type: (IO[bytes]) -> Generator[Tuple[bytes, bytes, bytes, bytes, bytes], None, None]
     count = readunpack(fh, "!I")[0]
@@ -20,12 +20,20 @@ Config::
   # enable debug statements (defaults to 'on' except during tests)
   showdebug = False
 
-  # list of caches to enable ('local' or 'memcache')
+  # list of caches to enable ('local', 'localstore' or 'memcache')
   caches = local
 
   # path for local cache files
   cachedir = ~/.hgsimplecache
 
+  # path for the 'localstore' cache, which keeps all values in a few shard
+  # files and evicts the least recently used ones once it grows beyond
+  # storemaxsize (defaults to the cachedir path with a '.store' suffix)
+  storedir = ~/.hgsimplecache.store
+
+  # maximum total size of the 'localstore' cache
+  storemaxsize = 1GB
+
   # memcache host
   host = localhost
 
@@ -38,6 +46,7 @@ import hashlib
 import os
 import random
 import socket
+import struct
 import tempfile
 
 from edenscm.mercurial import (
@@ -174,25 +183,60 @@ class jsonserializer(object):
         return json.loads(pycompat.decodeutf8(string))
 
 
+# Values written by the binary serializers start with a NUL byte, which JSON
+# never does, so values cached by older versions can still be read. Older
+# versions can't read them, so they are stored under a new key version.
+_BINARYMAGIC = b"\0"
+_STATUSTYPE = b"S"
+_COPIESTYPE = b"C"
+_statuscounts = struct.Struct(">7I")
+_copiescount = struct.Struct(">I")
+
+
+def _joinpaths(paths):
+    return pycompat.encodeutf8("\0".join(paths))
+
+
+def _splitpaths(data):
+    if not data:
+        return []
+    return pycompat.decodeutf8(data).split("\0")
+
+
 class pathcopiesserializer(jsonserializer):
     """
     Serialize and deserialize the results of calls to copies.pathcopies.
-    Results are just dictionaries, so this just uses json.
+    Results are dictionaries, stored as their NUL separated keys and values.
     """
 
     @classmethod
     def serialize(cls, copydict):
-        encoded = dict(
-            (
-                pycompat.decodeutf8(base64.b64encode(pycompat.encodeutf8(k))),
-                pycompat.decodeutf8(base64.b64encode(pycompat.encodeutf8(v))),
-            )
-            for (k, v) in pycompat.iteritems(copydict)
+        paths = []
+        for k, v in pycompat.iteritems(copydict):
+            paths.append(k)
+            paths.append(v)
+        return (
+            _BINARYMAGIC
+            + _COPIESTYPE
+            + _copiescount.pack(len(copydict))
+            + _joinpaths(paths)
         )
-        return super(pathcopiesserializer, cls).serialize(encoded)
 
     @classmethod
     def deserialize(cls, string):
+        if not string.startswith(_BINARYMAGIC):
+            return cls._deserializejson(string)
+        if string[1:2] != _COPIESTYPE:
+            raise ValueError("simplecache value is not a copies dict")
+        offset = 2 + _copiescount.size
+        (count,) = _copiescount.unpack(string[2:offset])
+        paths = _splitpaths(string[offset:])
+        if len(paths) != count * 2:
+            raise ValueError("simplecache copies value is truncated")
+        return dict(zip(paths[::2], paths[1::2]))
+
+    @classmethod
+    def _deserializejson(cls, string):
         encoded = super(pathcopiesserializer, cls).deserialize(string)
         return dict(
             (
@@ -223,24 +267,40 @@ class buildstatusserializer(jsonserializer):
     Serialize and deserialize the results of calls to buildstatus.
     Results are status objects, which extend tuple. Each status object
     has seven lists within it, each containing strings of filenames in
-    each type of status.
+    each type of status. They are stored as the length of each list followed
+    by all filenames, NUL separated.
     """
 
     @classmethod
     def serialize(cls, status):
-        ls = [list(status[i]) for i in range(7)]
-        ll = []
-        for s in ls:
-            ll.append(
-                [
-                    pycompat.decodeutf8(base64.b64encode(pycompat.encodeutf8(f)))
-                    for f in s
-                ]
-            )
-        return super(buildstatusserializer, cls).serialize(ll)
+        lists = [status[i] for i in range(7)]
+        return (
+            _BINARYMAGIC
+            + _STATUSTYPE
+            + _statuscounts.pack(*[len(l) for l in lists])
+            + _joinpaths([f for l in lists for f in l])
+        )
 
     @classmethod
     def deserialize(cls, string):
+        if not string.startswith(_BINARYMAGIC):
+            return cls._deserializejson(string)
+        if string[1:2] != _STATUSTYPE:
+            raise ValueError("simplecache value is not a status")
+        offset = 2 + _statuscounts.size
+        counts = _statuscounts.unpack(string[2:offset])
+        paths = _splitpaths(string[offset:])
+        if len(paths) != sum(counts):
+            raise ValueError("simplecache status value is truncated")
+        ls = []
+        start = 0
+        for count in counts:
+            ls.append(paths[start : start + count])
+            start += count
+        return status(*ls)
+
+    @classmethod
+    def _deserializejson(cls, string):
         ll = super(buildstatusserializer, cls).deserialize(string)
         ls = []
         for l in ll:
@@ -333,11 +393,160 @@ def localset(key, value, ui):
         return
 
 
-cachefuncs = {"local": (localget, localset), "memcache": (mcget, mcset)}
+class localstore(object):
+    """A size-bounded key-value store kept in a few shard files.
+
+    Each shard is a log of records appended to a single file. A process reads
+    a shard's record headers once to index it, and afterwards only reads
+    records appended since. Reading a record from the older half of its shard
+    appends it again, so the order of records in a shard approximates recency
+    of use. Once a shard grows beyond its share of maxsize, it is rewritten
+    with only the most recently appended records, which evicts the least
+    recently used values.
+
+    Concurrent writers may lose each other's values while a shard is being
+    rewritten. That is fine for a cache; callers still verify each value's
+    checksum.
+    """
+
+    numshards = 16
+    _recordheader = struct.Struct(">II")
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.shardsize = max(maxsize // self.numshards, 1)
+        # {shardpath: (ino, indexedsize, {key: (offset, length)})}
+        self._indexes = {}
+
+    def _shardpath(self, key):
+        shard = bytearray(hashlib.sha1(key).digest())[0] % self.numshards
+        return os.path.join(self.path, "%02d.data" % shard)
+
+    def _index(self, path):
+        """Returns the index of a shard, and its size"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._indexes.pop(path, None)
+            return {}, 0
+        ino, offset, index = self._indexes.get(path, (None, 0, None))
+        if ino != st.st_ino or offset > st.st_size:
+            # The shard was rewritten since it was indexed
+            offset, index = 0, {}
+        if offset < st.st_size:
+            header = self._recordheader
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while offset + header.size <= st.st_size:
+                    keylen, valuelen = header.unpack(f.read(header.size))
+                    end = offset + header.size + keylen + valuelen
+                    if end > st.st_size:
+                        # a partially written record
+                        break
+                    key = f.read(keylen)
+                    index[key] = (offset + header.size + keylen, valuelen)
+                    f.seek(valuelen, os.SEEK_CUR)
+                    offset = end
+        self._indexes[path] = (st.st_ino, offset, index)
+        return index, st.st_size
+
+    def get(self, key):
+        path = self._shardpath(key)
+        index, size = self._index(path)
+        location = index.get(key)
+        if location is None:
+            return None
+        offset, length = location
+        with open(path, "rb") as f:
+            f.seek(offset)
+            value = f.read(length)
+        if len(value) != length:
+            return None
+        if offset < size // 2:
+            # Move values that are used again towards the end of the log, so
+            # they survive the next compaction.
+            self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        path = self._shardpath(key)
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        record = self._recordheader.pack(len(key), len(value)) + key + value
+        with open(path, "ab") as f:
+            f.write(record)
+            size = f.tell()
+        if size > self.shardsize:
+            self._compact(path)
+
+    def _compact(self, path):
+        """Rewrite a shard keeping the newest records that fit in half of
+        its maximum size."""
+        index, size = self._index(path)
+        header = self._recordheader
+        budget = self.shardsize // 2
+        kept = []
+        for key, (offset, length) in sorted(
+            pycompat.iteritems(index), key=lambda item: item[1][0], reverse=True
+        ):
+            recordsize = header.size + len(key) + length
+            if recordsize > budget:
+                break
+            budget -= recordsize
+            kept.append((offset, key, length))
+
+        fd, temppath = tempfile.mkstemp(prefix="compact-", dir=self.path)
+        try:
+            with open(path, "rb") as src, util.fdopen(fd, "wb") as dst:
+                for offset, key, length in reversed(kept):
+                    src.seek(offset)
+                    dst.write(header.pack(len(key), length) + key + src.read(length))
+            util.rename(temppath, path)
+        except Exception:
+            util.tryunlink(temppath)
+            raise
+        self._indexes.pop(path, None)
+
+
+_localstores = {}
+
+
+def _getlocalstore(ui):
+    path = ui.config("simplecache", "storedir")
+    if not path:
+        path = os.path.normpath(localpath("", ui)) + ".store"
+    path = util.expandpath(path)
+    maxsize = ui.configbytes("simplecache", "storemaxsize", "1GB")
+    store = _localstores.get(path)
+    if store is None or store.shardsize != max(maxsize // store.numshards, 1):
+        store = _localstores[path] = localstore(path, maxsize)
+    return store
+
+
+def localstoreget(key, ui):
+    if type(key) != str:
+        raise ValueError("Key must be a string")
+    return _getlocalstore(ui).get(pycompat.encodeutf8(key))
+
+
+def localstoreset(key, value, ui):
+    if type(key) != str:
+        raise ValueError("Key must be a string")
+    if type(value) != bytes:
+        raise ValueError("Value must be bytes")
+    _getlocalstore(ui).set(pycompat.encodeutf8(key), value)
+
+
+cachefuncs = {
+    "local": (localget, localset),
+    "localstore": (localstoreget, localstoreset),
+    "memcache": (mcget, mcset),
+}
 
 
 def _adjust_key(key, ui):
-    version = ui.config("simplecache", "version", default="2")
+    # version 3 stores copies and statuses in the binary format
+    version = ui.config("simplecache", "version", default="3")
     key = "%s:v%s" % (key, version)
     if pycompat.iswindows:
         # : is prohibited in Windows filenames, while ! is allowed
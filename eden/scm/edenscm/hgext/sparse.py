@@ -137,6 +137,15 @@ The following options can be used to tune the behaviour of tree prefetching when
 
     [sparse]
     force_full_prefetch_on_sparse_profile_change = False
+
+The patterns of the active sparse profiles, flattened across `%include`
+directives, are cached in the `.hg/sparsematchcache` directory together with
+the file nodes of the profiles they were read from. Commits where these profiles are
+unchanged reuse them without reading the profiles again. The cache can be
+disabled with:
+
+    [sparse]
+    matchercache = False
 """
 
 from __future__ import division
@@ -144,6 +153,7 @@ from __future__ import division
 import collections
 import functools
 import hashlib
+import json
 import os
 import re
 from typing import Any, Callable, Optional
@@ -172,7 +182,7 @@ from edenscm.mercurial import (
     util,
 )
 from edenscm.mercurial.i18n import _
-from edenscm.mercurial.node import nullid, nullrev
+from edenscm.mercurial.node import hex, nullid, nullrev
 from edenscm.mercurial.thirdparty import attr
 
 
@@ -207,6 +217,7 @@ configitem(
 )
 configitem("sparse", "warnfullcheckout", default=None)
 configitem("sparse", "bypassfullcheckoutwarn", default=False)
+configitem("sparse", "matchercache", default=True)
 
 
 def uisetup(ui):
@@ -978,6 +989,34 @@ def _wraprepo(ui, repo):
                 "<aggregated from %s>".format(config.path), includes, excludes, profiles
             )
 
+        def _cachedsparsepatterns(self, rev, signature):
+            """Like getsparsepatterns() for the active sparse configuration,
+            reusing the patterns of an earlier revision where the profiles
+            had the same contents.
+
+            Returns the includes, the excludes and the cache entry of these
+            patterns, or None if the patterns cannot be cached.
+            """
+            cache = self._sparsematchcache
+            mf = self[rev].manifest()
+            entry = cache.lookup(signature, mf)
+            if entry is not None:
+                if not entry.includes and not entry.excludes and not entry.profiles:
+                    self._warnfullcheckout()
+                return entry.includes, entry.excludes, entry
+
+            includes, excludes, profiles = self.getsparsepatterns(rev)
+            filenodes = {}
+            for profile in profiles:
+                filenode = mf.get(profile)
+                if filenode is None:
+                    # Keep the warning about the missing profile
+                    return includes, excludes, None
+                filenodes[profile] = filenode
+            entry = cache.add(signature, filenodes, includes, excludes)
+            cache.saveatexit(self.ui)
+            return includes, excludes, entry
+
         def _warnfullcheckout(self):
             # Only warn once per command
             if self._warnedfullcheckout:
@@ -1126,11 +1165,25 @@ def _wraprepo(ui, repo):
             if result:
                 return result, key
 
+            # The flattened patterns of the active configuration are cached on
+            # disk, keyed by the contents of .hg/sparse.
+            usecache = config is None and self.ui.configbool("sparse", "matchercache")
+            if usecache:
+                cachesignature = self._sparsesignature(includetemp=False)
+
             matchers = []
             isalways = False
             for rev in revs:
                 try:
-                    includes, excludes, profiles = self.getsparsepatterns(rev, config)
+                    cacheentry = None
+                    if usecache:
+                        includes, excludes, cacheentry = self._cachedsparsepatterns(
+                            rev, cachesignature
+                        )
+                    else:
+                        includes, excludes, profiles = self.getsparsepatterns(
+                            rev, config
+                        )
 
                     if includes or excludes:
                         matcher = matchmod.match(
@@ -1141,6 +1194,10 @@ def _wraprepo(ui, repo):
                             exclude=excludes,
                             default="relpath",
                         )
+                        if cacheentry is not None:
+                            self._sparsematchcache.cachevisitdir(
+                                self.ui, matcher, cacheentry
+                            )
                         matchers.append(matcher)
                     else:
                         isalways = True
@@ -1243,6 +1300,7 @@ def _wraprepo(ui, repo):
         repo.dirstate.repo = repo
     repo.sparsecache = {}
     repo.signaturecache = {}
+    repo._sparsematchcache = sparsematchcache(repo.localvfs)
     repo._warnedfullcheckout = False
     repo.__class__ = SparseRepo
 
@@ -2806,6 +2864,200 @@ def _cwdlist(repo):
         ui.status("%s %s\n" % (marker, entry))
 
 
+class sparsematchcacheentry(object):
+    def __init__(
+        self, signature, filenodes, includes=None, excludes=None, visitdir=None
+    ):
+        self.signature = signature
+        # profile path to the hex file node it was read from
+        self.filenodes = filenodes
+        # the patterns and decisions below are None until read from the
+        # file of the entry
+        self.includes = includes
+        self.excludes = excludes
+        # directory to the visitdir() decision of the matcher of the patterns
+        self.visitdir = visitdir
+
+    @property
+    def profiles(self):
+        return set(self.filenodes)
+
+    @property
+    def key(self):
+        """name of the file of the entry"""
+        data = json.dumps([self.signature, sorted(self.filenodes.items())])
+        return hashlib.sha1(pycompat.encodeutf8(data)).hexdigest()
+
+    def matches(self, signature, mf):
+        if signature != self.signature:
+            return False
+        for profile, filenode in pycompat.iteritems(self.filenodes):
+            node = mf.get(profile)
+            if node is None or hex(node) != filenode:
+                return False
+        return True
+
+
+class sparsematchcache(object):
+    """On-disk cache of the flattened patterns of the active sparse profiles
+
+    Resolving the patterns for a commit means reading and parsing every
+    profile included, transitively, by .hg/sparse. An entry records the
+    resulting patterns, keyed by the signature of .hg/sparse and the file
+    nodes of the profiles. Commits where all these profiles have the same
+    file nodes reuse the entry. The visitdir() decisions of the matchers
+    built from an entry are recorded too, so walks skip matching directories
+    against the patterns.
+
+    The cache is a directory with a small index of the signatures and file
+    nodes of the entries, and one file per entry with its patterns and
+    decisions. Only the file of the entry in use is read, and only the files
+    of entries that changed are written back.
+    """
+
+    _dirname = "sparsematchcache"
+    _indexname = "index"
+    _version = 2
+    # number of entries kept, the most recently used first
+    _maxentries = 16
+    # number of visitdir() decisions recorded per entry
+    _maxdirs = 10000
+
+    def __init__(self, vfs):
+        self._vfs = vfs
+        self._entries = None
+        # keys of the entries whose file must be written, or removed
+        self._dirty = set()
+        self._removed = set()
+        self._saveregistered = False
+
+    def _path(self, name):
+        return os.path.join(self._dirname, name)
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        entries = []
+        try:
+            data = json.loads(
+                pycompat.decodeutf8(self._vfs.read(self._path(self._indexname)))
+            )
+            if data["version"] == self._version:
+                for item in data["entries"]:
+                    entries.append(
+                        sparsematchcacheentry(item["signature"], item["filenodes"])
+                    )
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            # missing or unreadable: start over
+            entries = []
+        self._entries = entries
+        return entries
+
+    def _read(self, entry):
+        """read the patterns and decisions of entry, return False if they
+        cannot be read"""
+        try:
+            data = json.loads(
+                pycompat.decodeutf8(self._vfs.read(self._path(entry.key)))
+            )
+            entry.includes = set(data["includes"])
+            entry.excludes = set(data["excludes"])
+            entry.visitdir = data["visitdir"]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return False
+        return True
+
+    def lookup(self, signature, mf):
+        """return the entry for the active config with signature at a
+        commit with manifest mf, or None"""
+        entries = self._load()
+        for i, entry in enumerate(entries):
+            if entry.matches(signature, mf):
+                if entry.visitdir is None and not self._read(entry):
+                    del entries[i]
+                    return None
+                if i:
+                    entries.insert(0, entries.pop(i))
+                return entry
+        return None
+
+    def add(self, signature, filenodes, includes, excludes):
+        entries = self._load()
+        entry = sparsematchcacheentry(
+            signature,
+            {profile: hex(node) for profile, node in filenodes.items()},
+            set(includes),
+            set(excludes),
+            {},
+        )
+        entries.insert(0, entry)
+        self._dirty.add(entry.key)
+        for evicted in entries[self._maxentries :]:
+            self._removed.add(evicted.key)
+        del entries[self._maxentries :]
+        return entry
+
+    def cachevisitdir(self, ui, matcher, entry):
+        """make matcher answer visitdir() from the decisions recorded in
+        entry, recording the new ones"""
+        origvisitdir = matcher.visitdir
+        decisions = entry.visitdir
+
+        def visitdir(dir):
+            decision = decisions.get(dir)
+            if decision is None:
+                decision = origvisitdir(dir)
+                if len(decisions) < self._maxdirs:
+                    decisions[dir] = decision
+                    self._dirty.add(entry.key)
+                    self.saveatexit(ui)
+            return decision
+
+        matcher.visitdir = visitdir
+
+    def saveatexit(self, ui):
+        if not self._saveregistered:
+            self._saveregistered = True
+            ui.atexit(self.save)
+
+    def save(self):
+        self._saveregistered = False
+        if self._entries is None:
+            return
+        vfs = self._vfs
+        try:
+            if not vfs.isdir(self._dirname):
+                # an older cache was a single file
+                vfs.tryunlink(self._dirname)
+                vfs.makedirs(self._dirname)
+            for entry in self._entries:
+                if entry.key not in self._dirty:
+                    continue
+                data = {
+                    "includes": sorted(entry.includes),
+                    "excludes": sorted(entry.excludes),
+                    "visitdir": entry.visitdir,
+                }
+                with vfs(self._path(entry.key), "w", atomictemp=True) as f:
+                    f.write(pycompat.encodeutf8(json.dumps(data)))
+            data = {
+                "version": self._version,
+                "entries": [
+                    {"signature": entry.signature, "filenodes": entry.filenodes}
+                    for entry in self._entries
+                ],
+            }
+            with vfs(self._path(self._indexname), "w", atomictemp=True) as f:
+                f.write(pycompat.encodeutf8(json.dumps(data)))
+            for key in self._removed - set(entry.key for entry in self._entries):
+                vfs.tryunlink(self._path(key))
+        except (IOError, OSError):
+            # the cache is best effort, for example in read-only repos
+            pass
+        self._dirty.clear()
+        self._removed.clear()
+
+
 class forceincludematcher(matchmod.basematcher):
     """A matcher that returns true for any of the forced includes before testing
     against the actual matcher."""
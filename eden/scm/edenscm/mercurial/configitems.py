@@ -148,6 +148,7 @@ coreconfigitem("bundle", "reorder", default="auto")
 coreconfigitem("censor", "policy", default="abort")
 coreconfigitem("chgserver", "idletimeout", default=3600)
 coreconfigitem("chgserver", "skiphash", default=False)
+coreconfigitem("clone", "streamwritethreads", default=4)
 coreconfigitem("cmdserver", "log", default=None)
 coreconfigitem("color", ".*", default=None, generic=True)
 coreconfigitem("commands", "show.aliasprefix", default=list)
@@ -167,6 +168,7 @@ coreconfigitem("commit", "description-size-limit", default=None)
 coreconfigitem("commit", "extras-size-limit", default=None)
 coreconfigitem("committemplate", ".*", default=None, generic=True)
 coreconfigitem("connectionpool", "lifetime", default=None)
+coreconfigitem("connectionpool", "prewarm", default=0)
 coreconfigitem("configs", "generationtime", default=-1)
 coreconfigitem("configs", "mismatchsampling", default=10000)
 coreconfigitem("configs", "mismatchwarn", default=False)
@@ -253,6 +255,7 @@ coreconfigitem("experimental", "changegroup3", default=False)
 coreconfigitem("experimental", "changelog2-revset", default=True)
 coreconfigitem("experimental", "clientcompressionengines", default=list)
 coreconfigitem("experimental", "copytrace", default="on")
+coreconfigitem("experimental", "copytrace.cachesize", default=0)
 coreconfigitem("experimental", "copytrace.movecandidateslimit", default=100)
 coreconfigitem("experimental", "copytrace.sourcecommitlimit", default=100)
 coreconfigitem("experimental", "crecordtest", default=None)
@@ -305,6 +308,7 @@ coreconfigitem("experimental", "revf64compat", default=True)
 # load Rust-based HgCommits on changelog.
 coreconfigitem("experimental", "rust-commits", default=True)
 
+coreconfigitem("experimental", "similarity.prefilter", default=True)
 coreconfigitem("experimental", "single-head-per-branch", default=False)
 coreconfigitem("experimental", "spacemovesdown", default=False)
 coreconfigitem("experimental", "sparse-read", default=False)
@@ -452,6 +456,8 @@ coreconfigitem("server", "compressionengines", default=list)
 coreconfigitem("server", "disablefullbundle", default=False)
 coreconfigitem("server", "maxhttpheaderlen", default=1024)
 coreconfigitem("server", "preferuncompressed", default=False)
+coreconfigitem("server", "streamreadthreads", default=4)
+coreconfigitem("server", "streamsnapshotcache", default=True)
 coreconfigitem("server", "uncompressed", default=True)
 coreconfigitem("server", "uncompressedallowsecret", default=False)
 coreconfigitem("server", "validate", default=False)
@@ -592,6 +598,7 @@ coreconfigitem("web", "style", default="paper")
 coreconfigitem("web", "templates", default=None)
 coreconfigitem("web", "view", default="served")
 coreconfigitem("wireproto", "logrequests", default=list)
+coreconfigitem("worker", "backend", default="threads")
 coreconfigitem("worker", "backgroundclose", default=dynamicdefault)
 # Windows defaults to a limit of 512 open files. A buffer of 128
 # should give us enough headway.
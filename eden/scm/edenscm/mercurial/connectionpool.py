@@ -8,17 +8,128 @@
 from __future__ import absolute_import
 
 import os
+import threading
 import time
 
 from . import extensions, json, pycompat, sshpeer, util
 
 
 class connectionpool(object):
+    # file in .hg recording, for each command, the paths connected to by the
+    # last run of the command
+    _historyfile = "connectionpool"
+
     def __init__(self, repo):
         self._repo = repo
         self._poolpid = os.getpid()
         self._pool = dict()
         self._reasons = dict()
+        # {path: number of different connections handed out by get()}
+        self._used = dict()
+        # {path: number of connections being opened in the background}
+        self._pending = dict()
+        # protects the above, and is notified when a background connection is
+        # opened
+        self._cond = threading.Condition()
+        # incremented by close(), to discard the connections opened in the
+        # background before
+        self._generation = 0
+
+    def _openconnection(self, path, pathpool, ui=None):
+        # Prevent circular dependency
+        from . import hg
+
+        if ui is None:
+            ui = self._repo.ui
+        start = util.timer()
+        peer = hg.peer(ui, {}, path)
+        opentime = util.timer() - start
+        return connection(ui, pathpool, peer, path, opentime)
+
+    def prewarm(self, path, count):
+        """Open count connections to path concurrently in the background
+
+        get() hands them out once they are ready, waiting for them rather
+        than opening another connection if none is ready yet.
+        """
+        with self._cond:
+            pathpool = self._pool.setdefault(path, [])
+            self._pending[path] = self._pending.get(path, 0) + count
+            generation = self._generation
+
+        def run(ui):
+            conn = None
+            try:
+                conn = self._openconnection(path, pathpool, ui)
+            except Exception as ex:
+                ui.debug(
+                    "failed to prewarm connection to %s: %s\n"
+                    % (util.hidepassword(path), ex)
+                )
+            with self._cond:
+                self._pending[path] -= 1
+                if conn is not None:
+                    if generation == self._generation:
+                        pathpool.append(conn)
+                    else:
+                        conn.close()
+                self._cond.notify_all()
+
+        for _i in range(count):
+            # ui objects are not thread-safe, so each thread gets its own copy
+            t = threading.Thread(
+                target=run, args=(self._repo.ui.copy(),), name="connectionpoolprewarm"
+            )
+            t.daemon = True
+            t.start()
+
+    def prewarmforcommand(self, command):
+        """Prewarm connections to the paths used by the last run of command
+
+        Each path gets as many connections as the command used last time, up
+        to connectionpool.prewarm.
+        """
+        limit = self._repo.ui.configint("connectionpool", "prewarm")
+        if not limit or not command:
+            return
+        history = self._readhistory().get(command, {})
+        for path, entry in sorted(history.items()):
+            count = min(limit, entry.get("connections", 0))
+            if count > 0:
+                self._repo.ui.debug(
+                    "prewarming %d connections to %s for %s\n"
+                    % (count, util.hidepassword(path), ", ".join(entry["reasons"]))
+                )
+                self.prewarm(path, count)
+
+    def _readhistory(self):
+        try:
+            data = self._repo.localvfs.tryread(self._historyfile)
+            return json.loads(pycompat.decodeutf8(data)) if data else {}
+        except ValueError:
+            return {}
+
+    def _savehistory(self):
+        command = self._repo.ui.cmdname
+        if not self._repo.ui.configint("connectionpool", "prewarm") or not command:
+            return
+        history = self._readhistory()
+        if not self._used and command not in history:
+            return
+        paths = {}
+        for reason, peersforreason in self._reasons.items():
+            for path, _peername in peersforreason:
+                if path in self._used:
+                    paths.setdefault(path, set()).add(reason)
+        history[command] = dict(
+            (path, {"connections": self._used[path], "reasons": sorted(reasons)})
+            for path, reasons in paths.items()
+        )
+        try:
+            with self._repo.localvfs(self._historyfile, "w", atomictemp=True) as f:
+                f.write(pycompat.encodeutf8(json.dumps(history)))
+        except (IOError, OSError):
+            pass
 
     def get(self, path, opts=None, reason="default"):
         # Prevent circular dependency
@@ -42,42 +153,50 @@ class connectionpool(object):
             self.recordreason(reason, path, peer)
             return standaloneconnection(peer)
 
-        pathpool = self._pool.get(path)
-        if pathpool is None:
-            pathpool = list()
-            self._pool[path] = pathpool
-
-        conn = None
-        if len(pathpool) > 0:
-            try:
-                conn = pathpool.pop()
-                peer = conn.peer
-                # If the connection has died, drop it
-                if isinstance(peer, sshpeer.sshpeer) and util.safehasattr(
-                    peer, "_subprocess"
-                ):
-                    proc = peer._subprocess
-                    if proc.poll() is not None:
-                        conn = None
-                # If the connection has expired, close it
-                if conn is not None and conn.expired():
-                    self._repo.ui.debug(
-                        "not reusing expired connection to %s\n" % conn.path
-                    )
-                    conn.close()
-                    conn = None
-            except IndexError:
-                pass
+        with self._cond:
+            pathpool = self._pool.setdefault(path, [])
+            conn = self._takeconnection(pathpool)
+            # Wait for the connections being opened in the background rather
+            # than opening another one.
+            while conn is None and self._pending.get(path, 0) > 0:
+                self._cond.wait(0.1)
+                conn = self._takeconnection(pathpool)
 
         if conn is None:
-            peer = hg.peer(self._repo.ui, {}, path)
-            conn = connection(self._repo.ui, pathpool, peer, path)
+            conn = self._openconnection(path, pathpool)
         else:
             self._repo.ui.debug("reusing connection from pool\n")
+        if not conn.used:
+            conn.used = True
+            self._used[path] = self._used.get(path, 0) + 1
 
         self.recordreason(reason, path, conn.peer)
         return conn
 
+    def _takeconnection(self, pathpool):
+        """Remove and return the best healthy connection of pathpool
+
+        Unhealthy connections are dropped. The best connection is the one
+        that was the fastest to open, as the server behind it is likely the
+        least loaded, then the most recently used.
+        """
+        healthy = []
+        for conn in pathpool:
+            if conn.expired():
+                self._repo.ui.debug(
+                    "not reusing expired connection to %s\n" % conn.path
+                )
+                conn.close()
+            elif conn.alive():
+                healthy.append(conn)
+        if not healthy:
+            del pathpool[:]
+            return None
+        best = min(healthy, key=lambda conn: (conn.opentime, -conn.lastused))
+        healthy.remove(best)
+        pathpool[:] = healthy
+        return best
+
     def recordreason(self, reason, path, peer):
         peersforreason = self._reasons.setdefault(reason, [])
 
@@ -117,10 +236,14 @@ class connectionpool(object):
 
     def close(self):
         self.reportreasons()
-        for pathpool in pycompat.itervalues(self._pool):
-            for conn in pathpool:
-                conn.close()
-            del pathpool[:]
+        self._savehistory()
+        with self._cond:
+            self._generation += 1
+            self._pending.clear()
+            for pathpool in pycompat.itervalues(self._pool):
+                for conn in pathpool:
+                    conn.close()
+                del pathpool[:]
 
 
 class standaloneconnection(object):
@@ -139,11 +262,17 @@ class standaloneconnection(object):
 
 
 class connection(object):
-    def __init__(self, ui, pool, peer, path):
+    def __init__(self, ui, pool, peer, path, opentime=0.0):
         self._ui = ui
         self._pool = pool
         self.peer = peer
         self.path = path
+        # seconds it took to open the connection
+        self.opentime = opentime
+        # when the connection was last given back to the pool
+        self.lastused = time.time()
+        # whether the connection was handed out by the pool
+        self.used = False
         self.expiry = None
         lifetime = ui.configint("connectionpool", "lifetime")
         if lifetime is not None:
@@ -162,11 +291,20 @@ class connection(object):
             self._ui.debug("closing expired connection to %s\n" % self.path)
             self.close()
         else:
+            self.lastused = time.time()
             self._pool.append(self)
 
     def expired(self):
         return self.expiry is not None and time.time() > self.expiry
 
+    def alive(self):
+        """Whether the connection is still usable"""
+        peer = self.peer
+        # If the connection has died, drop it
+        if isinstance(peer, sshpeer.sshpeer) and util.safehasattr(peer, "_subprocess"):
+            return peer._subprocess.poll() is None
+        return True
+
     def close(self):
         if util.safehasattr(self.peer, "_cleanup"):
             self.peer._cleanup()
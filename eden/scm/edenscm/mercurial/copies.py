@@ -13,8 +13,10 @@
 from __future__ import absolute_import
 
 import collections
+import hashlib
 import heapq
 import os
+import sys
 
 from . import match as matchmod, node, pathutil, pycompat, scmutil, util
 from .i18n import _
@@ -393,10 +395,141 @@ def mergecopies(repo, c1, c2, base):
         # that will be fast enough and will also cover the copies which could
         # be missed by heuristics
         if _isfullcopytraceable(repo, c1, base):
-            return _fullcopytracing(repo, c1, c2, base)
-        return _heuristicscopytracing(repo, c1, c2, base)
+            return cachedmergecopies(repo, c1, c2, base, "full", _fullcopytracing)
+        return cachedmergecopies(
+            repo,
+            c1,
+            c2,
+            base,
+            "heuristics",
+            _heuristicscopytracing,
+            extrakey=(repo.ui.config("experimental", "copytrace.movecandidateslimit"),),
+        )
     else:
-        return _fullcopytracing(repo, c1, c2, base)
+        return cachedmergecopies(repo, c1, c2, base, "full", _fullcopytracing)
+
+
+class mergecopiescache(object):
+    """repo-local cache of mergecopies() results
+
+    Entries are keyed by the nodes of c1, c2 and base and the name of the
+    copytracing algorithm.  Commit hashes cover their whole ancestry, so an
+    entry stays valid for as long as the algorithm's other inputs do not
+    change.  Those inputs (config, side data) must be passed as the extra key.
+
+    Each entry is a file in .hg/cache/mergecopies.  Once the entries take more
+    than maxsize bytes, the least recently used ones are removed.
+    """
+
+    # Bump this when the format of the entries or the results change
+    version = 1
+    dirname = "mergecopies"
+
+    def __init__(self, repo, maxsize):
+        self.ui = repo.ui
+        self.vfs = repo.cachevfs
+        self.maxsize = maxsize
+
+    def key(self, algorithm, c1, c2, base, extrakey=()):
+        """Returns the key for the given contexts, or None if they cannot be
+        cached.
+
+        A working copy context can only be cached if it has no changes, in
+        which case its key is derived from its parent.
+        """
+        if c2.node() is None or base.node() is None:
+            return None
+        if c1.node() is None:
+            if len(c1.parents()) != 1 or c1.files():
+                return None
+            c1hex = c1.p1().hex() + "+"
+        else:
+            c1hex = c1.hex()
+        parts = [
+            str(self.version),
+            str(sys.version_info[0]),
+            algorithm,
+            c1hex,
+            c2.hex(),
+            base.hex(),
+        ] + [str(x) for x in extrakey]
+        return hashlib.sha1(pycompat.encodeutf8("\0".join(parts))).hexdigest()
+
+    def _path(self, key):
+        return "%s/%s" % (self.dirname, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            data = self.vfs.read(path)
+            result = util.pickle.loads(data)
+        except Exception:
+            return None
+        try:
+            # Record the access for LRU eviction
+            os.utime(self.vfs.join(path), None)
+        except OSError:
+            pass
+        return result
+
+    def set(self, key, result):
+        try:
+            data = util.pickle.dumps(result, util.pickle.HIGHEST_PROTOCOL)
+            self.vfs.makedirs(self.dirname)
+            with self.vfs(self._path(key), "wb", atomictemp=True) as fp:
+                fp.write(data)
+            self._evict()
+        except (IOError, OSError) as ex:
+            self.ui.debug("cannot write mergecopies cache: %s\n" % ex)
+
+    def _evict(self):
+        entries = []
+        totalsize = 0
+        for name in self.vfs.listdir(self.dirname):
+            try:
+                st = self.vfs.lstat(self._path(name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+            totalsize += st.st_size
+        if totalsize <= self.maxsize:
+            return
+        entries.sort()
+        for _mtime, size, name in entries:
+            self.vfs.tryunlink(self._path(name))
+            totalsize -= size
+            if totalsize <= self.maxsize:
+                break
+
+
+def cachedmergecopies(repo, c1, c2, base, algorithm, func, extrakey=()):
+    """Return func(repo, c1, c2, base), using the mergecopies cache if enabled
+
+    algorithm names func in the cache key, and extrakey holds any inputs of
+    func other than the contexts, such as config values.
+
+    The cache is enabled by setting ``experimental.copytrace.cachesize`` to
+    its maximum size, for example ``64MB``.  It avoids tracing the same copies
+    again when, for example, each commit of a stack is rebased across the
+    same renames.
+    """
+    maxsize = repo.ui.configbytes("experimental", "copytrace.cachesize")
+    if maxsize <= 0:
+        return func(repo, c1, c2, base)
+
+    cache = mergecopiescache(repo, maxsize)
+    key = cache.key(algorithm, c1, c2, base, extrakey)
+    if key is None:
+        return func(repo, c1, c2, base)
+
+    result = cache.get(key)
+    if result is not None:
+        repo.ui.debug("using cached copies for %s\n" % algorithm)
+        return result
+
+    result = func(repo, c1, c2, base)
+    cache.set(key, result)
+    return result
 
 
 def _isfullcopytraceable(repo, c1, base):
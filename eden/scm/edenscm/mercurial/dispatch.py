@@ -1253,6 +1253,8 @@ def _dispatch(req):
                         repo.ui.setconfig("visibility", "all-heads", "true", "--hidden")
                     if repo != req.repo:
                         ui.atexit(repo.close)
+                    if util.safehasattr(repo, "connectionpool"):
+                        repo.connectionpool.prewarmforcommand(cmd)
                 args.insert(0, repo)
             elif rpath:
                 ui.warn(_("warning: --repository ignored\n"))
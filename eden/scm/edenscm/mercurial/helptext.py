@@ -848,6 +848,12 @@ below can be referred as ``{listupfiles}``::
     Number of seconds for which connections in the connection pool can be kept
     and reused.  Connections that are older than this won't be reused.
 
+``prewarm``
+    Maximum number of connections opened in the background to each server
+    when a command starts, before they are needed. Each command reopens the
+    connections it used the last time it ran, as recorded in
+    ``.hg/connectionpool``. Set to 0 to disable. (default: 0)
+
 ``decode/encode``
 -----------------
 
@@ -2990,6 +2996,15 @@ helps performance.
     negative value is treated as ``use the default``.
     (default: 4 or the number of CPUs on the system, whichever is larger)
 
+``backend``
+    How to run parallel work. ``threads`` runs workers as threads of the
+    current process, which only helps with I/O-bound work. ``processes``
+    forks long-lived worker processes that are reused for the rest of the
+    command, so CPU-bound work such as working directory updates and
+    similarity scoring can use several cores. ``processes`` falls back to
+    ``threads`` on platforms without ``fork``.
+    (default: threads)
+
 ``backgroundclose``
     Whether to enable closing file handles on background threads during certain
     operations. Some platforms aren't very efficient at closing file
@@ -350,14 +350,31 @@ class _tree(dict):
         # Glob patterns used to match parent directories of another glob
         # pattern.
         self._globdirpats = []
+        # If True, match the files directly in this directory (but not in
+        # subdirectories).
+        self.rootfiles = False
+        # If True, match the file at this path.
+        self.exactfile = False
         super(_tree, self).__init__(*args, **kwargs)
 
-    def insert(self, path, matchrecursive=True, globpats=None, repats=None):
+    def insert(
+        self,
+        path,
+        matchrecursive=True,
+        globpats=None,
+        repats=None,
+        rootfiles=False,
+        exactfile=False,
+    ):
         """Insert a directory path to this tree.
 
         If matchrecursive is True, mark the directory as unconditionally
         include files and subdirs recursively.
 
+        If rootfiles is True, mark the files directly in the directory as
+        included. If exactfile is True, mark the path itself as an included
+        file.
+
         If globpats or repats are specified, append them to the patterns being
         applied at this directory. The tricky part is those patterns can match
         "x/y/z" and visit("x"), visit("x/y") need to return True, while we
@@ -365,6 +382,8 @@ class _tree(dict):
         """
         if path == "":
             self.matchrecursive |= matchrecursive
+            self.rootfiles |= rootfiles
+            self.exactfile |= exactfile
             if globpats:
                 # Need to match parent directories too.
                 for pat in globpats:
@@ -390,7 +409,9 @@ class _tree(dict):
             return
 
         subdir, rest = self._split(path)
-        self.setdefault(subdir, _tree()).insert(rest, matchrecursive, globpats, repats)
+        self.setdefault(subdir, _tree()).insert(
+            rest, matchrecursive, globpats, repats, rootfiles, exactfile
+        )
 
     def visitdir(self, path):
         """Similar to matcher.visitdir"""
@@ -585,6 +606,142 @@ def _buildvisitdir(kindpats):
     return tree.visitdir
 
 
+def _buildtreematch(kindpats, globsuffix):
+    """Try to build a match function walking a tree of the literal
+    directory prefixes of the patterns
+
+    Each glob pattern is only compiled with the other patterns sharing its
+    prefix, and only tested against paths under that prefix. This scales to
+    many more patterns than a single regular expression.
+
+    Return None if there are unsupported patterns.
+
+    >>> _buildtreematch([('re', 'a.*', '')], '$')
+    >>> m = _buildtreematch([
+    ...     ('path', 'a/b', ''),
+    ...     ('glob', 'c/*.d', ''),
+    ...     ('glob', 'e/**/*.c', ''),
+    ...     ('glob', 'f/g', ''),
+    ...     ('rootfilesin', 'h', ''),
+    ...     ('glob', '*.i', ''),
+    ... ], '$')
+    >>> [f for f in ['a/b', 'a/b/c', 'a/bc', 'a'] if m(f)]
+    ['a/b', 'a/b/c']
+    >>> [f for f in ['c/x.d', 'c/x.d/y', 'c/y/x.d', 'c'] if m(f)]
+    ['c/x.d']
+    >>> [f for f in ['e/x.c', 'e/y/z/x.c', 'e/x.d', 'e'] if m(f)]
+    ['e/x.c', 'e/y/z/x.c']
+    >>> [f for f in ['f/g', 'f/g/h', 'f'] if m(f)]
+    ['f/g']
+    >>> [f for f in ['h/x', 'h/x/y', 'h'] if m(f)]
+    ['h/x']
+    >>> [f for f in ['x.i', 'a/x.i', 'c/x.i'] if m(f)]
+    ['x.i']
+    >>> m = _buildtreematch([('glob', 'f/g', ''), ('glob', 'j/*', '')], '(?:/|$)')
+    >>> [f for f in ['f/g', 'f/g/h', 'j/x', 'j/x/y', 'j'] if m(f)]
+    ['f/g', 'f/g/h', 'j/x', 'j/x/y']
+    >>> m = _buildtreematch([('rootfilesin', '.', ''), ('path', 'k', '')], '$')
+    >>> [f for f in ['x', 'x/y', 'k/x/y'] if m(f)]
+    ['x', 'k/x/y']
+    """
+    tree = _tree()
+    for kind, pat, _source in kindpats:
+        if kind in ("path", "relpath"):
+            tree.insert("" if pat == "." else pat)
+        elif kind == "rootfilesin":
+            tree.insert("" if pat == "." else pat, matchrecursive=False, rootfiles=True)
+        elif kind == "glob":
+            components = []
+            for p in pat.split("/"):
+                if "[" in p or "{" in p or "*" in p or "?" in p or "\\" in p:
+                    break
+                components.append(p)
+            prefix = "/".join(components)
+            if prefix != pat:
+                tree.insert(
+                    prefix,
+                    matchrecursive=False,
+                    globpats=_remainingpats(pat, prefix),
+                )
+            elif not pat or globsuffix != "$":
+                tree.insert(prefix)
+            else:
+                tree.insert(prefix, matchrecursive=False, exactfile=True)
+        else:
+            # Unsupported kind
+            return None
+    return _treematchfn(tree, globsuffix)
+
+
+class _treematchfn(object):
+    """Match function walking a _tree built by _buildtreematch
+
+    The walk down to the directory of a path is done once per directory.
+    """
+
+    def __init__(self, tree, globsuffix):
+        self._tree = tree
+        self._globsuffix = globsuffix
+        # directory to True if everything in it matches, or to a tuple of
+        # the tree node of the directory (None if there is none) and the
+        # (match function, relative directory) of the glob patterns of the
+        # directory and its parents
+        self._dirs = {}
+        # id of a tree node to the match function of its glob patterns
+        self._globs = {}
+
+    def _globmatch(self, node):
+        matchfn = self._globs.get(id(node))
+        if matchfn is None:
+            matchfn = _buildregexmatch(node._kindpats, self._globsuffix)[1]
+            self._globs[id(node)] = matchfn
+        return matchfn
+
+    def _walk(self, dir):
+        result = self._dirs.get(dir)
+        if result is not None:
+            return result
+        node = self._tree
+        globs = []
+        rest = dir
+        while True:
+            if node.matchrecursive:
+                result = True
+                break
+            if node._kindpats:
+                globs.append((self._globmatch(node), rest + "/" if rest else ""))
+            if not rest:
+                result = (node, globs)
+                break
+            subdir, rest = node._split(rest)
+            node = node.get(subdir)
+            if node is None:
+                result = (None, globs)
+                break
+        self._dirs[dir] = result
+        return result
+
+    def __call__(self, f):
+        if "/" in f:
+            dir, name = f.rsplit("/", 1)
+        else:
+            dir, name = "", f
+        result = self._walk(dir)
+        if result is True:
+            return True
+        node, globs = result
+        if node is not None:
+            if node.rootfiles:
+                return True
+            child = node.get(name)
+            if child is not None and (child.matchrecursive or child.exactfile):
+                return True
+        for matchfn, reldir in globs:
+            if matchfn(reldir + name):
+                return True
+        return False
+
+
 class basematcher(object):
     def __init__(self, root, cwd, badfn=None, relativeuipath=True):
         self._root = root
@@ -964,9 +1121,9 @@ class includematcher(basematcher):
             # subdirectories.
             self._dirs = set(dirs)
             # Try to use a more efficient visitdir implementation
-            visitdir = _buildvisitdir(kindpats)
-            if visitdir:
-                self.visitdir = visitdir
+            visitdir = _buildvisitdir(kindpats) or self.visitdir
+            # Walks ask about every directory, often more than once
+            self.visitdir = util.cachefunc(visitdir)
 
     def visitdir(self, dir):
         dir = normalizerootdir(dir, "visitdir")
@@ -1462,7 +1619,14 @@ def _buildmatch(ctx, kindpats, globsuffix, root):
 
     regex = ""
     if kindpats:
-        regex, mf = _buildregexmatch(kindpats, globsuffix)
+        mf = _buildtreematch(kindpats, globsuffix)
+        if mf is not None:
+            # The regular expression is only used to describe the matcher
+            regex = "(?:%s)" % "|".join(
+                [_regex(k, p, globsuffix) for (k, p, s) in kindpats]
+            )
+        else:
+            regex, mf = _buildregexmatch(kindpats, globsuffix)
         matchfuncs.append(mf)
 
     if len(matchfuncs) == 1:
@@ -1727,7 +1727,16 @@ def applyupdates(repo, actions, wctx, mctx, overwrite, labels=None, ancestors=No
                 repo.ui.debug("retrying %s\n" % f)
                 removeone(repo, wctx, f)
         else:
-            for i, size, item in batchremove(repo, wctx, actions["r"] + actions["rg"]):
+            removes = worker.worker(
+                repo.ui,
+                cost,
+                batchremove,
+                (repo, wctx),
+                actions["r"] + actions["rg"],
+                callsite="batchremove",
+                threadsafe=False,
+            )
+            for i, size, item in removes:
                 z += i
                 prog.value = (z, item)
         # "rg" actions are counted in updated below
@@ -1768,9 +1777,16 @@ def applyupdates(repo, actions, wctx, mctx, overwrite, labels=None, ancestors=No
                 repo.ui.debug("retrying %s\n" % f)
                 writesize += updateone(repo, fctx, wctx, f, flag)
         else:
-            for i, size, item in batchget(
-                repo, mctx, wctx, actions["g"] + actions["rg"]
-            ):
+            gets = worker.worker(
+                repo.ui,
+                cost,
+                batchget,
+                (repo, mctx, wctx),
+                actions["g"] + actions["rg"],
+                callsite="batchget",
+                threadsafe=False,
+            )
+            for i, size, item in gets:
                 z += i
                 writesize += size
                 prog.value = (z, item)
@@ -12,10 +12,22 @@
 
 from __future__ import absolute_import
 
-from . import mdiff, progress, pycompat
+import hashlib
+import zlib
+
+from . import mdiff, progress, pycompat, worker
 from .i18n import _
 
 
+def _knownsha256(repo, fctx):
+    """return the sha256 digest of the content of fctx if it is known
+    without reading the content, or None
+
+    Extensions with content metadata (e.g. remotefilelog) wrap this.
+    """
+    return None
+
+
 def _findexactmatches(repo, added, removed):
     """find renamed files that have no changes
 
@@ -27,25 +39,42 @@ def _findexactmatches(repo, added, removed):
     with progress.bar(
         repo.ui, _("searching for exact renames"), _("files"), numfiles
     ) as prog:
-        # Build table of removed files: {hash(fctx.data()): [fctx, ...]}.
-        # We use hash() to discard fctx.data() from memory.
-        hashes = {}
+        # Group removed files by size. Sizes come from the filelog or the
+        # store metadata, so no content is read unless an added file has the
+        # same size. filelog.size() is off by 4 for content starting with
+        # "\1\n", so removed files are also grouped under that size minus 4;
+        # the content digests weed out the extra candidates.
+        bysize = {}
         for fctx in removed:
             prog.value += 1
-            h = hash(fctx.data())
-            if h not in hashes:
-                hashes[h] = [fctx]
-            else:
-                hashes[h].append(fctx)
+            size = fctx.size()
+            bysize.setdefault(size, []).append(fctx)
+            if size >= 4:
+                bysize.setdefault(size - 4, []).append(fctx)
+
+        # Content digests of removed files, computed when first needed and
+        # shared by all removed files with the same filenode.
+        digests = {}
+
+        def removeddigest(fctx):
+            key = fctx.filenode() or id(fctx)
+            digest = digests.get(key)
+            if digest is None:
+                digest = _knownsha256(repo, fctx)
+                if digest is None:
+                    digest = hashlib.sha256(fctx.data()).digest()
+                digests[key] = digest
+            return digest
 
         # For each added file, see if it corresponds to a removed file.
         for fctx in added:
             prog.value += 1
-            adata = fctx.data()
-            h = hash(adata)
-            for rfctx in hashes.get(h, []):
-                # compare between actual file contents for exact identity
-                if adata == rfctx.data():
+            candidates = bysize.get(fctx.size())
+            if not candidates:
+                continue
+            adigest = hashlib.sha256(fctx.data()).digest()
+            for rfctx in candidates:
+                if removeddigest(rfctx) == adigest:
                     yield (rfctx, fctx)
                     break
 
@@ -75,31 +104,144 @@ def score(fctx1, fctx2):
     return _score(fctx1, _ctxdata(fctx2))
 
 
+def _lineelements(data):
+    """return the lines of data as (hash, length, occurrence) elements
+
+    A line that appears n times in data gives n elements, with occurrences 0
+    to n - 1, so two files share exactly one element per line they have in
+    common, repeated lines included. The length of the line is the weight of
+    the element.
+    """
+    counts = {}
+    elements = []
+    for line in mdiff.splitnewlines(data):
+        key = (zlib.crc32(line) & 0xFFFFFFFF, len(line))
+        occurrence = counts.get(key, 0)
+        counts[key] = occurrence + 1
+        elements.append(key + (occurrence,))
+    return elements
+
+
+def _prefix(elements, size, threshold, order):
+    """return the shortest prefix of elements, sorted by order, whose
+    remaining elements weigh less than the overlap a file of this size
+    needs to score above threshold with any other file
+    """
+    # _score counts the bytes of the lines matched between both files, so
+    # it is at most the weight of their shared elements, the overlap. A
+    # score above threshold needs 2 * overlap > threshold * (size + other
+    # size), and the other size is at least the overlap. The last factor
+    # guards against rounding.
+    minoverlap = threshold * size / (2.0 - threshold) * (1 - 1e-9)
+    remaining = size
+    prefix = []
+    for element in sorted(elements, key=order):
+        if remaining <= minoverlap:
+            break
+        prefix.append(element)
+        remaining -= element[1]
+    return prefix
+
+
+def _findcandidates(added, removed, threshold):
+    """find the (added, removed) pairs that may score above threshold
+
+    Returns a list of (removed index, [added index, ...]) tuples. This is a
+    prefix filter: the line elements of all files are sorted in the same
+    order, rarest first, and two files are only paired if the prefixes
+    returned by _prefix share an element. If a pair scores above threshold,
+    the first element of their overlap is in both prefixes, as otherwise
+    the whole overlap would be in what _prefix left out, so no such pair is
+    ever dropped. Pairs whose sizes alone rule out a score above threshold
+    are dropped as well.
+    """
+    aelements = [_lineelements(a.data()) for a in added]
+    relements = [_lineelements(r.data()) for r in removed]
+    asizes = [sum(element[1] for element in elements) for elements in aelements]
+    rsizes = [sum(element[1] for element in elements) for elements in relements]
+
+    frequencies = {}
+    for elements in aelements + relements:
+        for element in elements:
+            frequencies[element] = frequencies.get(element, 0) + 1
+
+    def order(element):
+        return (frequencies[element], element)
+
+    # index removed files by the elements of their prefixes
+    index = {}
+    for ri, elements in enumerate(relements):
+        for element in _prefix(elements, rsizes[ri], threshold, order):
+            index.setdefault(element, []).append(ri)
+
+    candidates = {}
+    for ai, elements in enumerate(aelements):
+        others = set()
+        for element in _prefix(elements, asizes[ai], threshold, order):
+            others.update(index.get(element, ()))
+        asize = asizes[ai]
+        for ri in others:
+            # the score is at most 2 * min(sizes) / (sum of sizes)
+            rsize = rsizes[ri]
+            if 2.0 * min(asize, rsize) / (asize + rsize) <= threshold:
+                continue
+            candidates.setdefault(ri, []).append(ai)
+    return sorted((ri, sorted(ais)) for ri, ais in pycompat.iteritems(candidates))
+
+
+def _scorecandidates(added, removed, threshold, items):
+    """score candidate pairs, as a worker function
+
+    Yields (removed index, added index, score) for pairs scoring above
+    threshold, and (removed index, None, None) when a removed file is done.
+    """
+    for ri, ais in items:
+        data = _ctxdata(removed[ri])
+        for ai in ais:
+            myscore = _score(added[ai], data)
+            if myscore > threshold:
+                yield ri, ai, myscore
+        yield ri, None, None
+
+
 def _findsimilarmatches(repo, added, removed, threshold):
     """find potentially renamed files based on similar file content
 
     Takes a list of new filectxs and a list of removed filectxs, and yields
     (before, after, score) tuples of partial matches.
     """
+    if repo.ui.configbool("experimental", "similarity.prefilter"):
+        candidates = _findcandidates(added, removed, threshold)
+    else:
+        allindexes = list(range(len(added)))
+        candidates = [(ri, allindexes) for ri in range(len(removed))]
+
+    # added index -> (removed index, score)
     copies = {}
     with progress.bar(
-        repo.ui, _("searching for similar files"), _("files"), len(removed)
+        repo.ui, _("searching for similar files"), _("files"), len(candidates)
     ) as prog:
-        for r in removed:
-            prog.value += 1
+        results = worker.worker(
+            repo.ui,
+            0.0001 * len(added),
+            _scorecandidates,
+            (added, removed, threshold),
+            candidates,
+            callsite="similar",
+            threadsafe=False,
+        )
+        for ri, ai, myscore in results:
+            if ai is None:
+                prog.value += 1
+                continue
+            # the earliest removed file wins ties, as if the removed files
+            # were scored one after another
+            best = copies.get(ai)
+            if best is None or (myscore, -ri) > (best[1], -best[0]):
+                copies[ai] = (ri, myscore)
 
-            data = None
-            for a in added:
-                bestscore = copies.get(a, (None, threshold))[1]
-                if data is None:
-                    data = _ctxdata(r)
-                myscore = _score(a, data)
-                if myscore > bestscore:
-                    copies[a] = (r, myscore)
-
-    for dest, v in pycompat.iteritems(copies):
-        source, bscore = v
-        yield source, dest, bscore
+    for ai, (ri, bscore) in pycompat.iteritems(copies):
+        yield removed[ri], added[ai], bscore
 
 
 def _dropempty(fctxs):
@@ -12,8 +12,11 @@
 
 from __future__ import absolute_import
 
+import collections
+import os
 import struct
-from typing import Any, Iterable, Optional, Set, Tuple
+import threading
+from typing import Any, Iterable, List, Optional, Set, Tuple
 
 from . import error, phases, progress, store, util
 from .i18n import _
@@ -201,38 +204,70 @@ def _walkstreamfiles(repo):
     return repo.store.walk()
 
 
-def generatev1(repo):
-    # type: Any -> Tuple[int, int, Iterable[bytes]]
-    """Emit content for version 1 of a streaming clone.
+# This is it's own function so extensions can override it.
+def _streamsnapshotkey(repo):
+    # type: Any -> Any
+    """Identify what _walkstreamfiles returns for repo, beside the content
+    of its store"""
+    return repo.svfs.base
 
-    This returns a 3-tuple of (file count, byte size, data iterator).
 
-    The data iterator consists of N entries for each file being transferred.
-    Each file entry starts as a line with the file name and integer size
-    delimited by a null byte.
+def _storestate(repo):
+    # type: Any -> Tuple[Tuple[str, int, float], ...]
+    """Cheap fingerprint of the store, changing whenever it is written to
 
-    The raw file data follows. Following the raw file data is the next file
-    entry, or EOF.
+    Every transaction writes the top-level revlogs, fncache and undo files,
+    so listing the top of the store is enough to notice it.
+    """
+    return tuple(
+        sorted(
+            (name, st.st_size, st.st_mtime)
+            for name, _kind, st in repo.svfs.readdir("", stat=True)
+        )
+    )
 
-    When used on the wire protocol, an additional line indicating protocol
-    success will be prepended to the stream. This function is not responsible
-    for adding it.
 
-    This function will obtain a repository lock to ensure a consistent view of
-    the store is captured. It therefore may raise LockError.
-    """
+class _streamsnapshot(object):
+    """The files to send for a stream clone, as of a given store state"""
+
+    def __init__(self, state, entries, totalbytes):
+        self.state = state
+        self.entries = entries
+        self.totalbytes = totalbytes
+
+
+# {_streamsnapshotkey(repo): _streamsnapshot}, shared by the stream_out
+# requests of long-lived servers.
+_snapshots = util.lrucachedict(16)
+# {_streamsnapshotkey(repo): lock}, each held while a snapshot of its store is
+# taken, so that concurrent requests for the same store wait for it instead of
+# scanning the store too. Requests for other stores don't wait.
+_snapshotlocks = {}
+# Guards _snapshots and _snapshotlocks
+_snapshotslock = threading.Lock()
+
+
+def _snapshotlock(key):
+    with _snapshotslock:
+        lock = _snapshotlocks.get(key)
+        if lock is None:
+            lock = _snapshotlocks[key] = threading.Lock()
+        return lock
+
+
+def _scanstreamfiles(repo):
+    # type: Any -> _streamsnapshot
     entries = []
     total_bytes = 0
     # Get consistent snapshot of repo, lock during scan.
     with repo.lock():
         repo.ui.debug("scanning\n")
+        state = _storestate(repo)
         for name, ename, size in _walkstreamfiles(repo):
             if size:
                 entries.append((name, size))
                 total_bytes += size
 
-    repo.ui.debug("%d files, %d bytes to transfer\n" % (len(entries), total_bytes))
-
     # Send entries that are closest to the revlog splitting size: they may be
     # modified from under us as send the otherwise (as they're expanded from a
     # .i to a .i and a .d), which would corrupt the clone. Sending them first
@@ -242,13 +277,153 @@ def generatev1(repo):
         return abs(131072 - size)
 
     entries.sort(key=priority)
+    return _streamsnapshot(state, entries, total_bytes)
+
+
+def _getstreamsnapshot(repo):
+    # type: Any -> _streamsnapshot
+    """Return the files to send, reusing the last scan of the store if it was
+    not written to since"""
+    if not repo.ui.configbool("server", "streamsnapshotcache"):
+        return _scanstreamfiles(repo)
+
+    key = _streamsnapshotkey(repo)
+    with _snapshotlock(key):
+        with _snapshotslock:
+            snapshot = _snapshots.get(key)
+        if snapshot is None or snapshot.state != _storestate(repo):
+            snapshot = _scanstreamfiles(repo)
+            with _snapshotslock:
+                _snapshots[key] = snapshot
+        else:
+            repo.ui.debug("reusing stream clone snapshot\n")
+    return snapshot
+
+
+# Files up to this size are read at once by the threads of _readstreamfiles.
+# Larger ones are streamed in chunks by the sender.
+_readaheadfilesize = 65536
+# Maximum number of bytes read ahead and not sent yet.
+_readaheadbytes = 16 << 20
+
+
+class _readtask(object):
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.data = None
+        self.error = None
+        self.done = threading.Event()
+
+
+def _readstreamfiles(svfs, entries, numthreads):
+    # type: (Any, List[Tuple[str, int]], int) -> Iterable[Tuple[str, int, Optional[bytes]]]
+    """Yield (name, size, data) for entries, in order
+
+    Small files are read by numthreads threads ahead of the consumer. data is
+    None for the other files, which the consumer should read itself.
+    """
+    if numthreads <= 0:
+        for name, size in entries:
+            yield name, size, None
+        return
+
+    tasks = util.queue()
+    stopped = []
+
+    def run():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            if not stopped:
+                try:
+                    # auditing at this stage is both pointless (paths are
+                    # already trusted by the local repo) and expensive
+                    with svfs(task.name, "rb", auditpath=False) as fp:
+                        task.data = fp.read(task.size)
+                except Exception as ex:
+                    task.error = ex
+            task.done.set()
+
+    threads = []
+    for _i in range(numthreads):
+        t = threading.Thread(target=run, name="streamclonereader")
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    try:
+        queued = collections.deque()
+        queuedbytes = 0
+        nextindex = 0
+        for name, size in entries:
+            while nextindex < len(entries):
+                qname, qsize = entries[nextindex]
+                if qsize > _readaheadfilesize:
+                    queued.append(None)
+                elif queued and queuedbytes + qsize > _readaheadbytes:
+                    break
+                else:
+                    task = _readtask(qname, qsize)
+                    tasks.put(task)
+                    queued.append(task)
+                    queuedbytes += qsize
+                nextindex += 1
+
+            task = queued.popleft()
+            if task is None:
+                yield name, size, None
+                continue
+            task.done.wait()
+            queuedbytes -= size
+            if task.error is not None:
+                raise task.error
+            data, task.data = task.data, None
+            yield name, size, data
+    finally:
+        stopped.append(True)
+        for t in threads:
+            tasks.put(None)
+
+
+def generatev1(repo):
+    # type: Any -> Tuple[int, int, Iterable[bytes]]
+    """Emit content for version 1 of a streaming clone.
+
+    This returns a 3-tuple of (file count, byte size, data iterator).
+
+    The data iterator consists of N entries for each file being transferred.
+    Each file entry starts as a line with the file name and integer size
+    delimited by a null byte.
+
+    The raw file data follows. Following the raw file data is the next file
+    entry, or EOF.
+
+    When used on the wire protocol, an additional line indicating protocol
+    success will be prepended to the stream. This function is not responsible
+    for adding it.
+
+    This function will obtain a repository lock to ensure a consistent view of
+    the store is captured. It therefore may raise LockError.
+
+    Long-lived servers reuse the list of files to send across requests until
+    the store is written to (see ``server.streamsnapshotcache``), and read
+    small files in ``server.streamreadthreads`` threads ahead of the sender.
+    """
+    snapshot = _getstreamsnapshot(repo)
+    entries = snapshot.entries
+    total_bytes = snapshot.totalbytes
+
+    repo.ui.debug("%d files, %d bytes to transfer\n" % (len(entries), total_bytes))
 
     svfs = repo.svfs
     debugflag = repo.ui.debugflag
+    numthreads = repo.ui.configint("server", "streamreadthreads")
 
     def emitrevlogdata():
         # type: -> Iterable[bytes]
-        for name, size in entries:
+        for name, size, data in _readstreamfiles(svfs, entries, numthreads):
             if debugflag:
                 repo.ui.debug("sending %s (%d bytes)\n" % (name, size))
             # partially encode name over the wire for backwards compat
@@ -256,14 +431,13 @@ def generatev1(repo):
 
             sentsize = 0
 
-            # auditing at this stage is both pointless (paths are already
-            # trusted by the local repo) and expensive
-            with svfs(name, "rb", auditpath=False) as fp:
-                if size <= 65536:
-                    chunk = fp.read(size)
-                    sentsize += len(chunk)
-                    yield chunk
-                else:
+            if data is not None:
+                sentsize += len(data)
+                yield data
+            else:
+                # auditing at this stage is both pointless (paths are already
+                # trusted by the local repo) and expensive
+                with svfs(name, "rb", auditpath=False) as fp:
                     for chunk in util.filechunkiter(fp, limit=size):
                         sentsize += len(chunk)
                         yield chunk
@@ -346,6 +520,157 @@ def generatebundlev1(repo, compression=b"UN"):
     return requirements, gen()
 
 
+def _readentryheader(fp):
+    # type: Any -> Tuple[bytes, int]
+    # XXX doesn't support '\n' or '\r' in filenames
+    l = fp.readline()
+    try:
+        name, size = l.split(b"\0", 1)
+        size = int(size)
+    except (ValueError, TypeError):
+        msg = _("unexpected response from remote server:")
+        raise error.ResponseError(msg, l)
+    return name, size
+
+
+# Size of the chunks handed over to the writer threads of _streamwriters
+_writechunksize = 131072
+# Number of chunks queued for each writer thread before the reader waits
+_writequeuesize = 64
+
+
+class _streamwriters(object):
+    """Threads writing the files received by a stream clone, while the main
+    thread keeps reading from the network
+
+    Each file is handed over as its (path, size) followed by its chunks, to
+    the writer with the shortest queue. Files are preallocated to their
+    advertised size when the platform supports it.
+    """
+
+    def __init__(self, svfs, numthreads):
+        self._svfs = svfs
+        self._queues = []
+        self._threads = []
+        # exceptions raised by the writers
+        self._errors = []
+        # time spent by each writer opening, writing and closing files
+        self._busy = [0.0] * numthreads
+        # vfs and fncache are not thread safe
+        self._openlock = threading.Lock()
+        for i in range(numthreads):
+            queue = util.queue(_writequeuesize)
+            t = threading.Thread(
+                target=self._run, args=(i, queue), name="streamclonewriter"
+            )
+            t.daemon = True
+            t.start()
+            self._queues.append(queue)
+            self._threads.append(t)
+        self._current = None
+
+    def _run(self, index, queue):
+        ofp = None
+        try:
+            while True:
+                item = queue.get()
+                start = util.timer()
+                if ofp is not None and (item is None or isinstance(item, tuple)):
+                    ofp.close()
+                    ofp = None
+                if item is None:
+                    return
+                if not self._errors:
+                    try:
+                        if isinstance(item, tuple):
+                            path, size = item
+                            with self._openlock:
+                                ofp = self._svfs(path, "w")
+                            _preallocate(ofp, size)
+                        else:
+                            ofp.write(item)
+                    except Exception as ex:
+                        self._errors.append(ex)
+                self._busy[index] += util.timer() - start
+        finally:
+            if ofp is not None:
+                ofp.close()
+
+    def checkerrors(self):
+        """Raise the first error of the writers"""
+        if self._errors:
+            raise self._errors[0]
+
+    def newfile(self, path, size):
+        self.checkerrors()
+        self._current = min(self._queues, key=lambda q: q.qsize())
+        self._current.put((path, size))
+
+    def write(self, chunk):
+        self._current.put(chunk)
+
+    def close(self):
+        """Wait for the queued files to be written"""
+        for queue in self._queues:
+            queue.put(None)
+        for t in self._threads:
+            t.join()
+
+    def busytime(self):
+        """Average time spent by the writers on the files"""
+        return sum(self._busy) / max(1, len(self._busy))
+
+
+class _streamwriter(object):
+    """Write the files received by a stream clone in the main thread, with
+    the same interface as _streamwriters"""
+
+    def __init__(self, svfs):
+        self._svfs = svfs
+        self._fp = None
+        self._busy = 0.0
+
+    def checkerrors(self):
+        pass
+
+    def newfile(self, path, size):
+        start = util.timer()
+        if self._fp is not None:
+            self._fp.close()
+        self._fp = self._svfs(path, "w", backgroundclose=True)
+        _preallocate(self._fp, size)
+        self._busy += util.timer() - start
+
+    def write(self, chunk):
+        start = util.timer()
+        self._fp.write(chunk)
+        self._busy += util.timer() - start
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def busytime(self):
+        return self._busy
+
+
+def _preallocate(fp, size):
+    if size and util.safehasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fp.fileno(), 0, size)
+        except (OSError, AttributeError, ValueError):
+            # not supported by the file system, or not a real file
+            pass
+
+
+def _throughput(bytecount, elapsed):
+    # type: (int, float) -> str
+    if elapsed <= 0:
+        elapsed = 0.001
+    return util.bytecount(bytecount / elapsed)
+
+
 def consumev1(repo, fp, filecount, bytecount):
     # type: (Any, Any, int, int) -> None
     """Apply the contents from version 1 of a streaming clone file handle.
@@ -355,6 +680,10 @@ def consumev1(repo, fp, filecount, bytecount):
 
     Like "stream_out," the status line added by the wire protocol is not
     handled by this function.
+
+    Files are written by ``clone.streamwritethreads`` threads while the
+    stream is read. With --verbose, the time spent reading the stream
+    (network) and writing files (disk) is reported as separate throughputs.
     """
     with repo.lock():
         repo.ui.status(
@@ -377,38 +706,52 @@ def consumev1(repo, fp, filecount, bytecount):
         # nesting occurs also in ordinary case (e.g. enabling
         # clonebundles).
 
+        numthreads = repo.ui.configint("clone", "streamwritethreads")
+        # time spent reading the stream
+        readtime = 0.0
+
         with progress.bar(
             repo.ui, _("clone"), _("bytes"), bytecount, formatfunc=util.bytecount
         ) as prog:
             with repo.transaction("clone"):
                 with repo.svfs.backgroundclosing(repo.ui, expectedcount=filecount):
-                    for i in range(filecount):
-                        # XXX doesn't support '\n' or '\r' in filenames
-                        l = fp.readline()
-                        try:
-                            name, size = l.split(b"\0", 1)
-                            size = int(size)
-                        except (ValueError, TypeError):
-                            msg = _("unexpected response from remote server:")
-                            raise error.ResponseError(msg, l)
-                        if repo.ui.debugflag:
-                            repo.ui.debug(
-                                "adding %s (%s)\n" % (name, util.bytecount(size))
-                            )
-                        # for backwards compat, name was partially encoded
-                        path = store.decodedir(decodeutf8(name))
-                        with repo.svfs(path, "w", backgroundclose=True) as ofp:
+                    if numthreads > 0:
+                        writer = _streamwriters(repo.svfs, numthreads)
+                    else:
+                        writer = _streamwriter(repo.svfs)
+                    try:
+                        for i in range(filecount):
+                            readstart = util.timer()
+                            name, size = _readentryheader(fp)
+                            readtime += util.timer() - readstart
+                            if repo.ui.debugflag:
+                                repo.ui.debug(
+                                    "adding %s (%s)\n" % (name, util.bytecount(size))
+                                )
+                            # for backwards compat, name was partially encoded
+                            path = store.decodedir(decodeutf8(name))
+                            writer.newfile(path, size)
                             fetchedsize = 0
-                            for chunk in util.filechunkiter(fp, limit=size):
-                                ofp.write(chunk)
+                            readstart = util.timer()
+                            for chunk in util.filechunkiter(
+                                fp, size=_writechunksize, limit=size
+                            ):
+                                readtime += util.timer() - readstart
+                                writer.write(chunk)
                                 chunksize = len(chunk)
                                 prog.value += chunksize
                                 fetchedsize += chunksize
+                                readstart = util.timer()
+                            readtime += util.timer() - readstart
                             if fetchedsize != size:
                                 msg = _(
                                     "failed to fully fetch %s: fetched:%s expected:%s"
                                 ) % (name, fetchedsize, size)
                                 raise error.Abort(msg)
+                    finally:
+                        writer.close()
+                    writer.checkerrors()
+                    writetime = writer.busytime()
 
                 # force @filecache properties to be reloaded from
                 # streamclone-ed file at next access
@@ -419,10 +762,29 @@ def consumev1(repo, fp, filecount, bytecount):
         elapsed = util.timer() - start
         if elapsed <= 0:
             elapsed = 0.001
-        repo.ui.status(
-            _("transferred %s in %.1f seconds (%s/sec)\n")
-            % (util.bytecount(bytecount), elapsed, util.bytecount(bytecount / elapsed))
-        )
+        if repo.ui.verbose:
+            repo.ui.status(
+                _(
+                    "transferred %s in %.1f seconds (%s/sec; network %s/sec, "
+                    "disk %s/sec)\n"
+                )
+                % (
+                    util.bytecount(bytecount),
+                    elapsed,
+                    util.bytecount(bytecount / elapsed),
+                    _throughput(bytecount, readtime),
+                    _throughput(bytecount, writetime),
+                )
+            )
+        else:
+            repo.ui.status(
+                _("transferred %s in %.1f seconds (%s/sec)\n")
+                % (
+                    util.bytecount(bytecount),
+                    elapsed,
+                    util.bytecount(bytecount / elapsed),
+                )
+            )
 
 
 def readbundle1header(fp):
@@ -12,7 +12,11 @@
 
 from __future__ import absolute_import
 
+import collections
 import os
+import select
+import signal
+import struct
 import threading
 import time
 
@@ -54,23 +58,73 @@ def _numworkers(ui):
     return min(max(countcpus(), 4), 32)
 
 
-if pycompat.isposix or pycompat.iswindows:
-    _startupcost = 0.01
-else:
-    _startupcost = 1e30
+_canfork = pycompat.isposix and util.safehasattr(os, "fork")
 
+# measured cost (in seconds) of starting a single worker, keyed by backend
+_startupcosts = {}
 
-def worthwhile(ui, costperop, nops):
+
+def _backend(ui, preferthreads=False):
+    """pick the worker backend to use: "threads" or "processes"
+
+    Processes are only used when configured, when the platform can fork and
+    when the caller has not asked for threads."""
+    backend = ui.config("worker", "backend")
+    if preferthreads or backend != "processes" or not _canfork:
+        return "threads"
+    return "processes"
+
+
+def _measurestartupcost(backend):
+    """time how long it takes to start and reap one trivial worker"""
+    start = util.timer()
+    if backend == "processes":
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0)
+        os.waitpid(pid, 0)
+    else:
+        t = threading.Thread(target=lambda: None)
+        t.start()
+        t.join()
+    return util.timer() - start
+
+
+def _startupcost(ui, backend):
+    if not (pycompat.isposix or pycompat.iswindows):
+        return 1e30
+    if backend == "processes" and _pool is not None:
+        if _pool.size == _numworkers(ui) and _pool.running():
+            # long-lived workers are already up: starting them is free
+            return 0.0
+    cost = _startupcosts.get(backend)
+    if cost is None:
+        cost = _startupcosts[backend] = _measurestartupcost(backend)
+    return cost
+
+
+def worthwhile(ui, costperop, nops, backend="threads"):
     """try to determine whether the benefit of multiple processes can
     outweigh the cost of starting them"""
     linear = costperop * nops
     workers = _numworkers(ui)
-    benefit = linear - (_startupcost * workers + linear / workers)
+    benefit = linear - (_startupcost(ui, backend) * workers + linear / workers)
     return benefit >= 0.15
 
 
-def worker(ui, costperarg, func, staticargs, args, preferthreads=False, callsite=None):
-    """run a function, possibly in parallel in multiple worker threads.
+def worker(
+    ui,
+    costperarg,
+    func,
+    staticargs,
+    args,
+    preferthreads=False,
+    callsite=None,
+    ordered=False,
+    threadsafe=True,
+):
+    """run a function, possibly in parallel in multiple worker threads or
+    processes.
 
     returns a progress iterator
 
@@ -86,16 +140,73 @@ def worker(ui, costperarg, func, staticargs, args, preferthreads=False, callsite
     preferthreads - use threads instead of processes
 
     callsite - where this worker function is being called
+
+    ordered - yield results in the order of args instead of the order in
+    which workers finish them
+
+    threadsafe - whether func may run in several threads at once. If not,
+    func only runs in parallel with the process backend.
     """
     workerenabled = ui.configbool("worker", "enabled")
     callsiteenabled = callsite in ui.configlist("worker", "_enabledcallsites")
     enabled = workerenabled or callsiteenabled
-    if enabled and worthwhile(ui, costperarg, len(args)):
-        return _threadedworker(ui, func, staticargs, args)
+    backend = _backend(ui, preferthreads)
+    if backend == "threads" and not threadsafe:
+        enabled = False
+    if enabled and worthwhile(ui, costperarg, len(args), backend):
+        if backend == "processes":
+            return _forkedworker(ui, func, staticargs, args, ordered)
+        return _threadedworker(ui, func, staticargs, args, ordered)
     return func(*staticargs + (args,))
 
 
-def _threadedworker(ui, func, staticargs, args):
+def _chunks(args, nworkers):
+    """split args into contiguous, numbered chunks for dynamic pickup
+
+    Chunks are small enough (about 20 per worker) that a worker which gets
+    a few expensive items does not hold up the others, while consecutive
+    items still go to the same worker to preserve locality.
+    """
+    size = max(1, -(-len(args) // (nworkers * 20)))
+    return [
+        (i, args[start : start + size])
+        for i, start in enumerate(range(0, len(args), size))
+    ]
+
+
+class _resultorder(object):
+    """track per-chunk results from workers and decide what can be yielded
+
+    When ordered, results are yielded in input order: results of the oldest
+    unfinished chunk stream straight through, later chunks are buffered until
+    every chunk before them has finished.
+    """
+
+    def __init__(self, ordered):
+        self._ordered = ordered
+        self._next = 0
+        self._pending = {}
+        self._finished = set()
+
+    def add(self, index, result):
+        if not self._ordered or index == self._next:
+            return [result]
+        self._pending.setdefault(index, []).append(result)
+        return []
+
+    def finish(self, index):
+        if not self._ordered:
+            return []
+        self._finished.add(index)
+        ready = []
+        while self._next in self._finished:
+            self._finished.discard(self._next)
+            self._next += 1
+            ready.extend(self._pending.pop(self._next, ()))
+        return ready
+
+
+def _threadedworker(ui, func, staticargs, args, ordered=False):
     class Worker(threading.Thread):
         def __init__(
             self,
@@ -124,14 +235,15 @@ def _threadedworker(ui, func, staticargs, args):
             try:
                 while not self._taskqueue.empty():
                     try:
-                        args = self._taskqueue.get_nowait()
+                        index, args = self._taskqueue.get_nowait()
                         for res in self._func(*self._staticargs + (args,)):
-                            self._resultqueue.put(res)
+                            self._resultqueue.put((index, True, res))
                             # threading doesn't provide a native way to
                             # interrupt execution. handle it manually at every
                             # iteration.
                             if self._interrupted:
                                 return
+                        self._resultqueue.put((index, False, None))
                     except util.empty:
                         break
             except Exception as e:
@@ -160,21 +272,33 @@ def _threadedworker(ui, func, staticargs, args):
                 )
                 return
 
+    def drain():
+        while not resultqueue.empty():
+            index, isresult, res = resultqueue.get()
+            if isresult:
+                ready = order.add(index, res)
+            else:
+                ready = order.finish(index)
+            for res in ready:
+                yield res
+
     workers = _numworkers(ui)
+    order = _resultorder(ordered)
     resultqueue = util.queue()
     taskqueue = util.queue()
-    # partition work to more pieces than workers to minimize the chance
-    # of uneven distribution of large tasks between the workers
-    for pargs in partition(args, workers * 20):
-        taskqueue.put(pargs)
+    # workers pick up small chunks from a shared queue as they become idle,
+    # so the load stays balanced even when some items are much more
+    # expensive than others
+    for chunk in _chunks(args, workers):
+        taskqueue.put(chunk)
     for _i in range(workers):
         t = Worker(taskqueue, resultqueue, func, staticargs)
         threads.append(t)
         t.start()
     try:
         while len(threads) > 0:
-            while not resultqueue.empty():
-                yield resultqueue.get()
+            for res in drain():
+                yield res
             threads[0].join(0.05)
             finishedthreads = [_t for _t in threads if not _t.is_alive()]
             for t in finishedthreads:
@@ -184,8 +308,246 @@ def _threadedworker(ui, func, staticargs, args):
     except (Exception, KeyboardInterrupt):  # re-raises
         trykillworkers()
         raise
-    while not resultqueue.empty():
-        yield resultqueue.get()
+    for res in drain():
+        yield res
+
+
+def _writemsg(fd, obj):
+    """send a length-prefixed pickled message over a pipe"""
+    data = util.pickle.dumps(obj, util.pickle.HIGHEST_PROTOCOL)
+    data = struct.pack(">I", len(data)) + data
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+def _readexactly(fd, size):
+    chunks = []
+    while size > 0:
+        chunk = os.read(fd, min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _readmsg(fd):
+    """read a message written by _writemsg, or None on EOF"""
+    header = _readexactly(fd, 4)
+    if header is None:
+        return None
+    data = _readexactly(fd, struct.unpack(">I", header)[0])
+    if data is None:
+        return None
+    return util.pickle.loads(data)
+
+
+def _picklableerror(inst):
+    """return inst if it survives pickling, otherwise an equivalent Abort"""
+    try:
+        util.pickle.loads(util.pickle.dumps(inst, util.pickle.HIGHEST_PROTOCOL))
+        return inst
+    except Exception:
+        return error.Abort(_("worker failed: %s: %s") % (type(inst).__name__, inst))
+
+
+def _workerloop(ui, jobs, taskfd, resultfd):
+    """main loop of a forked worker process. Never returns."""
+    status = 0
+    try:
+        # the master handles interruptions and tears the workers down
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        while True:
+            msg = _readmsg(taskfd)
+            if msg is None or msg[0] == "exit":
+                break
+            if msg[0] == "job":
+                _kind, jobid, payload = msg
+                jobs[jobid] = util.pickle.loads(payload)
+                continue
+            _kind, jobid, index, args = msg
+            func, staticargs = jobs[jobid]
+            try:
+                for res in func(*staticargs + (args,)):
+                    _writemsg(resultfd, ("result", index, res))
+            except Exception as inst:
+                ui.traceback()
+                _writemsg(resultfd, ("error", index, _picklableerror(inst)))
+            else:
+                _writemsg(resultfd, ("done", index, None))
+            ui.flush()
+    except BaseException:
+        status = 255
+    finally:
+        try:
+            ui.flush()
+        finally:
+            os._exit(status)
+
+
+class _processworker(object):
+    def __init__(self, pid, taskfd, resultfd):
+        self.pid = pid
+        self.taskfd = taskfd
+        self.resultfd = resultfd
+
+
+class _processpool(object):
+    """long-lived forked worker processes
+
+    The pool is created on first use and reused by later worker() calls in
+    the same command, so the fork cost is paid once. Functions the workers
+    already know about (registered before they were forked) are dispatched by
+    id. New functions are pickled to the running workers when possible;
+    otherwise the workers are restarted so they inherit the new function.
+    """
+
+    def __init__(self, ui, size):
+        self.size = size
+        self._ui = ui
+        self._pid = os.getpid()
+        self._workers = []
+        # job id -> (func, staticargs), as known by the running workers
+        self._jobs = {}
+        self._nextjobid = 0
+
+    def running(self):
+        return bool(self._workers) and self._pid == os.getpid()
+
+    def _findjob(self, func, staticargs):
+        for jobid, (jobfunc, jobargs) in self._jobs.items():
+            if (
+                jobfunc is func
+                and len(jobargs) == len(staticargs)
+                and all(a is b for a, b in zip(jobargs, staticargs))
+            ):
+                return jobid
+        return None
+
+    def _register(self, func, staticargs):
+        jobid = self._findjob(func, staticargs)
+        if jobid is not None:
+            return jobid
+        jobid = self._nextjobid
+        self._nextjobid += 1
+        if self._workers:
+            try:
+                payload = util.pickle.dumps(
+                    (func, staticargs), util.pickle.HIGHEST_PROTOCOL
+                )
+            except Exception:
+                # the workers cannot learn about this function, restart
+                # them so they inherit it when forked
+                self.shutdown()
+            else:
+                for w in self._workers:
+                    _writemsg(w.taskfd, ("job", jobid, payload))
+        self._jobs[jobid] = (func, staticargs)
+        return jobid
+
+    def _start(self):
+        # anything buffered now would be written again by every child
+        self._ui.flush()
+        for _i in range(self.size):
+            taskr, taskw = os.pipe()
+            resultr, resultw = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                for w in self._workers:
+                    os.close(w.taskfd)
+                    os.close(w.resultfd)
+                os.close(taskw)
+                os.close(resultr)
+                _workerloop(self._ui, self._jobs, taskr, resultw)
+            os.close(taskr)
+            os.close(resultw)
+            self._workers.append(_processworker(pid, taskw, resultr))
+
+    def shutdown(self, kill=False):
+        workers, self._workers = self._workers, []
+        if self._pid != os.getpid():
+            # inherited through a fork: these are not our children
+            return
+        for w in workers:
+            try:
+                if kill:
+                    os.kill(w.pid, signal.SIGTERM)
+                else:
+                    _writemsg(w.taskfd, ("exit",))
+            except OSError:
+                pass
+        for w in workers:
+            os.close(w.taskfd)
+            os.close(w.resultfd)
+            try:
+                os.waitpid(w.pid, 0)
+            except OSError:
+                pass
+
+    def run(self, func, staticargs, args, ordered):
+        jobid = self._register(func, staticargs)
+        if not self._workers:
+            self._start()
+        chunks = collections.deque(_chunks(args, self.size))
+        order = _resultorder(ordered)
+        idle = list(self._workers)
+        busy = {}
+        try:
+            while chunks or busy:
+                while chunks and idle:
+                    w = idle.pop()
+                    index, chunk = chunks.popleft()
+                    _writemsg(w.taskfd, ("run", jobid, index, chunk))
+                    busy[w.resultfd] = w
+                readable = select.select(list(busy), [], [])[0]
+                for fd in readable:
+                    msg = _readmsg(fd)
+                    if msg is None:
+                        raise error.Abort(
+                            _("worker process %d exited unexpectedly") % busy[fd].pid
+                        )
+                    kind, index, payload = msg
+                    if kind == "result":
+                        ready = order.add(index, payload)
+                    elif kind == "done":
+                        idle.append(busy.pop(fd))
+                        ready = order.finish(index)
+                    else:
+                        raise payload
+                    for res in ready:
+                        yield res
+        except (Exception, KeyboardInterrupt, GeneratorExit):  # re-raises
+            # workers may be in the middle of a chunk: don't reuse them
+            self.shutdown(kill=True)
+            raise
+
+
+_pool = None
+
+
+def _getpool(ui):
+    global _pool
+    size = _numworkers(ui)
+    if _pool is not None and (_pool.size != size or not _pool.running()):
+        _pool.shutdown()
+        _pool = None
+    if _pool is None:
+        _pool = _processpool(ui, size)
+        ui.atexit(shutdownpool)
+    return _pool
+
+
+def shutdownpool():
+    """stop the long-lived worker processes, if any"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def _forkedworker(ui, func, staticargs, args, ordered=False):
+    return _getpool(ui).run(func, staticargs, args, ordered)
 
 
 def partition(lst, nslices):
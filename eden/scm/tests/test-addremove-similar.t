@@ -174,3 +174,52 @@ copies here
   recording removal of d/a as rename to c (100% similar)
 
   $ cd ..
+
+The candidate prefilter never drops a rename that scoring would accept. A single
+long shared line makes these files similar, although most of their lines differ
+
+  $ hg init rep4; cd rep4
+  $ hg debugsh -c 'ui.write("x" * 5000 + "\n" + "".join("a%d\n" % x for x in range(50)))' > old-file
+  $ hg commit -Aqm A
+  $ rm old-file
+  $ hg debugsh -c 'ui.write("x" * 5000 + "\n" + "".join("b%d\n" % x for x in range(50)))' > new-file
+  $ hg addremove -n -s50 --config experimental.similarity.prefilter=false
+  adding new-file
+  removing old-file
+  recording removal of old-file as rename to new-file (96% similar)
+  $ hg addremove -n -s50 --config experimental.similarity.prefilter=true
+  adding new-file
+  removing old-file
+  recording removal of old-file as rename to new-file (96% similar)
+
+  $ hg debugsh -c 'for i in range(20): open("f%d" % i, "w").write("".join("line %d\n" % ((i * 7 + j * j) % 30) for j in range(40 + i)))'
+  $ hg commit -Aqm B
+  $ hg debugsh -c 'for i in range(20): open("g%d" % i, "w").write("".join("line %d\n" % ((i * 7 + j * j) % 30) for j in range(40 + i) if j % (i + 2)) + "new %d\n" % i)'
+  $ rm f*
+  $ for s in 10 30 60 90; do
+  >   hg addremove -n -s$s --config experimental.similarity.prefilter=false | sort > $TESTTMP/off
+  >   hg addremove -n -s$s --config experimental.similarity.prefilter=true | sort > $TESTTMP/on
+  >   cmp $TESTTMP/off $TESTTMP/on
+  >   grep "as rename" $TESTTMP/on > /dev/null
+  > done
+
+  $ cd ..
+
+Exact renames of files starting with the filelog metadata marker, for which
+the filelog size is off
+
+  $ hg init rep5; cd rep5
+  $ $PYTHON -c "open('marker', 'wb').write(b'\x01\nfoo\n')"
+  $ printf 'bar\n' > other
+  $ hg commit -Aqm A
+  $ mv marker marker2
+  $ mv other other2
+  $ hg addremove -s100
+  removing marker
+  adding marker2
+  removing other
+  adding other2
+  recording removal of marker as rename to marker2 (100% similar)
+  recording removal of other as rename to other2 (100% similar)
+
+  $ cd ..
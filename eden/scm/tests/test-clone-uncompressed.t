@@ -55,6 +55,18 @@ Block full streaming clones
   searching for changes
   no changes found
 
+Files are written by several threads by default, and with --verbose the
+throughput of reading the stream and of writing files is reported
+
+  $ hg clone -v --stream -U ssh://user@dummy/server clone-threads | grep transferred
+  transferred * in * seconds (*/sec; network */sec, disk */sec) (glob)
+  $ hg clone -v --stream --config clone.streamwritethreads=0 -U ssh://user@dummy/server clone-serial | grep transferred
+  transferred * in * seconds (*/sec; network */sec, disk */sec) (glob)
+  $ hg -R clone-threads log -r tip -T '{desc}\n'
+  add a lot of files
+  $ cmp server/.hg/store/data/1023.i clone-threads/.hg/store/data/1023.i
+  $ cmp server/.hg/store/data/1023.i clone-serial/.hg/store/data/1023.i
+
 Clone with background file closing enabled
 
   $ hg --debug --config worker.backgroundclose=true --config worker.backgroundcloseminfilecount=1 clone --stream -U ssh://user@dummy/server clone-background 2>&1 | grep -v adding
@@ -122,3 +134,25 @@ actually serving file content
   $ wait
   $ hg -R clone id
   000000000000
+
+the files to stream are only scanned again once the store changes
+
+  $ hg -R $TESTTMP/server debugshell --debug -c "
+  > from edenscm.mercurial import streamclone
+  > def generate():
+  >     filecount, bytecount, it = streamclone.generatev1(repo)
+  >     for chunk in it:
+  >         pass
+  >     ui.write('%d files\n' % filecount)
+  > generate()
+  > generate()
+  > repo.wvfs.write('foo', b'changed')
+  > repo.commit('change foo')
+  > generate()
+  > " | egrep '^(scanning|reusing|[0-9]+ files$)'
+  scanning
+  1028 files
+  reusing stream clone snapshot
+  1028 files
+  scanning
+  1028 files
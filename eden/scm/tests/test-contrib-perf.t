@@ -42,10 +42,12 @@ perfstatus
   > parentscount=1
   > EOF
   $ hg perfaddremove
+  $ hg perfaddremove --renames 50 -s 60
   $ hg perfancestors
   $ hg perfancestorset 'desc(third)'
   $ hg perfannotate a
   $ hg perfbookmarks
+  $ hg perfbundlechunking a
   $ hg perfcca
   $ hg perfchangeset 2
   $ hg perfctxfiles 2
@@ -73,6 +75,8 @@ perfstatus
   $ hg perfrevset 'all()'
   $ hg perfstartup
   $ hg perfstatus
+  $ hg perfstreamclone
+  $ hg perfstreamclone --clear --config server.streamreadthreads=0
   $ hg perftemplating
   $ hg perfwalk
   $ hg perfparents
@@ -685,3 +685,28 @@ fullcopytracing
   merging foo/bar and a to foo/bar
   $ cd ..
   $ rm -rf repo
+
+Copies can be cached and reused when merging the same commits again
+--------------------------------------------------------------------
+
+  $ hg init repo
+  $ initclient repo
+  $ cd repo
+  $ setconfig experimental.copytrace.cachesize=1MB
+  $ echo a > a
+  $ hg ci -qAm initial
+  $ hg mv a b
+  $ hg ci -m 'mv a b'
+  $ hg up -q 'desc(initial)'
+  $ echo b > a
+  $ hg ci -qm 'mod a'
+  $ hg merge 'desc(mv)' --debug | grep -E 'cached copies|^merging'
+  merging a and b to b
+  $ ls .hg/cache/mergecopies | wc -l | tr -d ' '
+  1
+  $ hg up -qC .
+  $ hg merge 'desc(mv)' --debug | grep -E 'cached copies|^merging'
+  using cached copies for heuristics
+  merging a and b to b
+  $ cd ..
+  $ rm -rf repo
@@ -28,6 +28,11 @@ def gettemppath():
     return path
 
 
+def readfile(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
 def ensure(condition):
     if not condition:
         raise RuntimeError("Unexpected")
@@ -149,7 +154,7 @@ def testcopyfrom():
     rm2.flush()
 
     # two files should be the same
-    ensure(len(set(open(p).read() for p in [path, path2])) == 1)
+    ensure(len(set(readfile(p) for p in [path, path2])) == 1)
 
     os.unlink(path)
     os.unlink(path2)
@@ -203,8 +208,83 @@ def testlastnode():
         ensure(rm2.rev2hsh(rm2.maxrev) == hsh)
 
 
+def testgrow():
+    path = gettemppath()
+    rm = revmap.revmap(path)
+    # exceed the initial capacity several times with incremental appends
+    for i in xrange(1, 100):
+        rm.append(genhsh(i), sidebranch=(i & 1), path=str(i // 7), flush=True)
+
+    rm = revmap.revmap(path)
+    ensure(rm.maxrev == 99)
+    for i in xrange(1, 100):
+        ensure(rm.hsh2rev(genhsh(i)) == i)
+        ensure(rm.rev2hsh(i) == genhsh(i))
+        ensure(rm.rev2path(i) == str(i // 7))
+        ensure(bool(rm.rev2flag(i) & revmap.sidebranchflag) == bool(i & 1))
+    ensure(revmap.getlastnode(path) == genhsh(99))
+
+    # the file is the same as the one written at once
+    rm2 = revmap.revmap()
+    rm2.copyfrom(rm)
+    path2 = gettemppath()
+    rm2.path = path2
+    rm2.flush()
+    ensure(len(set(readfile(p) for p in [path, path2])) == 1)
+
+    os.unlink(path)
+    os.unlink(path2)
+
+
+def testmigrate():
+    path = gettemppath()
+    # the old format: header, then flag, optional path and hash per revision
+    legacy = b"REVMAP1\0" + b"\2a\0" + genhsh(1) + b"\1" + genhsh(2)
+    legacy += b"\2b\0" + genhsh(3)
+    with open(path, "wb") as f:
+        f.write(legacy)
+    ensure(revmap.getlastnode(path) == genhsh(3))
+
+    rm = revmap.revmap(path)
+    ensure(rm.maxrev == 3)
+    ensure([rm.rev2path(i) for i in xrange(1, 4)] == ["a", "a", "b"])
+    ensure(rm.rev2flag(2) == revmap.sidebranchflag)
+    ensure(rm.hsh2rev(genhsh(3)) == 3)
+
+    # the file is rewritten in the new format
+    with open(path, "rb") as f:
+        ensure(f.read(8) == revmap.revmap.HEADER)
+    rm = revmap.revmap(path)
+    ensure(rm.maxrev == 3)
+    ensure(rm.rev2path(3) == "b")
+    ensure(revmap.getlastnode(path) == genhsh(3))
+
+    # the old format is still produced for peers that only read it
+    ensure(rm.legacydata() == legacy)
+
+    os.unlink(path)
+
+
+def testsize():
+    path = gettemppath()
+    # the capacity follows the number of revisions
+    rm = revmap.revmap(path)
+    ensure(os.path.getsize(path) == 69)
+    rm.append(genhsh(1), path="a", flush=True)
+    ensure(os.path.getsize(path) == 71)
+    for i in xrange(2, 6):
+        rm.append(genhsh(i), flush=True)
+    # 8 records of 28 bytes, 16 slots of 4 bytes
+    ensure(os.path.getsize(path) == 32 + 8 * 28 + 16 * 4 + 3)
+
+    os.unlink(path)
+
+
 testbasicreadwrite()
 testcorruptformat()
 testcopyfrom()
 testcontains()
 testlastnode()
+testgrow()
+testmigrate()
+testsize()
@@ -246,3 +246,11 @@ Multi-path queries
   11c9870ffc4024fab11bf166a00b2852ea36bcf6
   5946a2427fdfcb068a8aec1a59227d0d76062b43
   728676e01661ccc3d7e39de054ca3a7288d7e7b6
+
+Local walk with several workers and small batches
+
+  $ hg log parent -T '{desc}\n' --config fastlog.localworkers=3 --config fastlog.localbatchsize=1
+  toys
+  treats
+  cookies
+  major repo reorg
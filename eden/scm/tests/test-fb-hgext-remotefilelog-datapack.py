@@ -317,6 +317,42 @@ class datapacktestsbase(object):
         # Assert the corrupt pack was removed
         self.assertEqual(origpackcount - 2, newpackcount)
 
+    def testPackSummaries(self):
+        """Test that pack summaries let lookups skip packs without the key."""
+        packdir = self.makeTempDir()
+        chains = []
+        for i in range(5):
+            chain = []
+            revision = (str(i), self.getFakeHash(), nullid, b"content")
+            for _ in range(50):
+                chain.append(revision)
+                revision = (str(i), self.getFakeHash(), revision[1], self.getFakeHash())
+            self.createPack(chain, packdir)
+            chains.append(chain)
+
+        ui = uimod.ui()
+        ui.setconfig("remotefilelog", "packsummaries", True)
+        store = datapackstore(ui, packdir, True)
+
+        filename, node = chains[0][10][0:2]
+        self.assertEqual(store.getdeltachain(filename, node)[0][1], node)
+        # every pack got a summary on disk
+        summaries = [f for f in os.listdir(packdir) if f.endswith(".datasummary")]
+        self.assertEqual(len(summaries), 5)
+
+        keys = [(chain[0][0], chain[0][1]) for chain in chains]
+        fakekey = ("missing", self.getFakeHash())
+        self.assertEqual(store.getmissing(keys + [fakekey]), [fakekey])
+
+        metrics = store.getmetrics()
+        self.assertGreater(metrics["summaryskips"], 0)
+        self.assertGreater(metrics["packprobes"], 0)
+
+        # a new store uses the summaries written by the first one
+        store = datapackstore(ui, packdir, True)
+        self.assertEqual(store.getmissing(keys), [])
+        self.assertNotIn("summarybuilds", store.getmetrics())
+
     def testReadingMutablePack(self):
         """Tests that the data written into a mutabledatapack can be read out
         before it has been finalized."""
@@ -47,3 +47,16 @@ Now try prefetchchunksize option, and expect that two getpackv2 calls were made
   $ hg up tip --config remotefilelog.prefetchchunksize=1 --debug 2>&1 | grep 'sending getpackv2 command'
   sending getpackv2 command
   sending getpackv2 command
+
+Fetch over two connections concurrently, and expect one getpackv2 call per
+batch. Each connection gets up to four batches, so the two files here are
+fetched in two batches of one file each
+  $ hg up -q null
+  $ rm -r "$TESTTMP"/hgcache/*
+  $ hg up tip --config remotefilelog.prefetchconnections=2 --debug 2>&1 | grep 'sending getpackv2 command'
+  sending getpackv2 command
+  sending getpackv2 command
+  $ hg debugfilerev -v
+  79c51fb96423: y
+   dir/y: bin=0 lnk=0 flag=0 size=2 copied='' chain=076f5e2225b3
+    rawdata: 'y\n'
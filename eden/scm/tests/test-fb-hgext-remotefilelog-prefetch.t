@@ -322,3 +322,22 @@
   not reusing expired connection to ssh://user@dummy/master
   got third connection
   closing expired connection to ssh://user@dummy/master
+
+# Test connection pool prewarming
+  $ cat >$TESTTMP/testprewarm <<EOF
+  > pool = repo.connectionpool
+  > pool.prewarm('ssh://user@dummy/master', 2)
+  > with pool.get('ssh://user@dummy/master', reason='first') as conn1:
+  >     with pool.get('ssh://user@dummy/master', reason='second') as conn2:
+  >         assert conn1 is not conn2
+  >         repo.ui.debug("got two connections\n")
+  > assert len(pool._pool['ssh://user@dummy/master']) == 2
+  > EOF
+  $ hg debugshell --command "`cat $TESTTMP/testprewarm`" --config connectionpool.prewarm=2 --debug 2>&1 | grep 'connection'
+  reusing connection from pool
+  reusing connection from pool
+  got two connections
+  $ cat .hg/connectionpool
+  {"debugshell": {"ssh://user@dummy/master": {"connections": 2, "reasons": ["first", "second"]}}} (no-eol)
+  $ hg debugshell --command "pass" --config connectionpool.prewarm=1 --debug 2>&1 | grep 'prewarming'
+  prewarming 1 connections to ssh://user@dummy/master for first, second
@@ -35,3 +35,18 @@
 
 # With the backing blobs gone, diff should not complain about missing blobs
   $ hg diff -r . -r .~2
+
+# Exact renames are found from the LFS metadata, without reading the blobs
+  $ $PYTHON -c "open('marker', 'wb').write(b'\x01\nstarts with the metadata marker\n')"
+  $ echo 'a file large enough for LFS' > plain
+  $ hg commit -qAm renames
+  $ rm -rf .hg/store/lfs/objects
+  $ mv marker marker2
+  $ mv plain plain2
+  $ hg addremove -s100
+  removing marker
+  adding marker2
+  removing plain
+  adding plain2
+  recording removal of marker as rename to marker2 (100% similar)
+  recording removal of plain as rename to plain2 (100% similar)
@@ -35,9 +35,9 @@ Test that output remains the same with multiple invocations.
   # Parent  b292c1e3311fd0f13ae83b409caae4a6d1fb348c
   xx
   
-  no value found for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2 from local
-  falling back for value buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2
-  set value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2 to local
+  no value found for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3 from local
+  falling back for value buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3
+  set value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3 to local
   diff -r b292c1e3311fd0f13ae83b409caae4a6d1fb348c -r a5d935fe38ada2b984c29e4e02bffd7f19bf818d x
   --- a/x	Thu Jan 01 00:00:00 1970 +0000
   +++ /dev/null	Thu Jan 01 00:00:00 1970 +0000
@@ -59,7 +59,7 @@ Test that output remains the same with multiple invocations.
   # Parent  b292c1e3311fd0f13ae83b409caae4a6d1fb348c
   xx
   
-  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2 from local
+  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3 from local
   diff -r b292c1e3311fd0f13ae83b409caae4a6d1fb348c -r a5d935fe38ada2b984c29e4e02bffd7f19bf818d x
   --- a/x	Thu Jan 01 00:00:00 1970 +0000
   +++ /dev/null	Thu Jan 01 00:00:00 1970 +0000
@@ -72,8 +72,8 @@ Test that output remains the same with multiple invocations.
   +x
   +x
   $ hg --debug log -vpC -r .
-  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2 from local
-  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2 from local
+  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3 from local
+  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3 from local
   commit:      a5d935fe38ada2b984c29e4e02bffd7f19bf818d
   bookmark:    foo
   phase:       draft
@@ -134,7 +134,7 @@ Test that disabling the cache entirely doesn't break things
   # Parent  b292c1e3311fd0f13ae83b409caae4a6d1fb348c
   xx
   
-  falling back for value buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2
+  falling back for value buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3
   diff -r b292c1e3311fd0f13ae83b409caae4a6d1fb348c -r a5d935fe38ada2b984c29e4e02bffd7f19bf818d x
   --- a/x	Thu Jan 01 00:00:00 1970 +0000
   +++ /dev/null	Thu Jan 01 00:00:00 1970 +0000
@@ -149,14 +149,14 @@ Test that disabling the cache entirely doesn't break things
 
 Test that corrupt caches are gracefully ignored, and updated
 # Use a long value so we trigger checksum validation
-  $ printf "12345678901234567890123456789012345678901234567890" > "$TESTTMP/hgsimplecache/buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2"
+  $ printf "12345678901234567890123456789012345678901234567890" > "$TESTTMP/hgsimplecache/buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3"
   $ hg --debug log -vpC -r .
-  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2 from local
-  error getting or deserializing key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2: invalid hash from simplecache for key 'buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2'
-  no value found for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2 from local
-  falling back for value buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2
-  set value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2 to local
-  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v2 from local
+  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3 from local
+  error getting or deserializing key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3: invalid hash from simplecache for key 'buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3'
+  no value found for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3 from local
+  falling back for value buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3
+  set value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3 to local
+  got value for key buildstatus:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:b292c1e3311fd0f13ae83b409caae4a6d1fb348c:v3 from local
   commit:      a5d935fe38ada2b984c29e4e02bffd7f19bf818d
   bookmark:    foo
   phase:       draft
@@ -198,17 +198,17 @@ Test strange (unicode) filenames
   # Parent  a5d935fe38ada2b984c29e4e02bffd7f19bf818d
   unicode test
   
-  no value found for key buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v2 from local
-  falling back for value buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v2
-  set value for key buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v2 to local
+  no value found for key buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v3 from local
+  falling back for value buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v3
+  set value for key buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v3 to local
   diff -r a5d935fe38ada2b984c29e4e02bffd7f19bf818d -r f3a143469693894d291b7388ea8392a07492751f \xc3\x85 (esc)
   --- /dev/null	Thu Jan 01 00:00:00 1970 +0000
   +++ b/Å	Thu Jan 01 00:00:00 1970 +0000
   @@ -0,0 +1,1 @@
   +x
   $ hg --debug log -vpC -r .
-  got value for key buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v2 from local
-  got value for key buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v2 from local
+  got value for key buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v3 from local
+  got value for key buildstatus:f3a143469693894d291b7388ea8392a07492751f:a5d935fe38ada2b984c29e4e02bffd7f19bf818d:v3 from local
   commit:      f3a143469693894d291b7388ea8392a07492751f
   bookmark:    foo
   phase:       draft
@@ -240,3 +240,22 @@ Test local cache eviction
   $ hg --debug --config simplecache.maxcachesize=2 --config simplecache.evictionpercent=50 export &> /dev/null
   $ ls $TESTTMP/hgsimplecache | grep -c buildstatus
   5
+
+Test the localstore cache
+  $ setconfig simplecache.caches=localstore simplecache.storedir="$TESTTMP/hgsimplecache-store"
+  $ hg --debug export 2>&1 | grep localstore
+  no value found for key buildstatus:*:v3 from localstore (glob)
+  set value for key buildstatus:*:v3 to localstore (glob)
+  $ hg --debug export 2>&1 | grep localstore
+  got value for key buildstatus:*:v3 from localstore (glob)
+  $ ls "$TESTTMP/hgsimplecache-store" | wc -l | tr -d ' '
+  1
+
+Values that do not fit in the store are evicted right away
+  $ echo 'x' >> y && hg commit -qm "8"
+  $ hg --debug --config simplecache.storemaxsize=1 export 2>&1 | grep localstore
+  no value found for key buildstatus:*:v3 from localstore (glob)
+  set value for key buildstatus:*:v3 to localstore (glob)
+  $ hg --debug export 2>&1 | grep localstore
+  no value found for key buildstatus:*:v3 from localstore (glob)
+  set value for key buildstatus:*:v3 to localstore (glob)
@@ -18,7 +18,7 @@ pull a branch with the old mapfile
   $ cd hgrepo
   $ echo "[paths]" >> .hg/hgrc
   $ echo "default=$TESTTMP/gitrepo" >> .hg/hgrc
-  $ hg pull -r master
+  $ hg pull -r master --config hggit.indexedlognodemap=False
   pulling from $TESTTMP/gitrepo
   importing git objects into hg
   $ ls -d .hg/git-mapfile*
@@ -26,8 +26,7 @@ pull a branch with the old mapfile
   $ hg log -r tip -T '{gitnode}\n'
   7eeab2ea75ec1ac0ff3d500b5b6f8a3447dd7c03
 
-pull more commits with the new nodemap
-  $ setconfig hggit.indexedlognodemap=True
+pull more commits with the nodemap, which is used by default
   $ hg pull -r beta
   pulling from $TESTTMP/gitrepo
   importing git objects into hg
@@ -45,11 +44,14 @@ can still get the mapping without the old map file
   9497a4ee62e16ee641860d7677cdb2589ea15554
   $ mv .hg/git-mapfile.old .hg/git-mapfile
 
-can still get the mapping without the nodemap
+can still get the mapping without the nodemap, which is rebuilt
   $ mv .hg/git-mapfile-log .hg/git-mapfile-log.old
   $ hg log -r 'tip^::tip' -T '{gitnode}\n'
   7eeab2ea75ec1ac0ff3d500b5b6f8a3447dd7c03
   9497a4ee62e16ee641860d7677cdb2589ea15554
+  $ test -d .hg/git-mapfile-log && echo rebuilt
+  rebuilt
+  $ rm -rf .hg/git-mapfile-log
   $ mv .hg/git-mapfile-log.old .hg/git-mapfile-log
 
 git cleanup cleans nodemap
@@ -61,3 +63,13 @@ git cleanup cleans nodemap
   $ hg unbundle -q ../mybundle.hg
   $ hg log -r tip -T '{gitnode}\n'
   9497a4ee62e16ee641860d7677cdb2589ea15554
+
+lines appended to the map file by other tools are picked up
+  $ echo gamma > gamma
+  $ hg commit -Aqm gamma
+  $ hg log -r 'tip^::tip' -T '{gitnode}\n'
+  9497a4ee62e16ee641860d7677cdb2589ea15554
+  
+  $ echo "ffffffffffffffffffffffffffffffffffffffff `hg log -r tip -T '{node}'`" >> .hg/git-mapfile
+  $ hg log -r 'gitnode(ffffffff)' -T '{desc}\n'
+  gamma
@@ -63,3 +63,20 @@ Load commonly used test logic
   Date:   Mon Jan 1 00:00:10 2007 +0000
   
       initial
+
+export again with worker processes and small batches
+  $ git init --bare gitrepo3
+  Initialized empty Git repository in $TESTTMP/gitrepo3/
+  $ cd hgrepo
+  $ hg gclear
+  clearing out the git cache data
+  $ hg push ../gitrepo3 --config worker.backend=processes --config worker.numcpus=2 --config hggit.exportbatchsize=1
+  pushing to ../gitrepo3
+  searching for changes
+  adding objects
+  added 3 commits with 6 trees and 3 blobs
+  $ cd ..
+  $ git --git-dir=gitrepo3 log --pretty=tformat:%H
+  d16fb6b69bb183a673483b4d239c3ecd1c5476ec
+  5b24ce288cfde71c483834f3b2b62aa5bcb05a43
+  9f99e4bc96145e874b20c616cd8824b6e74f9fc7
@@ -0,0 +1,110 @@
+#chg-compatible
+
+  $ disable treemanifest
+  $ setconfig experimental.evolution= experimental.bundle2lazylocking=True
+
+Create a chunked bundlestore in .hg/scratchbranches
+  $ . "$TESTDIR/library.sh"
+  $ . "$TESTDIR/infinitepush/library.sh"
+  $ setupcommon
+  $ enable infinitepush pushrebase remotenames
+  $ hg init repo
+  $ cd repo
+  $ setupserver
+  $ setconfig infinitepush.storetype=chunked
+  $ cd ..
+  $ hg clone ssh://user@dummy/repo client -q
+  $ cd client
+  $ mkcommit initialcommit
+  $ hg push -r . --create --to main
+  pushing rev 67145f466344 to destination ssh://user@dummy/repo bookmark main
+  searching for changes
+  exporting bookmark main
+  remote: pushing 1 changeset:
+  remote:     67145f466344  initialcommit
+
+Push a scratch commit, the bundle is stored as a list of chunks
+  $ mkcommit scratchcommit
+  $ hg push -r . --to scratch/mybranch --create
+  pushing to ssh://user@dummy/repo
+  searching for changes
+  remote: pushing 1 commit:
+  remote:     20759b6926ce  scratchcommit
+  $ find ../repo/.hg/scratchbranches/chunkedbundlestore -type f | sort
+  ../repo/.hg/scratchbranches/chunkedbundlestore/bundles/*/*/* (glob)
+  ../repo/.hg/scratchbranches/chunkedbundlestore/chunks/*/*/* (glob)
+
+The bundle is reassembled from its chunks
+  $ cd ..
+  $ hg clone ssh://user@dummy/repo client2 -q
+  $ cd client2
+  $ hg pull -B scratch/mybranch
+  pulling from ssh://user@dummy/repo
+  searching for changes
+  adding changesets
+  adding manifests
+  adding file changes
+  added 1 changesets with 1 changes to 1 files
+  $ hg log -r scratch/mybranch -T '{desc}\n'
+  scratchcommit
+
+Nothing is collected while all the chunks are referenced
+  $ cd ../repo
+  $ hg debuggcbundlestore --min-age 0
+  1 bundles reference 1 chunks, 0 of them shared
+  removed 0 unreferenced chunks (0 bytes)
+
+A bundle that is no longer in the store cannot be downloaded
+  $ rm .hg/scratchbranches/chunkedbundlestore/bundles/*/*/*
+  $ hg debugfillinfinitepushmetadata --node `ls .hg/scratchbranches/index/nodemap`
+  abort: bundle * of head 20759b6926ce* is missing from the bundle store (glob)
+  [255]
+
+Chunks that are no longer referenced are collected once they are old enough
+  $ hg debuggcbundlestore
+  0 bundles reference 0 chunks, 0 of them shared
+  removed 0 unreferenced chunks (0 bytes)
+  $ hg debuggcbundlestore --min-age 0 --dry-run
+  0 bundles reference 0 chunks, 0 of them shared
+  would remove 1 unreferenced chunks (* bytes) (glob)
+  $ hg debuggcbundlestore --min-age 0
+  0 bundles reference 0 chunks, 0 of them shared
+  removed 1 unreferenced chunks (* bytes) (glob)
+  $ find .hg/scratchbranches/chunkedbundlestore -type f
+
+The other store types cannot be collected
+  $ hg debuggcbundlestore --config infinitepush.storetype=disk
+  abort: the bundle store does not support garbage collection
+  [255]
+
+Bundles larger than a chunk are split, and a bundle pushed again after an
+amend shares most of its chunks with the first one
+  $ cd ../client
+  $ hg up -q 'desc(initialcommit)'
+  $ hg debugsh -c 'open("bigfile", "w").write("".join("line %d of a big file\n" % i for i in range(20000)))'
+  $ hg commit -qAm bigcommit
+  $ hg push -r . --to scratch/big --create
+  pushing to ssh://user@dummy/repo
+  searching for changes
+  remote: pushing 1 commit:
+  remote:     * bigcommit (glob)
+  $ hg debugsh -c 'open("bigfile", "w").write("".join("line %d of a big file\n" % i if i != 10000 else "line ten thousand\n" for i in range(20000)))'
+  $ hg commit -q --amend
+  $ hg push -r . --to scratch/big2 --create
+  pushing to ssh://user@dummy/repo
+  searching for changes
+  remote: pushing 1 commit:
+  remote:     * bigcommit (glob)
+  $ cd ../repo
+  $ hg debuggcbundlestore --dry-run
+  2 bundles reference * chunks, * of them shared (glob)
+  would remove 0 unreferenced chunks (0 bytes)
+  $ hg debuggcbundlestore --dry-run | grep " 0 of them shared"
+  [1]
+
+The amended commit is reassembled from its chunks intact
+  $ cd ../client2
+  $ hg pull -q -B scratch/big2
+  $ hg cat -r scratch/big2 bigfile | cmp - ../client/bigfile
+  $ grep -c "ten thousand" ../client/bigfile
+  1
@@ -779,3 +779,38 @@ Make sure background process finished
   $ cd ../repo
   $ cat .hg/scratchbranches/index/nodemetadatamap/d2b0410d4da084bc534b1d90df0de9eb21583496
   {"changed_files": {"tofillmetadata": {"adds": 1, "isbinary": false, "removes": 0, "status": "added"}}} (no-eol)
+
+Node prefix lookups use a sorted index of the nodemap, built on the first
+lookup, and a log of the nodes added since
+  $ rm -f .hg/scratchbranches/index/nodeindex*
+  $ hg debugsh -c 'ui.write("%s\n" % repo.bundlestore.index.getnodebyprefix("d2b0410d"))'
+  d2b0410d4da084bc534b1d90df0de9eb21583496
+  $ ls .hg/scratchbranches/index
+  bookmarkmap
+  nodeindex
+  nodemap
+  nodemetadatamap
+  $ cd ../client
+  $ mkcommit afterindex
+  $ hg push -r . --to scratch/afterindex --create -q > /dev/null 2>&1
+  $ cd ../repo
+  $ ls .hg/scratchbranches/index
+  bookmarkmap
+  nodeindex
+  nodeindex.log
+  nodemap
+  nodemetadatamap
+  $ hg debugsh -c 'ui.write("%s\n" % repo.bundlestore.index.getnodebyprefix(repo.bundlestore.index.getnode("scratch/afterindex")[:8]))' > prefixlookup
+  $ hg debugsh -c 'ui.write("%s\n" % repo.bundlestore.index.getnode("scratch/afterindex"))' | cmp - prefixlookup
+
+Nodes written to the nodemap behind the index's back are found as well
+  $ echo ' ' > .hg/scratchbranches/index/nodemap/d2b0410d00000000000000000000000000000000
+  $ hg debugsh -c 'ui.write("%s\n" % repo.bundlestore.index.getnodebyprefix("d2b0410d0"))'
+  d2b0410d00000000000000000000000000000000
+  $ hg debugsh -c 'repo.bundlestore.index.getnodebyprefix("d2b0410d")'
+  abort: ambiguous identifier 'd2b0410d'
+  suggestion: provide longer commithash prefix
+  [255]
+  $ rm .hg/scratchbranches/index/nodemap/d2b0410d00000000000000000000000000000000
+  $ hg debugsh -c 'ui.write("%s\n" % repo.bundlestore.index.getnodebyprefix("d2b0410d"))'
+  d2b0410d4da084bc534b1d90df0de9eb21583496
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, print_function
 
+import os
 import tempfile
 
 from edenscm.hgext import linkrevcache
@@ -59,4 +60,52 @@ def testbasicreadwrite():
         ensure(db.getlinkrevs(fname, fnode) == [])
 
 
+def testincrementalmerge():
+    path = tempfile.mkdtemp()
+    db = linkrevcache.linkrevdb(path, write=True)
+    # merge the new entries into the file while they are being added
+    db._maxpending = 7
+    for i in xrange(50):
+        db.appendlinkrev(str(i % 3), genhsh(i % 10), i)
+        db.setlastrev(i)
+    db.close()
+
+    reader = linkrevcache.linkrevdb(path)
+    ensure(reader.getlastrev() == 49)
+    for i in xrange(10):
+        for j in xrange(3):
+            expected = [k for k in xrange(50) if k % 10 == i and k % 3 == j]
+            ensure(reader.getlinkrevs(str(j), genhsh(i)) == expected)
+    ensure(reader.getlinkrevs("3", genhsh(0)) == [])
+    ensure(reader.getlinkrevs("0", genhsh(10)) == [])
+    ensure(len(list(reader.iterentries())) == 30)
+
+    # a writer does not disturb the reader, which sees the new entries once
+    # reopened
+    db = linkrevcache.linkrevdb(path, write=True)
+    db.appendlinkrev("new", genhsh(0), 60)
+    db.setlastrev(60)
+    db.close()
+    ensure(reader.getlinkrevs("new", genhsh(0)) == [])
+    ensure(reader.getlastrev() == 49)
+    reader.close()
+    ensure(reader.getlinkrevs("new", genhsh(0)) == [60])
+    ensure(reader.getlastrev() == 60)
+
+
+def testmissingorcorrupted():
+    path = tempfile.mkdtemp()
+    db = linkrevcache.linkrevdb(path)
+    ensure(db.getlastrev() == 0)
+    ensure(db.getlinkrevs("a", genhsh(1)) == [])
+
+    with open(os.path.join(path, "index"), "wb") as f:
+        f.write(b"garbage" * 10)
+    db = linkrevcache.linkrevdb(path)
+    ensure(db.getlastrev() == 0)
+    ensure(db.getlinkrevs("a", genhsh(1)) == [])
+
+
 testbasicreadwrite()
+testincrementalmerge()
+testmissingorcorrupted()
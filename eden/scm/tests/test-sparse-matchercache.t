@@ -0,0 +1,101 @@
+#chg-compatible
+
+test the on-disk cache of the patterns of the active sparse profiles
+
+  $ enable sparse
+  $ hg init myrepo
+  $ cd myrepo
+
+  $ cat > $TESTTMP/showcache.py <<EOF
+  > cache = repo._sparsematchcache
+  > for entry in cache._load():
+  >     cache._read(entry)
+  >     ui.write("%s: %s\n" % (" ".join(sorted(entry.filenodes)), " ".join(sorted(entry.includes))))
+  > EOF
+
+  $ mkdir dir1 dir2
+  $ echo a > dir1/a
+  $ echo b > dir2/b
+  $ cat > base.sparse <<EOF
+  > [include]
+  > dir1
+  > *.sparse
+  > EOF
+  $ cat > main.sparse <<EOF
+  > %include base.sparse
+  > EOF
+  $ hg ci -Aqm 'initial'
+  $ echo a2 > dir1/a
+  $ hg ci -qm 'change a file'
+
+  $ hg sparse enableprofile main.sparse
+  $ ls
+  base.sparse
+  dir1
+  main.sparse
+  $ hg debugshell $TESTTMP/showcache.py
+  base.sparse main.sparse: *.sparse .hg* dir1
+
+Commits with the same profiles reuse the entry
+
+  $ hg up -q 'desc(initial)'
+  $ hg status
+  $ hg debugshell $TESTTMP/showcache.py
+  base.sparse main.sparse: *.sparse .hg* dir1
+
+Changing an included profile adds an entry
+
+  $ hg up -q 'desc(change)'
+  $ echo dir2 >> base.sparse
+  $ hg ci -qm 'include dir2'
+  $ ls
+  base.sparse
+  dir1
+  dir2
+  main.sparse
+  $ hg debugshell $TESTTMP/showcache.py
+  base.sparse main.sparse: *.sparse .hg* dir1 dir2
+  base.sparse main.sparse: *.sparse .hg* dir1
+
+Each entry has its own file next to the index
+  $ ls .hg/sparsematchcache | wc -l
+  \s*3 (re)
+  $ hg up -q 'desc(initial)'
+  $ ls
+  base.sparse
+  dir1
+  main.sparse
+
+The visitdir() answers of the matchers are recorded
+
+  $ hg debugshell -c "ui.write('%s\n' % repo.sparsematch().visitdir('dir2'))"
+  False
+  $ hg debugshell -c "cache = repo._sparsematchcache; entry = cache._load()[0]; cache._read(entry); ui.write('%s\n' % entry.visitdir['dir2'])"
+  False
+
+The cache can be disabled, and is ignored when unreadable
+
+  $ echo garbage > .hg/sparsematchcache/index
+  $ hg up -q 'desc(include)' --config sparse.matchercache=False
+  $ ls
+  base.sparse
+  dir1
+  dir2
+  main.sparse
+  $ cat .hg/sparsematchcache/index
+  garbage
+  $ hg up -q 'desc(initial)'
+  $ ls
+  base.sparse
+  dir1
+  main.sparse
+  $ hg debugshell $TESTTMP/showcache.py
+  base.sparse main.sparse: *.sparse .hg* dir1
+
+A cache left by an older version as a single file is replaced
+
+  $ rm -r .hg/sparsematchcache
+  $ echo '{"version": 1, "entries": []}' > .hg/sparsematchcache
+  $ hg up -q 'desc(include)'
+  $ hg debugshell $TESTTMP/showcache.py | grep dir2
+  base.sparse main.sparse: *.sparse .hg* dir1 dir2
@@ -92,3 +92,37 @@ Traceback must be printed for unknown exceptions
   Exception: unknown exception
 
 #endif
+
+#if no-windows
+
+The process backend gives the same results, in input order when asked to
+
+  $ cat > order.py <<EOF
+  > from __future__ import absolute_import
+  > from edenscm.mercurial import registrar, worker
+  > cmdtable = {}
+  > command = registrar.command(cmdtable)
+  > def square(args):
+  >     for arg in args:
+  >         yield arg * arg
+  > @command('testorder', [], 'hg testorder')
+  > def testorder(ui, repo):
+  >     results = worker.worker(ui, 100000.0, square, (), list(range(10)), ordered=True)
+  >     ui.status('%s\n' % list(results))
+  >     results = worker.worker(ui, 100000.0, square, (), list(range(10)))
+  >     ui.status('%s\n' % sorted(results))
+  > EOF
+  $ hg --config "extensions.order=`pwd`/order.py" --config worker.backend=processes \
+  > --config worker.numcpus=4 testorder
+  [0, 1, 4, 9, 16, 25, 36, 49, 64, 81]
+  [0, 1, 4, 9, 16, 25, 36, 49, 64, 81]
+
+Exceptions raised in worker processes are surfaced by the master
+
+  $ hg --config "extensions.t=$abspath" --config worker.backend=processes \
+  > --config worker.numcpus=8 test 100000.0 abort
+  start
+  abort: known exception
+  [255]
+
+#endif